@@ -1,19 +1,38 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file
+from flask import Blueprint, Flask, current_app, render_template, request, redirect, url_for, flash, jsonify, send_file, Response, abort, stream_with_context, make_response
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta, date
-from sqlalchemy import func, and_, desc
-from sqlalchemy import func, desc
+from sqlalchemy import and_, case, delete, desc, event, func, insert, literal, or_, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, object_session
+import click
+from collections import namedtuple
+from functools import wraps
+import csv
+import hashlib
 import json
-import pandas as pd
 import io
 import os
+import tempfile
 
 # برای تاریخ شمسی
 from jdatetime import date as jdate
 
+from response_cache import ResponseCache, normalize_args
+from sqlite_profile import SQLiteProfile, engine_options, is_memory_database
+from registry import Registry
+from diagnostics import bounded_number, diagnose, resolve_rules
+from live_updates import LiveUpdates
+from jalali import GRANULARITIES, jalali_calendar
+from instrumentation import Instrumentation
+from jobs import JobRunner
+from archive import ReportArchive
+from snapshots import ParquetSnapshots
+from search import SearchIndex, normalize
+
 def fa_to_en(s):
     if not s:
         return s
@@ -28,14 +47,103 @@ STANDARD_FOOTAGE = {
     6: 800, 7: 1100, 8: 700, 9: 700, 10: 650,
     11: 1050, 12: 1050, 13: 1050, 14: 1050, 15: 650
 }
-# تعریف اپ
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'your-secret-key-change-in-production'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///factory_monitoring.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# فیلتر تاریخ شمسی (حالا app تعریف شده، پس کار می‌کنه)
-@app.template_filter('jalali_date')
+# استاندارد تولید هر شیفت برای هر دستگاه/خط (گردباف از STANDARD_FOOTAGE و جدول Machine)
+SECTION_STANDARDS = {'circular': 800, 'extruder': 100, 'sewing': 5000}
+# بخش‌های اپ؛ در create_app ثبت می‌شوند (دستورهای flask روی reports_bp و بدون گروه‌اند)
+main_bp = Blueprint('main', __name__)  # داشبورد، ورود/خروج و صفحه‌های عمومی
+reports_bp = Blueprint('reports', __name__, cli_group=None)  # ثبت، ویرایش، حذف و ورود گروهی گزارش‌ها
+analytics_bp = Blueprint('analytics', __name__)
+api_bp = Blueprint('api', __name__)
+export_bp = Blueprint('export', __name__)
+BLUEPRINTS = (main_bp, reports_bp, analytics_bp, api_bp, export_bp)
+
+# افزونه‌ها بدون app ساخته می‌شوند و create_app آن‌ها را مقداردهی می‌کند
+db = SQLAlchemy()
+login_manager = LoginManager()
+login_manager.login_view = 'main.login'
+migrate = Migrate()
+response_cache = ResponseCache()
+sqlite_profile = SQLiteProfile()
+live_updates = LiveUpdates()
+instrumentation = Instrumentation()
+jobs = JobRunner()
+archive = ReportArchive()
+snapshots = ParquetSnapshots()
+search_index = SearchIndex()
+
+
+def create_app(config=None):
+    """ساخت اپ: تنظیمات (متغیرهای محیطی، بعد config)، افزونه‌ها و blueprint ها
+
+    flask --app app ... و gunicorn "app:create_app()" همین تابع را صدا می‌زنند.
+    """
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'your-secret-key-change-in-production'
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///factory_monitoring.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # کش پاسخ API های تحلیلی: memory (هر worker جدا) یا sqlite (مشترک بین workerها) یا none
+    app.config['RESPONSE_CACHE_BACKEND'] = os.environ.get('RESPONSE_CACHE_BACKEND', 'memory')
+    app.config['RESPONSE_CACHE_PATH'] = os.environ.get('RESPONSE_CACHE_PATH', 'response_cache.db')
+    app.config['RESPONSE_CACHE_TTL'] = 60  # ثانیه
+    app.config['RESPONSE_CACHE_MAX_ENTRIES'] = 1024
+    # پروفایل SQLite (WAL، busy_timeout و ...) و engine فقط‌خواندنی اختیاری برای تحلیل‌ها
+    app.config['SQLITE_PROFILE'] = os.environ.get('SQLITE_PROFILE', 'production')
+    app.config['SQLITE_READ_ENGINE'] = os.environ.get('SQLITE_READ_ENGINE', '0') == '1'
+    # آستانه‌های تشخیص دستگاه (diagnostics.DEFAULT_RULES و SECTION_RULES)؛ کلی یا مخصوص بخش: {'sewing': {'min_efficiency': 60}}
+    app.config['DIAGNOSTIC_RULES'] = {}
+    # سقف کهنگی کش کاربران و دستگاه‌ها (ثانیه) برای تغییراتی که در worker دیگری ثبت شده‌اند
+    app.config['REGISTRY_TTL'] = 300
+    # کارهای پس‌زمینه (خروجی‌ها، بازسازی جدول تجمیعی، تحلیل بلندمدت)؛ نتیجه‌ها در instance/job_results
+    # که با اولین کار ساخته می‌شود و کارهای تمام‌شده بعد از JOBS_RESULT_TTL ثانیه پاک می‌شوند
+    app.config['JOBS_WORKERS'] = int(os.environ.get('JOBS_WORKERS', 2))
+    app.config['JOBS_RESULT_TTL'] = int(os.environ.get('JOBS_RESULT_TTL', 7 * 24 * 3600))
+    # بایگانی سال‌های شمسی بسته (flask archive-reports 1402) در instance/archives/reports_1402.db
+    app.config['ARCHIVE_DIR'] = os.environ.get('ARCHIVE_DIR', 'archives')
+    # snapshot های Parquet ماهانه (flask snapshot-reports) برای خروجی و تحلیل بازه‌های طولانی؛ نیاز به pyarrow
+    app.config['SNAPSHOT_DIR'] = os.environ.get('SNAPSHOT_DIR', 'snapshots')
+    # جریان زنده داشبورد (SSE): memory (هر worker جدا) یا sqlite (مشترک بین workerها) یا none
+    app.config['LIVE_UPDATES_BACKEND'] = os.environ.get('LIVE_UPDATES_BACKEND', 'memory')
+    # آمار زمان پاسخ و کوئری‌ها روی /metrics (بدون METRICS_TOKEN فقط از خود سرور)؛ لاگ درخواست‌های کندتر از این مقدار (میلی‌ثانیه)
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    app.config['METRICS_SLOW_REQUEST_MS'] = float(os.environ['SLOW_REQUEST_MS']) if os.environ.get('SLOW_REQUEST_MS') else None
+    app.config.update(config or {})
+    # pool اتصال فقط برای فایل (قبل از db.init_app که engine را می‌سازد)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+
+    db.init_app(app)
+    login_manager.init_app(app)
+    migrate.init_app(app, db, render_as_batch=True)  # batch برای ALTER در SQLite
+    response_cache.init_app(app)
+    sqlite_profile.init_app(app, db)
+    live_updates.init_app(app)
+    instrumentation.init_app(app, db)
+    jobs.init_app(app, data_versions)
+    archive.init_app(app, db)
+    snapshots.init_app(app, db, archive)
+    search_index.init_app(app, db)
+    if sqlite_profile.read_engine is not None:
+        instrumentation.watch(sqlite_profile.read_engine)
+    for registry in (machine_registry, user_registry, operator_registry):
+        registry.ttl = app.config['REGISTRY_TTL']
+
+    for blueprint in BLUEPRINTS:
+        app.register_blueprint(blueprint)
+    app.url_build_error_handlers.append(_blueprint_endpoint)
+    return app
+
+
+def _blueprint_endpoint(error, endpoint, values):
+    """url_for با نام قدیمی endpoint (بدون blueprint، مثل url_for('index') در قالب‌ها)"""
+    if '.' in endpoint:
+        return None
+    matches = [name for name in current_app.view_functions if name.split('.', 1)[-1] == endpoint and '.' in name]
+    if len(matches) != 1:
+        return None
+    return url_for(matches[0], **values)
+
+
+# فیلتر تاریخ شمسی
+@main_bp.app_template_filter('jalali_date')
 def jalali_date_filter(value, format='%Y/%m/%d'):
     if value is None:
         return ''
@@ -44,13 +152,14 @@ def jalali_date_filter(value, format='%Y/%m/%d'):
             value = datetime.strptime(value, '%Y-%m-%d').date()
         except:
             return value
+    if isinstance(value, datetime):
+        value = value.date()
     if isinstance(value, date):
-        jd = jdate.fromgregorian(date=value)
-        return jd.strftime(format)
+        return jalali_calendar.label(value, format)
     return str(value)
 
 # بقیه فیلترها (اگر داری)
-@app.template_filter('floatformat')
+@main_bp.app_template_filter('floatformat')
 def floatformat_filter(value, precision=1):
     if value is None:
         return ''
@@ -59,13 +168,6 @@ def floatformat_filter(value, precision=1):
     except (ValueError, TypeError):
         return value
 
-# ادامه کد: db, login_manager, migrate و ...
-db = SQLAlchemy(app)
-login_manager = LoginManager()
-login_manager.init_app(app)
-migrate = Migrate(app, db)
-login_manager.login_view = 'login'
-
 # Models
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -89,29 +191,50 @@ class Machine(db.Model):
     standard_footage = db.Column(db.Float, default=800)  # ⭐ این خط را اضافه کنید
 
 
+class Operator(db.Model):
+    """اپراتورها؛ گزارش‌ها با operator_id به آن وصل‌اند و تحلیل‌ها روی همین شناسه گروه‌بندی می‌شوند"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)  # نام نمایشی (اولین املای ثبت‌شده)
+    normalized_name = db.Column(db.String(100), nullable=False, unique=True)  # normalize(name): املاهای مختلف یک نفر
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
 class CircularReport(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, nullable=False)
     shift = db.Column(db.String(20), nullable=False)
     machine_number = db.Column(db.Integer, db.ForeignKey('machine.id'))
-    operator_name = db.Column(db.String(100), nullable=False)
+    operator_name = db.Column(db.String(100), nullable=False)  # همان‌طور که وارد شده
+    operator_id = db.Column(db.Integer, db.ForeignKey('operator.id'))
     bag_width = db.Column(db.Float)
     color = db.Column(db.String(50))
     cleanliness = db.Column(db.String(50))
     machine_speed = db.Column(db.Float)
     footage = db.Column(db.Float)
     roll_weight = db.Column(db.Float)
+    roll_barcode = db.Column(db.String(100))  # رول تولیدشده؛ شجره آن در roll_lineage
     downtime_hours = db.Column(db.Float)
     notes = db.Column(db.Text)
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # برای snapshot افزایشی
+
+    # ایندکس‌ها مطابق فیلترهای داشبورد/تحلیل و مرتب‌سازی «گزارش‌های اخیر»
+    __table_args__ = (
+        db.Index('ix_circular_report_date_shift', 'date', 'shift'),
+        db.Index('ix_circular_report_machine_date', 'machine_number', 'date'),
+        db.Index('ix_circular_report_operator_id_date', 'operator_id', 'date'),
+        db.Index('ix_circular_report_created_at', 'created_at'),
+        db.Index('ix_circular_report_date_updated_at', 'date', 'updated_at'),
+    )
 
 
 class ExtruderReport(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, nullable=False)
     shift = db.Column(db.String(20), nullable=False)
-    operator_name = db.Column(db.String(100), nullable=False)
+    operator_name = db.Column(db.String(100), nullable=False)  # همان‌طور که وارد شده
+    operator_id = db.Column(db.Integer, db.ForeignKey('operator.id'))
     color_material = db.Column(db.Float, nullable=True)
     carbon_material = db.Column(db.Float, nullable=True)
     brightener_material = db.Column(db.Float, nullable=True)
@@ -130,13 +253,22 @@ class ExtruderReport(db.Model):
     notes = db.Column(db.Text, nullable=True)
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_extruder_report_date_shift', 'date', 'shift'),
+        db.Index('ix_extruder_report_operator_id_date', 'operator_id', 'date'),
+        db.Index('ix_extruder_report_created_at', 'created_at'),
+        db.Index('ix_extruder_report_date_updated_at', 'date', 'updated_at'),
+    )
 
 
 class SewingReport(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, nullable=False)
     shift = db.Column(db.String(20), nullable=False)
-    operator_name = db.Column(db.String(100), nullable=False)
+    operator_name = db.Column(db.String(100), nullable=False)  # همان‌طور که وارد شده
+    operator_id = db.Column(db.Integer, db.ForeignKey('operator.id'))
     roll_barcode = db.Column(db.String(100))
     roll_weight = db.Column(db.Float)
     footage = db.Column(db.Float)
@@ -151,6 +283,16 @@ class SewingReport(db.Model):
     notes = db.Column(db.Text)
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_sewing_report_date_shift', 'date', 'shift'),
+        db.Index('ix_sewing_report_operator_id_date', 'operator_id', 'date'),
+        db.Index('ix_sewing_report_date_created_at', 'date', 'created_at'),  # لیست اخیرها
+        db.Index('ix_sewing_report_created_at', 'created_at'),
+        db.Index('ix_sewing_report_date_updated_at', 'date', 'updated_at'),
+        db.Index('ix_sewing_report_roll_barcode', 'roll_barcode'),  # پیوند دوخت به رول گردباف
+    )
 
 
 class MachineIssue(db.Model):
@@ -164,26 +306,715 @@ class MachineIssue(db.Model):
     reported_by = db.Column(db.Integer, db.ForeignKey('user.id'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_machine_issue_section_date', 'section', 'date'),
+        db.Index('ix_machine_issue_section_machine_date', 'section', 'machine_number', 'date'),
+    )
+
+
+class RollLineage(db.Model):
+    """شجره هر رول: گزارش اکسترودر نخ مصرفی → گزارش گردباف تولید رول
+
+    گزارش‌های دوخت با همان roll_barcode (ایندکس‌دار) به رول وصل می‌شوند.
+    """
+    __tablename__ = 'roll_lineage'
+    id = db.Column(db.Integer, primary_key=True)
+    roll_barcode = db.Column(db.String(100), nullable=False, unique=True)
+    circular_report_id = db.Column(db.Integer, db.ForeignKey('circular_report.id'), nullable=False)
+    extruder_report_id = db.Column(db.Integer, db.ForeignKey('extruder_report.id'))
+    date = db.Column(db.Date, nullable=False)  # تاریخ تولید رول (همان گزارش گردباف)
+
+    __table_args__ = (
+        # پوششی برای جمع بازده یک بازه: فقط همین ایندکس خوانده می‌شود
+        db.Index('ix_roll_lineage_date', 'date', 'circular_report_id', 'roll_barcode', 'extruder_report_id'),
+        db.Index('ix_roll_lineage_circular_report_id', 'circular_report_id'),
+        db.Index('ix_roll_lineage_extruder_report_id', 'extruder_report_id'),
+    )
+
+
+class ProductionRollup(db.Model):
+    """جدول تجمیعی روزانه/شیفتی تولید (از روی گزارش‌های خام ساخته می‌شود)"""
+    __tablename__ = 'production_rollup'
+    id = db.Column(db.Integer, primary_key=True)
+    section = db.Column(db.String(50), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    shift = db.Column(db.String(20), nullable=False)
+    machine_number = db.Column(db.Integer, nullable=False, default=0)  # 0 برای بخش‌های بدون دستگاه
+    operator_id = db.Column(db.Integer, db.ForeignKey('operator.id'), nullable=False)
+    value_sum = db.Column(db.Float, nullable=False, default=0)
+    value_count = db.Column(db.Integer, nullable=False, default=0)  # تعداد مقادیر غیرخالی
+    report_count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('section', 'date', 'shift', 'machine_number', 'operator_id',
+                            name='uq_production_rollup_key'),
+    )
+
+    @property
+    def value_avg(self):
+        return self.value_sum / self.value_count if self.value_count else 0
+
+
+class DataVersion(db.Model):
+    """نسخه داده هر بخش (و machines)؛ در همان تراکنش هر نوشتن یک واحد بالا می‌رود
+
+    برخلاف نسل‌های کش پاسخ (که در backend حافظه مخصوص هر worker است) در دیتابیس اصلی است،
+    پس ETag پاسخ‌های تحلیلی بین workerها و بعد از ری‌استارت یکی می‌ماند.
+    """
+    __tablename__ = 'data_version'
+    tag = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+archive.register(CircularReport, ExtruderReport, SewingReport, MachineIssue)
+
+# جستجوی متنی: نام اپراتور جدا نمایه می‌شود؛ ستون‌های زیر متن قابل جستجوی هر نوع‌اند
+search_index.register('circular', CircularReport, ['notes', 'color', 'cleanliness'], section='circular')
+search_index.register('extruder', ExtruderReport, ['notes', 'color'], section='extruder')
+search_index.register('sewing', SewingReport, ['notes', 'color', 'roll_barcode'], section='sewing')
+search_index.register('issue', MachineIssue, ['issue_type', 'description'])
+event.listen(db.metadata, 'after_create', lambda target, connection, **kw: search_index.create(connection))
+
+# مدل گزارش و فیلد مقدار اصلی هر بخش
+SECTION_MODELS = {'circular': CircularReport, 'extruder': ExtruderReport, 'sewing': SewingReport}
+SECTION_VALUE_FIELDS = {'circular': 'footage', 'extruder': 'material_weight', 'sewing': 'bags_produced'}
+for _section, _model in SECTION_MODELS.items():
+    snapshots.register(_section, _model)
+ROLLUP_COLUMNS = ['section', 'date', 'shift', 'machine_number', 'operator_id',
+                  'value_sum', 'value_count', 'report_count']
+
+
+def rollup_key(report):
+    """کلید سطر تجمیعی یک گزارش: (تاریخ، شیفت، دستگاه، اپراتور)"""
+    return (report.date, report.shift, getattr(report, 'machine_number', None) or 0, report.operator_id)
+
+
+def _rollup_select(section, model, *criteria):
+    value = getattr(model, SECTION_VALUE_FIELDS[section])
+    if hasattr(model, 'machine_number'):
+        machine = func.coalesce(model.machine_number, 0)
+    else:
+        machine = literal(0)
+    return select(
+        literal(section), model.date, model.shift, machine, model.operator_id,
+        func.coalesce(func.sum(value), 0), func.count(value), func.count(model.id)
+    ).where(*criteria).group_by(model.date, model.shift, machine, model.operator_id)
+
+
+def refresh_rollups(section, keys):
+    """بازسازی سطرهای تجمیعی کلیدهای تغییرکرده؛ در همان تراکنش نوشتن و قبل از commit صدا زده شود
+
+    نسخه داده بخش هم در همین تراکنش بالا می‌رود (هر ثبت، ویرایش و حذف گزارش از اینجا می‌گذرد).
+    """
+    model = SECTION_MODELS[section]
+    db.session.flush()
+    for report_date, shift, machine, operator in set(keys):
+        criteria = [model.date == report_date, model.shift == shift, model.operator_id == operator]
+        if hasattr(model, 'machine_number'):
+            criteria.append(func.coalesce(model.machine_number, 0) == machine)
+        db.session.execute(
+            delete(ProductionRollup).where(
+                ProductionRollup.section == section,
+                ProductionRollup.date == report_date,
+                ProductionRollup.shift == shift,
+                ProductionRollup.machine_number == machine,
+                ProductionRollup.operator_id == operator
+            ).execution_options(synchronize_session=False)
+        )
+        db.session.execute(
+            insert(ProductionRollup).from_select(ROLLUP_COLUMNS, _rollup_select(section, model, *criteria))
+        )
+    bump_data_version(section)
+
+
+def rebuild_rollups(section, start_date=None, end_date=None):
+    """بازسازی جدول تجمیعی یک بخش (کل تاریخچه یا یک بازه) با یک INSERT ... SELECT
+
+    گزارش‌های بایگانی‌شده هم خوانده می‌شوند؛ ضمیمه کردن بایگانی‌ها قبل از اولین نوشتن تراکنش است.
+    ورود گروهی، کار پس‌زمینه و دستور flask از همین مسیر نسخه داده بخش را بالا می‌برند.
+    """
+    model = archive.source(SECTION_MODELS[section], start_date, end_date)
+    criteria, rollup_criteria = [], [ProductionRollup.section == section]
+    if start_date:
+        criteria.append(model.date >= start_date)
+        rollup_criteria.append(ProductionRollup.date >= start_date)
+    if end_date:
+        criteria.append(model.date <= end_date)
+        rollup_criteria.append(ProductionRollup.date <= end_date)
+    db.session.execute(delete(ProductionRollup).where(*rollup_criteria).execution_options(synchronize_session=False))
+    db.session.execute(insert(ProductionRollup).from_select(ROLLUP_COLUMNS, _rollup_select(section, model, *criteria)))
+    bump_data_version(section)
+
+
+def publish_changes(section, keys):
+    """انتشار delta روزهای تغییرکرده برای جریان زنده داشبورد (بعد از commit صدا زده شود)"""
+    if live_updates.broker is None:
+        return
+    # مشترکین نام اپراتور را می‌بینند، نه شناسه
+    names = operator_names(key[3] for key in keys)
+    changed = {}
+    for report_date, shift, machine, operator in set(keys):
+        changed.setdefault(report_date, []).append([shift, machine, names.get(operator, '')])
+    R = ProductionRollup
+    for report_date, day_keys in changed.items():
+        rows = db.session.query(
+            R.shift, R.machine_number, Operator.name, R.value_sum, R.value_count
+        ).join(Operator, Operator.id == R.operator_id).filter(R.section == section, R.date == report_date).all()
+        live_updates.publish({
+            'type': 'delta',
+            'section': section,
+            'date': report_date.isoformat(),
+            'changed': sorted(day_keys),
+            'rows': [list(row) for row in rows],
+        })
+
+
+# Data Versions
+def bump_data_version(*tags, connection=None):
+    """افزایش نسخه داده برچسب‌ها در تراکنش جاری (connection: اتصال رویدادهای mapper هنگام flush)"""
+    now = datetime.utcnow()
+    stmt = sqlite_insert(DataVersion).values([{'tag': tag, 'version': 1, 'updated_at': now} for tag in tags])
+    stmt = stmt.on_conflict_do_update(index_elements=[DataVersion.tag],
+                                      set_={'version': DataVersion.version + 1, 'updated_at': now})
+    (connection or db.session).execute(stmt)
+
+
+def data_versions(tags):
+    """{برچسب: (نسخه، زمان آخرین تغییر)} با جستجوی کلید اصلی؛ برچسب بدون سطر یعنی نسخه 0"""
+    rows = db.session.execute(
+        select(DataVersion.tag, DataVersion.version, DataVersion.updated_at).where(DataVersion.tag.in_(tags))
+    ).all()
+    return {tag: (version, updated_at) for tag, version, updated_at in rows}
+
+
+def conditional(tags):
+    """GET شرطی: ETag و Last-Modified از نسخه داده برچسب‌ها؛ If-None-Match برابر → 304 بدون اجرای view
+
+    tags مثل response_cache.cached تابع پارامترهای نرمال‌شده است. نسخه‌ها قبل از اجرای view
+    خوانده می‌شوند؛ اگر وسط کار داده تغییر کند ETag از بدنه قدیمی‌تر است و درخواست بعدی پاسخ
+    کامل می‌گیرد، نه 304 کهنه. تاریخ امروز در ETag است چون بازه‌های نسبی (today، 7d) به آن وابسته‌اند.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            params = normalize_args(request.args)
+            names = sorted(set(tags(params)))
+            versions = data_versions(names)
+            state = [request.endpoint, date.today().isoformat(), *(f'{key}={value}' for key, value in params)]
+            state += [f'{name}:{versions[name][0]}:{versions[name][1].isoformat()}' if name in versions else f'{name}:0'
+                      for name in names]
+            etag = hashlib.sha1('|'.join(state).encode()).hexdigest()[:24]
+
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            modified = [updated_at for _, updated_at in versions.values()]
+            if modified:
+                response.last_modified = max(modified)
+            # مرورگر هر بار با If-None-Match دوباره می‌پرسد (پاسخ به کاربر وابسته نیست ولی پشت ورود است)
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
+
+def _touch_data_version(target, *tags):
+    """ثبت برچسب‌های تغییرکرده در session؛ بعد از flush هر برچسب فقط یک بار بالا می‌رود"""
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('data_version_tags', set()).update(tags)
+
+
+def _bump_issue_version(mapper, connection, target):
+    # مسائل روی تشخیص دستگاه همان بخش اثر دارند
+    if target.section:
+        _touch_data_version(target, target.section)
+
+
+def _bump_machine_version(mapper, connection, target):
+    # استاندارد دستگاه در راندمان همه بخش‌ها اثر دارد (مثل ابطال کش پاسخ)
+    _touch_data_version(target, 'machines', *SECTION_MODELS)
+
+
+event.listen(MachineIssue, 'after_insert', _bump_issue_version)
+for _event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Machine, _event_name, _bump_machine_version)
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_flushed_versions(session, flush_context):
+    """یک upsert برای همه برچسب‌های یک flush (مثلاً init_db با ۱۵ دستگاه فقط یک بار machines را بالا می‌برد)"""
+    tags = session.info.pop('data_version_tags', None)
+    if tags:
+        bump_data_version(*sorted(tags), connection=session.connection())
+
+
+# اطلاعات دستگاه در کش (استاندارد از قبل با STANDARD_FOOTAGE ادغام شده است)
+MachineInfo = namedtuple('MachineInfo', 'id machine_number section status standard_footage standard')
+
+
+def _load_machines(section):
+    return [
+        MachineInfo(m.id, m.machine_number, m.section, m.status, m.standard_footage,
+                    m.standard_footage or STANDARD_FOOTAGE.get(m.machine_number, 800))
+        for m in Machine.query.filter_by(section=section).order_by(Machine.machine_number).all()
+    ]
+
+
+def _load_user(user_id):
+    user = db.session.get(User, user_id)
+    if user is not None:
+        db.session.expunge(user)  # بین درخواست‌ها مشترک است؛ به session هیچ درخواستی وابسته نماند
+    return user
+
+
+# TTL از REGISTRY_TTL در create_app
+machine_registry = Registry(_load_machines)
+user_registry = Registry(_load_user)
+
+
+def _load_operator_id(normalized_name):
+    query = select(Operator.id).where(Operator.normalized_name == normalized_name)
+    if is_memory_database(db.engine.url):
+        # SQLite حافظه یک اتصال مشترک دارد و بستن اتصال دوم تراکنش session را rollback می‌کند؛
+        # شناسه‌ای که از درج همین تراکنش کش شود با rollback آن دور ریخته می‌شود
+        return db.session.execute(query).scalar()
+    # اتصال جدا از session: فقط اپراتورهای commit شده کش می‌شوند، نه درج تراکنشی که شاید rollback شود
+    with db.engine.connect() as connection:
+        return connection.execute(query).scalar()
+
+
+# اپراتورها حذف یا تغییر نام نمی‌شوند؛ کش نام یکسان‌سازی‌شده → شناسه
+operator_registry = Registry(_load_operator_id)
+
+
+def resolve_operator(name):
+    """شناسه اپراتور یک نام (املاهای مختلف با normalize یکی می‌شوند)؛ نام تازه در تراکنش جاری ثبت می‌شود"""
+    key = normalize(name)
+    operator_id = operator_registry.get(key)
+    if operator_id is None:
+        # OR IGNORE: ممکن است worker دیگری همزمان همین نام را ثبت کرده باشد
+        db.session.execute(insert(Operator).prefix_with('OR IGNORE').values(name=name, normalized_name=key))
+        db.session.info.setdefault('dirty_registries', set()).add('Operator')
+        operator_id = db.session.execute(select(Operator.id).where(Operator.normalized_name == key)).scalar()
+    return operator_id
+
+
+def operator_names(ids, session=None):
+    """{شناسه: نام نمایشی} اپراتورها؛ تحلیل‌ها روی شناسه گروه‌بندی می‌کنند و نام فقط برای نمایش است"""
+    ids = {operator_id for operator_id in ids if operator_id is not None}
+    if not ids:
+        return {}
+    return dict((session or db.session).execute(select(Operator.id, Operator.name).where(Operator.id.in_(ids))).all())
+
+
+def _mark_registry_dirty(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('dirty_registries', set()).add(type(target).__name__)
+
+
+for _model in (User, Machine):
+    for _event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event_name, _mark_registry_dirty)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_registries(session):
+    """ابطال کش کاربران/دستگاه‌ها بعد از commit هر تغییری روی آن‌ها (مثلاً تغییر رمز یا تنظیم دستگاه)"""
+    dirty = session.info.pop('dirty_registries', ())
+    if 'User' in dirty:
+        user_registry.invalidate()
+    if 'Machine' in dirty:
+        machine_registry.invalidate()
+        # استاندارد دستگاه‌ها در پاسخ‌های تحلیلی همه بخش‌ها اثر دارد
+        response_cache.invalidate('machines', *SECTION_MODELS)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_registry_changes(session):
+    if 'Operator' in session.info.pop('dirty_registries', ()):
+        operator_registry.invalidate()
+    session.info.pop('data_version_tags', None)
+
+
+def machine_standards(section='circular'):
+    """متراژ استاندارد هر شیفت برای دستگاه‌های یک بخش (شناسه دستگاه → استاندارد)"""
+    return {m.id: m.standard for m in machine_registry.get(section)}
+
+
+def parse_date_arg(value):
+    """تاریخ ورودی (میلادی یا شمسی ۱۴xx، با اعداد فارسی) → date"""
+    value = fa_to_en(value.strip())
+    if value.startswith('14'):
+        y, m, d = map(int, value.replace('/', '-').split('-'))
+        return jdate(y, m, d).togregorian()
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def report_range(args):
+    """(start_date، end_date) فیلترهای درخواست برای انتخاب بایگانی‌ها؛ None برای بازه باز"""
+    return tuple(parse_date_arg(args[key]) if args.get(key) else None for key in ('start_date', 'end_date'))
+
+
+def report_criteria(model, args):
+    """فیلترهای برابری درخواست به صورت {ستون: مقدار} (شیفت، اپراتور، دستگاه)
+
+    فیلتر اپراتور روی شناسه است؛ پس همه املاهای ثبت‌شده یک نفر را برمی‌گرداند.
+    """
+    criteria = {}
+    if args.get('shift'):
+        criteria['shift'] = args['shift']
+    if args.get('operator'):
+        criteria['operator_id'] = operator_registry.get(normalize(args['operator'])) or 0  # 0: اپراتور ناشناخته
+    if args.get('machine') and hasattr(model, 'machine_number'):
+        criteria['machine_number'] = int(fa_to_en(args['machine']))
+    return criteria
+
+
+def report_filters(model, args):
+    """فیلترهای لیست/خروجی گزارش: بازه تاریخ، شیفت، اپراتور و دستگاه (ValueError برای مقدار نامعتبر)"""
+    start_date, end_date = report_range(args)
+    filters = []
+    if start_date:
+        filters.append(model.date >= start_date)
+    if end_date:
+        filters.append(model.date <= end_date)
+    filters += [getattr(model, name) == value for name, value in report_criteria(model, args).items()]
+    return filters
+
+
+class ReportValidationError(ValueError):
+    """خطای اعتبارسنجی یک سطر گزارش (پیام آن مستقیم به کاربر نمایش داده می‌شود)"""
+
+
+def _raw(data, key):
+    value = data.get(key)
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    return value
+
+
+def _text(data, key):
+    value = _raw(data, key)
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # سلول عددی اکسل (مثلاً بارکد)
+    return None if value is None else str(value)
+
+
+def _float(data, key, default=None):
+    value = _raw(data, key)
+    if value is None:
+        return default
+    try:
+        return float(fa_to_en(value).replace(',', '') if isinstance(value, str) else value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _int(data, key, default=None):
+    value = _raw(data, key)
+    if value is None:
+        return default
+    try:
+        return int(fa_to_en(value).replace(',', '') if isinstance(value, str) else value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _required(data, key, message):
+    value = _text(data, key)
+    if value is None:
+        raise ReportValidationError(message)
+    return value
+
+
+def _report_date(data):
+    value = _raw(data, 'date')
+    if value is None:
+        raise ReportValidationError('تاریخ الزامی است.')
+    if isinstance(value, datetime):
+        value = value.date()
+    elif not isinstance(value, date):
+        try:
+            value = parse_date_arg(str(value))
+        except ValueError:
+            raise ReportValidationError('خطای تاریخ: فرمت صحیح YYYY-MM-DD است')
+    if archive.overlapping(value, value):
+        raise ReportValidationError('سال این تاریخ بایگانی شده و گزارش جدید نمی‌پذیرد.')
+    return value
+
+
+def roll_code(value):
+    """بارکد رول یکسان‌شده (ارقام لاتین، حروف بزرگ، بدون فاصله) تا گردباف و دوخت روی یک مقدار join شوند"""
+    return normalize(value).replace(' ', '').upper() or None
+
+
+# نخ مصرفی هر رول حداکثر این مدت قبل از بافت آن اکسترود شده است (کران بایگانی‌های لازم برای شجره)
+ROLL_YARN_MAX_AGE = timedelta(days=60)
+
+
+def roll_lineage(values, data, seen=(), report_id=None):
+    """مقادیر سطر شجره یک گزارش گردباف (بدون circular_report_id)؛ None اگر بارکد رول نداشته باشد
+
+    نخ مصرفی با extruder_report_id (شناسه گزارش اکسترودر) در فرم یا سطر ورودی مشخص می‌شود.
+    seen: بارکدهای همان فایل ورودی؛ report_id: گزارشی که بارکد فعلاً مال خودش است (ویرایش).
+    """
+    code = values.get('roll_barcode')
+    extruder_report_id = _int(data, 'extruder_report_id')
+    if not code:
+        if extruder_report_id is not None:
+            raise ReportValidationError('برای ثبت نخ مصرفی، بارکد رول الزامی است.')
+        return None
+    owner = db.session.execute(
+        select(RollLineage.circular_report_id).where(RollLineage.roll_barcode == code)
+    ).scalar()
+    if code in seen or (owner is not None and owner != report_id):
+        raise ReportValidationError(f'بارکد رول {code} قبلاً ثبت شده است.')
+    if extruder_report_id is not None:
+        extruder = db.session.get(ExtruderReport, extruder_report_id)
+        if extruder is None:
+            raise ReportValidationError('گزارش اکسترودر نخ مصرفی پیدا نشد.')
+        if not values['date'] - ROLL_YARN_MAX_AGE <= extruder.date <= values['date']:
+            raise ReportValidationError('تاریخ گزارش اکسترودر نخ مصرفی با تاریخ تولید رول نمی‌خواند.')
+    return {'roll_barcode': code, 'extruder_report_id': extruder_report_id, 'date': values['date']}
+
+
+def update_roll_lineage(report, data):
+    """هم‌راستا کردن سطر شجره با گزارش گردباف ویرایش‌شده (بارکد، تاریخ یا نخ مصرفی)"""
+    report.roll_barcode = roll_code(report.roll_barcode)
+    current = RollLineage.query.filter_by(circular_report_id=report.id).first()
+    lineage = roll_lineage({'roll_barcode': report.roll_barcode, 'date': report.date}, data, report_id=report.id)
+    if lineage is None:
+        if current is not None:
+            db.session.delete(current)
+        return
+    if current is None:
+        db.session.add(RollLineage(circular_report_id=report.id, **lineage))
+        return
+    if lineage['extruder_report_id'] is None:
+        lineage['extruder_report_id'] = current.extruder_report_id  # فرم نخ مصرفی را نفرستاده
+    for key, value in lineage.items():
+        setattr(current, key, value)
+
+
+def parse_circular_row(data):
+    """فیلدهای گزارش گردباف از فرم یا یک سطر ورودی گروهی"""
+    report_date = _report_date(data)
+    shift = _required(data, 'shift', 'شیفت کاری الزامی است.')
+    machine_number = _int(data, 'machine_number')
+    if machine_number is None:
+        raise ReportValidationError('شماره دستگاه الزامی است و باید عددی باشد.')
+    operator_name = _required(data, 'operator_name', 'نام اپراتور الزامی است.')
+    footage = _float(data, 'footage')
+    if footage is None:
+        raise ReportValidationError('متراژ الزامی است و باید عددی باشد.')
+    return {
+        'date': report_date,
+        'shift': shift,
+        'machine_number': machine_number,
+        'operator_name': operator_name,
+        'bag_width': _float(data, 'bag_width'),
+        'color': _text(data, 'color'),
+        'cleanliness': _text(data, 'cleanliness'),
+        'machine_speed': _float(data, 'machine_speed'),
+        'footage': footage,
+        'roll_weight': _float(data, 'roll_weight'),
+        'roll_barcode': roll_code(_text(data, 'roll_barcode')),
+        'downtime_hours': _float(data, 'downtime_hours', default=0.0),
+        'notes': _text(data, 'notes'),
+    }
+
+
+def parse_extruder_row(data):
+    """فیلدهای گزارش اکسترودر؛ جز تاریخ، شیفت و اپراتور همه اختیاری‌اند"""
+    values = {
+        'date': _report_date(data),
+        'shift': _required(data, 'shift', 'شیفت کاری الزامی است.'),
+        'operator_name': _required(data, 'operator_name', 'نام اپراتور الزامی است.'),
+        'denier_measurement_time': _text(data, 'denier_measurement_time'),
+        'color': _text(data, 'color'),
+        'notes': _text(data, 'notes'),
+    }
+    for key in ('color_material', 'carbon_material', 'brightener_material', 'material_weight',
+                'machine_speed', 'water_temp', 'mardon_temp', 'mold_temp', 'furnace_temp',
+                'salon_denier', 'wall_denier', 'remaining_weight', 'waste'):
+        values[key] = _float(data, key)
+    return values
+
+
+def parse_sewing_row(data):
+    """فیلدهای گزارش دوخت و برش؛ مقادیر عددی خالی صفر ثبت می‌شوند"""
+    report_date = _report_date(data)
+    shift = _text(data, 'shift')
+    operator_name = _text(data, 'operator_name') or _text(data, 'operatorSelect')
+    if not shift or not operator_name:
+        raise ReportValidationError('شیفت کاری و نام اپراتور الزامی هستند.')
+    values = {
+        'date': report_date,
+        'shift': shift,
+        'operator_name': operator_name,
+        'roll_barcode': roll_code(_text(data, 'roll_barcode')),
+        'color': _text(data, 'color'),
+        'notes': _text(data, 'notes'),
+    }
+    for key in ('roll_weight', 'footage', 'bag_width', 'bag_length', 'waste'):
+        values[key] = _float(data, key, default=0.0)
+    for key in ('bags_produced', 'grade_b_bags', 'unsewn_bags', 'bundle_count'):
+        values[key] = _int(data, key, default=0)
+    return values
+
+
+SECTION_PARSERS = {'circular': parse_circular_row, 'extruder': parse_extruder_row, 'sewing': parse_sewing_row}
+
+
+def operational_issue(section, values, user_id):
+    """مسئله دستگاه از توضیحات گزارش گردباف (None اگر توضیحی نباشد)"""
+    if section != 'circular' or not values.get('notes'):
+        return None
+    return {
+        'machine_number': values['machine_number'],
+        'section': section,
+        'issue_type': 'گزارش عملیاتی',
+        'description': values['notes'],
+        'date': values['date'],
+        'shift': values['shift'],
+        'reported_by': user_id,
+    }
+
+
+IngestResult = namedtuple('IngestResult', 'inserted errors failed pending')
+
+
+def ingest_reports(section, rows, user_id, batch_size=1000):
+    """درج گروهی گزارش‌ها؛ هر دسته در یک تراکنش با INSERT چندسطری (executemany)
+
+    سطرهای نامعتبر درج نمی‌شوند و در گزارش خطا با شماره سطر (از ۱) برمی‌گردند.
+    جدول تجمیعی برای بازه تاریخ هر دسته در همان تراکنش بازسازی می‌شود.
+
+    اگر commit یک دسته با خطای پایگاه داده شکست بخورد، دسته‌های قبلی ثبت‌شده می‌مانند، سطرهای
+    همان دسته (failed) با خطا در errors می‌آیند و ورود متوقف می‌شود؛ pending تعداد سطرهای
+    بعدی است که بررسی نشده‌اند (از سطر بعد از آخرین سطر دسته می‌توان دوباره ارسال کرد).
+    """
+    model, parse = SECTION_MODELS[section], SECTION_PARSERS[section]
+    errors, batch, lineages, numbers, inserted = [], [], [], [], 0
+    seen_rolls = set()
+
+    def flush(batch, lineages):
+        issues = [issue for issue in (operational_issue(section, values, user_id) for values in batch) if issue]
+        try:
+            if any(lineages):
+                # شناسه گزارش‌ها (به ترتیب سطرها) برای سطرهای شجره رول
+                ids = db.session.execute(
+                    insert(model).returning(model.id, sort_by_parameter_order=True), batch
+                ).scalars().all()
+                db.session.execute(insert(RollLineage), [
+                    dict(lineage, circular_report_id=report_id)
+                    for report_id, lineage in zip(ids, lineages) if lineage
+                ])
+            else:
+                db.session.execute(insert(model), batch)
+            if issues:
+                db.session.execute(insert(MachineIssue), issues)
+                # درج Core رویداد mapper ندارد
+                bump_data_version(*{issue['section'] for issue in issues})
+            rebuild_rollups(section, min(v['date'] for v in batch), max(v['date'] for v in batch))
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            current_app.logger.exception('bulk ingest of %s failed in a batch of %d rows', section, len(batch))
+            return None
+        return len(batch)
+
+    failed = pending = 0
+    for number, row in enumerate(rows, 1):
+        if not isinstance(row, dict):
+            errors.append({'row': number, 'error': 'سطر باید یک شیء با نام فیلدها باشد'})
+            continue
+        try:
+            values = parse(row)
+            lineage = roll_lineage(values, row, seen_rolls) if section == 'circular' else None
+        except ReportValidationError as e:
+            errors.append({'row': number, 'error': str(e)})
+            continue
+        if lineage:
+            seen_rolls.add(lineage['roll_barcode'])
+        values['created_by'] = user_id
+        values['operator_id'] = resolve_operator(values['operator_name'])
+        batch.append(values)
+        lineages.append(lineage)
+        numbers.append(number)
+        if len(batch) >= batch_size:
+            count = flush(batch, lineages)
+            if count is None:
+                pending = len(rows) - number
+                break
+            inserted += count
+            batch, lineages, numbers = [], [], []
+    else:
+        count = flush(batch, lineages) if batch else 0
+        if count is not None:
+            inserted += count
+            batch, numbers = [], []
+    if batch:
+        # دسته‌ای که commit نشد
+        failed = len(batch)
+        errors.extend({'row': n, 'error': 'خطای پایگاه داده؛ این دسته ثبت نشد'} for n in numbers)
+        errors.sort(key=lambda error: error['row'])
+    # دسته‌های ثبت‌شده حتی اگر دسته بعدی شکست خورده باشد
+    if inserted:
+        response_cache.invalidate(section)
+        live_updates.publish({'type': 'reload', 'section': section})
+    return IngestResult(inserted, errors, failed, pending)
+
+
+def read_report_file(stream, filename):
+    """سطرهای یک فایل ورودی (json، csv یا xlsx) به صورت لیست dict"""
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension == '.json':
+        rows = json.load(stream)
+        if not isinstance(rows, list):
+            raise ValueError('فایل JSON باید آرایه‌ای از گزارش‌ها باشد')
+        return rows
+    if extension == '.csv':
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        return list(csv.DictReader(text))
+    if extension in ('.xlsx', '.xlsm'):
+        from openpyxl import load_workbook
+
+        sheet = load_workbook(stream, read_only=True, data_only=True).active
+        rows = sheet.iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else '' for cell in next(rows, ())]
+        return [dict(zip(header, row)) for row in rows if any(cell is not None for cell in row)]
+    raise ValueError('فرمت فایل پشتیبانی نمی‌شود (json، csv یا xlsx)')
+
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_registry.get(int(user_id))
 
 
-@app.context_processor
+@main_bp.app_context_processor
 def inject_now():
     return {'now': datetime.now()}
 
 
 
 # Routes
-@app.route('/')
+@main_bp.route('/')
 @login_required
 def index():
     return render_template('dashboard.html', user=current_user)
 
 
-@app.route('/login', methods=['GET', 'POST'])
+@main_bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form.get('username')
@@ -192,21 +1023,21 @@ def login():
 
         if user and user.check_password(password):
             login_user(user)
-            return redirect(url_for('index'))
+            return redirect(url_for('main.index'))
         else:
             flash('نام کاربری یا رمز عبور اشتباه است', 'error')
 
     return render_template('login.html')
 
 
-@app.route('/logout')
+@main_bp.route('/logout')
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
 
-@app.route('/change-password', methods=['GET', 'POST'])
+@main_bp.route('/change-password', methods=['GET', 'POST'])
 @login_required
 def change_password():
     if request.method == 'POST':
@@ -214,10 +1045,12 @@ def change_password():
         new_password = request.form.get('new_password')
 
         if current_user.check_password(old_password):
-            current_user.set_password(new_password)
+            # current_user از کش می‌آید و به session وصل نیست
+            user = db.session.get(User, current_user.id)
+            user.set_password(new_password)
             db.session.commit()
             flash('رمز عبور با موفقیت تغییر کرد', 'success')
-            return redirect(url_for('index'))
+            return redirect(url_for('main.index'))
         else:
             flash('رمز عبور فعلی اشتباه است', 'error')
 
@@ -225,73 +1058,35 @@ def change_password():
 
 
 # Report Routes
-@app.route('/report/circular', methods=['GET', 'POST'])
+@reports_bp.route('/report/circular', methods=['GET', 'POST'])
 @login_required
 def circular_report():
     if request.method == 'POST':
         try:
-            # تابع کمکی برای تبدیل امن به float (رشته خالی → None یا default)
-            def get_float(key, default=None):
-                value = request.form.get(key)
-                if value is None or value.strip() == '':
-                    return default
-                try:
-                    return float(value)
-                except ValueError:
-                    return default
-
-            # فیلدهای اجباری را مستقیم بگیرید (فرم اعتبارسنجی سمت کاربر دارد، اما اینجا هم چک می‌کنیم)
-            date_str = request.form.get('date')
-            if not date_str:
-                flash('تاریخ الزامی است.', 'error')
-                return redirect(url_for('circular_report'))
-
-            report_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-
-            shift = request.form.get('shift')
-            machine_id = request.form.get('machine_number')
-            operator = request.form.get('operator_name')
-            footage_str = request.form.get('footage')
-
-            if not all([shift, machine_id, operator, footage_str]):
-                flash('فیلدهای الزامی را پر کنید.', 'error')
-                return redirect(url_for('circular_report'))
-
-            report = CircularReport(
-                date=report_date,
-                shift=shift,
-                machine_number=int(machine_id),
-                operator_name=operator,
-                bag_width=get_float('bag_width'),                  # اختیاری → None اگر خالی
-                color=request.form.get('color') or None,
-                cleanliness=request.form.get('cleanliness') or None,
-                machine_speed=get_float('machine_speed'),          # اختیاری → None اگر خالی
-                footage=float(footage_str),                        # اجباری
-                roll_weight=get_float('roll_weight'),              # اختیاری → None اگر خالی
-                downtime_hours=get_float('downtime_hours', default=0.0),  # پیش‌فرض 0
-                notes=request.form.get('notes'),
-                created_by=current_user.id
-            )
-
+            values = parse_circular_row(request.form)
+            lineage = roll_lineage(values, request.form)
+            values['operator_id'] = resolve_operator(values['operator_name'])
+            report = CircularReport(created_by=current_user.id, **values)
             db.session.add(report)
+            if lineage:
+                db.session.flush()
+                db.session.add(RollLineage(circular_report_id=report.id, **lineage))
 
             # فقط اگر توضیحات وجود داشت، مسئله ثبت شود
-            notes = request.form.get('notes')
-            if notes and notes.strip():
-                issue = MachineIssue(
-                    machine_number=report.machine_number,
-                    section='circular',
-                    issue_type='گزارش عملیاتی',
-                    description=notes.strip(),
-                    date=report.date,
-                    shift=report.shift,
-                    reported_by=current_user.id
-                )
-                db.session.add(issue)
+            issue = operational_issue('circular', values, current_user.id)
+            if issue:
+                db.session.add(MachineIssue(**issue))
 
+            keys = [rollup_key(report)]
+            refresh_rollups('circular', keys)
             db.session.commit()
+            response_cache.invalidate('circular')
+            publish_changes('circular', keys)
             flash('گزارش با موفقیت ثبت شد', 'success')
 
+        except ReportValidationError as ve:
+            db.session.rollback()
+            flash(str(ve), 'error')
         except ValueError as ve:
             db.session.rollback()
             flash(f'خطا در داده‌های عددی: مقدار معتبر وارد کنید.', 'error')
@@ -299,189 +1094,104 @@ def circular_report():
             db.session.rollback()
             flash(f'خطا در ثبت گزارش: {str(e)}', 'error')
 
-        return redirect(url_for('circular_report'))
+        return redirect(url_for('reports.circular_report'))
 
     # بخش GET — بدون تغییر (فقط کمی تمیزتر)
-    machines = Machine.query.filter_by(section='circular').order_by(Machine.machine_number).all()
+    machines = machine_registry.get('circular')
     recent_reports = CircularReport.query.order_by(desc(CircularReport.created_at)).limit(10).all()
     return render_template('circular_report.html', machines=machines, recent_reports=recent_reports)
 
 
-@app.route('/report/extruder', methods=['GET', 'POST'])
+@reports_bp.route('/report/extruder', methods=['GET', 'POST'])
 @login_required
 def extruder_report():
     if request.method == 'POST':
         try:
-            date_str = request.form.get('date')
-            if not date_str or date_str.strip() == '':
-                flash('تاریخ الزامی است.', 'error')
-                return redirect(url_for('extruder_report'))
-
-            date_str = fa_to_en(date_str.strip())
-
-            try:
-                # اگر شمسی بود (۱۴۰۴-۰۹-۲۲)
-                if date_str.startswith('14'):
-                    y, m, d = map(int, date_str.split('-'))
-                    report_date = jdate(y, m, d).togregorian()
-                else:
-                    # میلادی
-                    report_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-            except Exception as e:
-                flash('خطای تاریخ: فرمت صحیح YYYY-MM-DD است', 'error')
-                return redirect(url_for('extruder_report'))
-
-            shift = request.form.get('shift')
-            operator_name = request.form.get('operator_name')
-
-            if not shift:
-                flash('شیفت کاری الزامی است.', 'error')
-                return redirect(url_for('extruder_report'))
-
-            if not operator_name:
-                flash('نام اپراتور الزامی است.', 'error')
-                return redirect(url_for('extruder_report'))
-
-            # تابع‌های کمکی برای اختیاری بودن
-            def safe_float(key):
-                value = request.form.get(key)
-                if not value or value.strip() == '':
-                    return None
-                try:
-                    return float(value)
-                except:
-                    return None
-
-            def safe_str(key):
-                value = request.form.get(key)
-                return value.strip() if value else None
-
-            report = ExtruderReport(
-                date=report_date,
-                shift=shift,
-                operator_name=operator_name,
-                color_material=safe_float('color_material'),
-                carbon_material=safe_float('carbon_material'),
-                brightener_material=safe_float('brightener_material'),
-                material_weight=safe_float('material_weight'),
-                machine_speed=safe_float('machine_speed'),
-                water_temp=safe_float('water_temp'),
-                mardon_temp=safe_float('mardon_temp'),
-                mold_temp=safe_float('mold_temp'),
-                furnace_temp=safe_float('furnace_temp'),
-                denier_measurement_time=safe_str('denier_measurement_time'),
-                salon_denier=safe_float('salon_denier'),
-                wall_denier=safe_float('wall_denier'),
-                color=safe_str('color'),
-                remaining_weight=safe_float('remaining_weight'),
-                waste=safe_float('waste'),
-                notes=safe_str('notes'),
-                created_by=current_user.id
-            )
-
+            values = parse_extruder_row(request.form)
+            values['operator_id'] = resolve_operator(values['operator_name'])
+            report = ExtruderReport(created_by=current_user.id, **values)
             db.session.add(report)
+            keys = [rollup_key(report)]
+            refresh_rollups('extruder', keys)
             db.session.commit()
+            response_cache.invalidate('extruder')
+            publish_changes('extruder', keys)
             flash('گزارش با موفقیت ثبت شد (حتی با فیلدهای خالی)!', 'success')
 
+        except ReportValidationError as ve:
+            db.session.rollback()
+            flash(str(ve), 'error')
         except Exception as e:
             db.session.rollback()
             flash(f'خطای عمومی: {str(e)}', 'error')
 
-        return redirect(url_for('extruder_report'))
+        return redirect(url_for('reports.extruder_report'))
 
     # GET: نمایش اخیرها (اگر می‌خوای نمایش بدی، اما در کدت نبود – اضافه کردم)
     recent_reports = ExtruderReport.query.order_by(desc(ExtruderReport.created_at)).limit(10).all()
     return render_template('extruder_report.html', recent_reports=recent_reports)
 
 
-@app.route('/report/sewing', methods=['GET', 'POST'])
+@reports_bp.route('/report/sewing', methods=['GET', 'POST'])
 @login_required
 def sewing_report():
     recent_reports = SewingReport.query.order_by(SewingReport.date.desc(), SewingReport.created_at.desc()).limit(10).all()
 
     if request.method == 'POST':
         try:
-            # دریافت تاریخ از فیلد مخفی (gregorian-date)
-            date_str = request.form.get('date')  # این همان gregorian-date است
-
-            if not date_str or not date_str.strip():
-                flash('لطفاً تاریخ را از تقویم انتخاب کنید.', 'error')
-                return redirect(url_for('sewing_report'))
-
-            date_str = date_str.strip()
-
-            # تلاش برای تبدیل به تاریخ میلادی
-            try:
-                report_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-            except ValueError:
-                # اگر نشد، احتمالاً کاربر دستی نوشته یا مشکل دیگری وجود دارد
-                flash('تاریخ انتخاب شده نامعتبر است. لطفاً حتماً از تقویم شمسی استفاده کنید.', 'error')
-                return redirect(url_for('sewing_report'))
-
-            shift = request.form.get('shift')
-            operator_name = request.form.get('operator_name')
-            if not operator_name:
-                operator_name = request.form.get('operatorSelect')  # fallback
-
-            if not shift or not operator_name:
-                flash('شیفت کاری و نام اپراتور الزامی هستند.', 'error')
-                return redirect(url_for('sewing_report'))
-
-            operator_name = operator_name.strip()
-
-            # توابع کمکی
-            def get_float(key, default=0.0):
-                val = request.form.get(key)
-                if not val or val.strip() == '':
-                    return default
-                try:
-                    return float(val.replace(',', ''))  # پشتیبانی از ویرگول
-                except:
-                    return default
-
-            def get_int(key, default=0):
-                val = request.form.get(key)
-                if not val or val.strip() == '':
-                    return default
-                try:
-                    return int(val.replace(',', ''))
-                except:
-                    return default
-
-            report = SewingReport(
-                date=report_date,
-                shift=shift,
-                operator_name=operator_name,
-                roll_barcode=request.form.get('roll_barcode') or None,
-                roll_weight=get_float('roll_weight'),
-                footage=get_float('footage'),
-                bag_width=get_float('bag_width'),
-                bag_length=get_float('bag_length'),
-                color=request.form.get('color') or None,
-                bags_produced=get_int('bags_produced'),
-                grade_b_bags=get_int('grade_b_bags'),
-                unsewn_bags=get_int('unsewn_bags'),
-                bundle_count=get_int('bundle_count'),
-                waste=get_float('waste'),
-                notes=request.form.get('notes') or None,
-                created_by=current_user.id
-            )
-
+            # تاریخ از فیلد مخفی gregorian-date می‌آید (ورودی شمسی هم پذیرفته می‌شود)
+            values = parse_sewing_row(request.form)
+            values['operator_id'] = resolve_operator(values['operator_name'])
+            report = SewingReport(created_by=current_user.id, **values)
             db.session.add(report)
+            keys = [rollup_key(report)]
+            refresh_rollups('sewing', keys)
             db.session.commit()
+            response_cache.invalidate('sewing')
+            publish_changes('sewing', keys)
             flash('گزارش دوخت و برش با موفقیت ثبت شد.', 'success')
 
-        except Exception as e:
+        except ReportValidationError as ve:
+            db.session.rollback()
+            flash(str(ve), 'error')
+        except Exception:
             db.session.rollback()
+            current_app.logger.exception('sewing report failed')
             flash('خطایی در ثبت گزارش رخ داد. لطفاً دوباره تلاش کنید.', 'error')
-            print("Sewing Report Error:", e)
 
-        return redirect(url_for('sewing_report'))
+        return redirect(url_for('reports.sewing_report'))
 
     return render_template('sewing_report.html', recent_reports=recent_reports)
 
+@reports_bp.route('/api/reports/<section>/bulk', methods=['POST'])
+@login_required
+def bulk_ingest_reports(section):
+    """ثبت گروهی گزارش‌ها: بدنه JSON (آرایه) یا فایل csv/xlsx/json در فیلد file
+
+    سطرهای معتبر درج می‌شوند و برای بقیه خطای هر سطر برمی‌گردد.
+    """
+    if section not in SECTION_MODELS:
+        return jsonify({'error': 'بخش نامعتبر'}), 400
+    try:
+        upload = request.files.get('file')
+        if upload is not None:
+            rows = read_report_file(upload.stream, upload.filename)
+        else:
+            rows = request.get_json(silent=True)
+            if not isinstance(rows, list):
+                raise ValueError('بدنه درخواست باید آرایه JSON یا فایل csv/xlsx باشد')
+    except (ValueError, KeyError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    result = ingest_reports(section, rows, current_user.id)
+    # 500 فقط وقتی دسته‌ای در پایگاه داده شکست خورده؛ inserted دسته‌های ثبت‌شده قبل از آن است
+    return jsonify({'section': section, 'received': len(rows), 'inserted': result.inserted,
+                    'failed': result.failed, 'pending': result.pending,
+                    'errors': result.errors}), 500 if result.failed else 200
+
+
 # Edit/Delete Reports
-@app.route('/report/edit/<report_type>/<int:report_id>', methods=['GET', 'POST'])
+@reports_bp.route('/report/edit/<report_type>/<int:report_id>', methods=['GET', 'POST'])
 @login_required
 def edit_report(report_type, report_id):
     models = {'circular': CircularReport, 'extruder': ExtruderReport, 'sewing': SewingReport}
@@ -489,8 +1199,9 @@ def edit_report(report_type, report_id):
     report = model.query.get_or_404(report_id)
 
     if request.method == 'POST':
+        old_key = rollup_key(report)
         for key in request.form.keys():
-            if hasattr(report, key) and key not in ['id', 'created_at', 'created_by']:
+            if hasattr(report, key) and key not in ['id', 'created_at', 'created_by', 'operator_id']:
                 value = request.form.get(key)
                 if key == 'date':
                     value = datetime.strptime(value, '%Y-%m-%d').date()
@@ -499,38 +1210,191 @@ def edit_report(report_type, report_id):
                 elif key in ['bags_produced', 'grade_b_bags', 'unsewn_bags', 'bundle_count', 'machine_number']:
                     value = int(value) if value else 0
                 setattr(report, key, value)
+        report.operator_id = resolve_operator(report.operator_name)
+
+        if archive.overlapping(report.date, report.date):
+            db.session.rollback()
+            flash('سال این تاریخ بایگانی شده است', 'error')
+            return redirect(url_for('reports.edit_report', report_type=report_type, report_id=report_id))
+        try:
+            if report_type == 'circular':
+                update_roll_lineage(report, request.form)
+            elif report_type == 'sewing':
+                report.roll_barcode = roll_code(report.roll_barcode)
+        except ReportValidationError as e:
+            db.session.rollback()
+            flash(str(e), 'error')
+            return redirect(url_for('reports.edit_report', report_type=report_type, report_id=report_id))
 
+        keys = [old_key, rollup_key(report)]
+        refresh_rollups(report_type, keys)
         db.session.commit()
+        response_cache.invalidate(report_type)
+        publish_changes(report_type, keys)
         flash('گزارش با موفقیت ویرایش شد', 'success')
-        return redirect(url_for('manage_reports'))
+        return redirect(url_for('reports.manage_reports'))
 
-    machines = Machine.query.filter_by(section='circular').all() if report_type == 'circular' else []
+    machines = machine_registry.get('circular') if report_type == 'circular' else []
     return render_template('edit_report.html', report=report, report_type=report_type, machines=machines)
 
 
-@app.route('/report/delete/<report_type>/<int:report_id>')
+@reports_bp.route('/report/delete/<report_type>/<int:report_id>')
 @login_required
 def delete_report(report_type, report_id):
     models = {'circular': CircularReport, 'extruder': ExtruderReport, 'sewing': SewingReport}
     model = models.get(report_type)
     report = model.query.get_or_404(report_id)
+    old_key = rollup_key(report)
+    if report_type == 'circular':
+        db.session.execute(delete(RollLineage).where(RollLineage.circular_report_id == report.id))
+    elif report_type == 'extruder':
+        db.session.execute(
+            update(RollLineage).where(RollLineage.extruder_report_id == report.id).values(extruder_report_id=None)
+        )
     db.session.delete(report)
+    refresh_rollups(report_type, [old_key])
     db.session.commit()
+    response_cache.invalidate(report_type)
+    publish_changes(report_type, [old_key])
     flash('گزارش حذف شد', 'success')
-    return redirect(url_for('manage_reports'))
+    return redirect(url_for('reports.manage_reports'))
+
+
+MANAGE_PAGE_SIZE = 50
 
 
-@app.route('/manage-reports')
+def encode_cursor(report):
+    """مکان نما صفحه‌بندی keyset: «created_at,id» آخرین سطر صفحه"""
+    return f'{report.created_at.isoformat()},{report.id}'
+
+
+def report_page(model, filters, after=None, limit=MANAGE_PAGE_SIZE):
+    """یک صفحه گزارش به ترتیب (created_at, id) نزولی؛ (سطرها، مکان‌نمای صفحه بعد)
+
+    به جای OFFSET از شرط «بعد از آخرین سطر» استفاده می‌شود تا هزینه هر صفحه به طول
+    تاریخچه وابسته نباشد (ایندکس created_at در SQLite شامل rowid یعنی id هم هست).
+    """
+    criteria = list(filters)
+    if after:
+        created_at, report_id = after.rsplit(',', 1)
+        created_at, report_id = datetime.fromisoformat(created_at), int(report_id)
+        criteria.append(or_(
+            model.created_at < created_at,
+            and_(model.created_at == created_at, model.id < report_id)
+        ))
+    rows = model.query.filter(*criteria).order_by(desc(model.created_at), desc(model.id)).limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def report_row(report):
+    row = {}
+    for column in report.__table__.columns:
+        value = getattr(report, column.name)
+        row[column.name] = value.isoformat() if isinstance(value, (date, datetime)) else value
+    return row
+
+
+@reports_bp.route('/manage-reports')
 @login_required
 def manage_reports():
-    circular = CircularReport.query.order_by(desc(CircularReport.created_at)).all()
-    extruder = ExtruderReport.query.order_by(desc(ExtruderReport.created_at)).all()
-    sewing = SewingReport.query.order_by(desc(SewingReport.created_at)).all()
-    return render_template('manage_reports.html', circular=circular, extruder=extruder, sewing=sewing)
+    pages, cursors = {}, {}
+    try:
+        for report_type, model in SECTION_MODELS.items():
+            pages[report_type], cursors[report_type] = report_page(model, report_filters(model, request.args))
+    except ValueError:
+        flash('فیلتر نامعتبر: تاریخ YYYY-MM-DD و شماره دستگاه عددی باشد', 'error')
+        return redirect(url_for('reports.manage_reports'))
+    return render_template('manage_reports.html', circular=pages['circular'], extruder=pages['extruder'],
+                           sewing=pages['sewing'], cursors=cursors, filters=request.args)
+
+
+@reports_bp.route('/api/manage-reports/<report_type>')
+@login_required
+def manage_reports_page(report_type):
+    """صفحه بعدی گزارش‌های یک بخش برای بارگذاری تدریجی (?after=<cursor>&limit=...)"""
+    model = SECTION_MODELS.get(report_type)
+    if model is None:
+        return jsonify({'error': 'بخش نامعتبر'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', MANAGE_PAGE_SIZE)), 1), 500)
+        filters = report_filters(model, request.args)
+        reports, next_cursor = report_page(model, filters, request.args.get('after'), limit)
+    except ValueError:
+        return jsonify({'error': 'پارامتر نامعتبر (تاریخ، دستگاه، limit یا after)'}), 400
+    return jsonify({
+        'report_type': report_type,
+        'reports': [report_row(r) for r in reports],
+        'next_cursor': next_cursor
+    })
 
 
 # Analytics Routes with Filters
-@app.route('/analytics/operators')
+# بازه راندمان (درصد از استاندارد) هر سطح عملکرد: [حداقل, حداکثر)
+PERFORMANCE_BUCKETS = {'excellent': (90, None), 'good': (75, 90), 'average': (60, 75), 'weak': (None, 60)}
+LEADERBOARD_SORTS = ('rank', 'efficiency', 'avg_footage', 'avg_downtime', 'shift_count', 'operator_name')
+LEADERBOARD_PAGE_SIZE = 50
+
+
+def operator_leaderboard(start_date, end_date, shift=None, search=None, performance=None,
+                         sort='rank', descending=False, page=1, per_page=LEADERBOARD_PAGE_SIZE):
+    """رتبه‌بندی اپراتورهای گردباف کاملاً در دیتابیس؛ (سطرهای صفحه، تعداد کل)
+
+    راندمان هر گزارش نسبت به استاندارد همان دستگاهی است که اپراتور با آن کار کرده
+    (Machine.standard_footage یا STANDARD_FOOTAGE). رتبه و صدک با window function روی
+    همه اپراتورهای بازه حساب می‌شوند و بعد فیلتر عملکرد/جستجو و صفحه‌بندی اعمال می‌شود.
+    """
+    C = archive.source(CircularReport, start_date, end_date, sqlite_profile.reader)
+    standard = func.coalesce(
+        func.nullif(Machine.standard_footage, 0),
+        case(STANDARD_FOOTAGE, value=func.coalesce(Machine.machine_number, C.machine_number), else_=800)
+    )
+    criteria = [C.date >= start_date, C.date <= end_date]
+    if shift:
+        criteria.append(C.shift == shift)
+    grouped = select(
+        C.operator_id,
+        func.avg(C.footage).label('avg_footage'),
+        func.avg(C.downtime_hours).label('avg_downtime'),
+        func.count(C.id).label('shift_count'),
+        func.coalesce(func.avg(C.footage / standard) * 100, 0).label('efficiency')
+    ).select_from(C).outerjoin(
+        Machine, Machine.id == C.machine_number
+    ).where(*criteria).group_by(C.operator_id).subquery()
+
+    # گروه‌بندی روی شناسه؛ نام فقط برای نمایش (و مرتب‌سازی بر اساس نام) پیوند می‌شود
+    g = grouped.c
+    ranked = select(
+        g.operator_id, Operator.name.label('operator_name'),
+        g.avg_footage, g.avg_downtime, g.shift_count, g.efficiency,
+        func.rank().over(order_by=g.efficiency.desc()).label('rank'),
+        ((1 - func.percent_rank().over(order_by=g.efficiency.desc())) * 100).label('percentile')
+    ).join(Operator, Operator.id == g.operator_id).subquery()
+
+    r = ranked.c
+    conditions = []
+    if performance in PERFORMANCE_BUCKETS:
+        low, high = PERFORMANCE_BUCKETS[performance]
+        if low is not None:
+            conditions.append(r.efficiency >= low)
+        if high is not None:
+            conditions.append(r.efficiency < high)
+    if search:
+        # نمایه FTS (پیشوند کلمه‌ها) املاهای واردشده را می‌دهد؛ normalize آن‌ها را به شناسه اپراتور می‌رساند
+        names = sqlite_profile.reader.execute(search_index.operator_names(search, ['circular'])).scalars()
+        conditions.append(r.operator_id.in_(
+            select(Operator.id).where(Operator.normalized_name.in_({normalize(name) for name in names}))
+        ))
+
+    order = getattr(r, sort if sort in LEADERBOARD_SORTS else 'rank')
+    stmt = select(ranked, func.count().over().label('total')).where(*conditions).order_by(
+        order.desc() if descending else order, r.operator_name
+    ).limit(per_page).offset((page - 1) * per_page)
+    rows = sqlite_profile.reader.execute(stmt).all()
+    return rows, (rows[0].total if rows else 0)
+
+
+@analytics_bp.route('/analytics/operators')
 @login_required
 def operator_analytics():
     # دریافت days و تبدیل ایمن به عدد
@@ -545,81 +1409,68 @@ def operator_analytics():
     shift_filter = request.args.get('shift', '').strip()
     performance_filter = request.args.get('performance', '').strip()
     search_query = request.args.get('search', '').strip()
+    sort = request.args.get('sort', 'rank')
+    descending = request.args.get('order') == 'desc'
+    page = max(request.args.get('page', 1, type=int) or 1, 1)
+    per_page = min(max(request.args.get('per_page', LEADERBOARD_PAGE_SIZE, type=int) or 1, 1), 500)
 
     # محاسبه بازه زمانی
     end_date = date.today()
     start_date = end_date - timedelta(days=days)
 
-    # ساخت کوئری
-    query = db.session.query(
-        CircularReport.operator_name,
-        func.avg(CircularReport.footage).label('avg_footage'),
-        func.avg(CircularReport.downtime_hours).label('avg_downtime'),
-        func.count(CircularReport.id).label('shift_count')
-    ).filter(CircularReport.date >= start_date, CircularReport.date <= end_date)
-
-    if shift_filter:
-        query = query.filter(CircularReport.shift == shift_filter)
-
-    if search_query:
-        query = query.filter(CircularReport.operator_name.contains(search_query))
-
-    operators_data = query.group_by(CircularReport.operator_name).having(func.count(CircularReport.id) > 0).all()
-
-    # فیلتر عملکرد
-    if performance_filter:
-        filtered = []
-        for op in operators_data:
-            efficiency = (op.avg_footage / 3000) * 100 if op.avg_footage else 0
-            if (performance_filter == 'excellent' and efficiency >= 90) or \
-               (performance_filter == 'good' and 75 <= efficiency < 90) or \
-               (performance_filter == 'average' and 60 <= efficiency < 75) or \
-               (performance_filter == 'weak' and efficiency < 60):
-                filtered.append(op)
-        operators_data = filtered
+    operators_data, total = operator_leaderboard(
+        start_date, end_date, shift=shift_filter, search=search_query, performance=performance_filter,
+        sort=sort, descending=descending, page=page, per_page=per_page
+    )
 
     return render_template('operator_analytics.html',
                            operators=operators_data,
                            days=days,
                            shift_filter=shift_filter,
                            performance_filter=performance_filter,
-                           search_query=search_query)
+                           search_query=search_query,
+                           sort=sort,
+                           order='desc' if descending else 'asc',
+                           page=page,
+                           per_page=per_page,
+                           total=total)
 
 
-@app.route('/analytics/machines/<section>')
+@analytics_bp.route('/analytics/machines/<section>')
 @login_required
 def machine_analytics(section):
     days = request.args.get('days', '30', type=int)
     end_date = date.today()
     start_date = end_date - timedelta(days=days)
 
+    reader = sqlite_profile.reader
     if section == 'circular':
-        machine_data = db.session.query(
-            CircularReport.machine_number,
-            CircularReport.shift,
-            func.avg(CircularReport.footage).label('avg_footage'),
-            func.avg(CircularReport.downtime_hours).label('avg_downtime')
-        ).filter(CircularReport.date >= start_date).group_by(
-            CircularReport.machine_number, CircularReport.shift
+        C = archive.source(CircularReport, start_date, session=reader)
+        machine_data = reader.query(
+            C.machine_number,
+            C.shift,
+            func.avg(C.footage).label('avg_footage'),
+            func.avg(C.downtime_hours).label('avg_downtime')
+        ).filter(C.date >= start_date).group_by(
+            C.machine_number, C.shift
         ).all()
 
-    issues = MachineIssue.query.filter_by(section=section).filter(
-        MachineIssue.date >= start_date
-    ).all()
+    I = archive.source(MachineIssue, start_date, session=reader)
+    issues = reader.query(I).filter(I.section == section, I.date >= start_date).all()
 
     return render_template('machine_analytics.html', section=section,
                            machine_data=machine_data, issues=issues, days=days)
 
 
 # Settings
-@app.route('/settings')
+@main_bp.route('/settings')
 @login_required
 def settings():
     return render_template('settings.html')
 
 
 # Warehouse
-@app.route('/warehouse')
+@main_bp.route('/warehouse')
 @login_required
 def warehouse():
     return render_template('warehouse.html')
@@ -627,35 +1478,114 @@ def warehouse():
 
 # API Routes with flexible date ranges
 # --- اضافه کن یا جایگزین کن: API پیشرفته داشبورد ---
-from sqlalchemy import func  # اطمینان از وجود import
 
-@app.route('/api/machines')
+@api_bp.route('/api/machines')
 @login_required
+@response_cache.cached(lambda params: ['machines'])
 def api_machines():
     """برای پر کردن لیست دستگاه‌ها (فقط در صورت نیاز به نمایش شماره دستگاه‌ها)"""
     section = request.args.get('section', 'circular')
     machines = []
     if section == 'circular':
-        machines = [m.machine_number for m in Machine.query.filter_by(section='circular').order_by(Machine.machine_number).all()]
+        machines = [m.machine_number for m in machine_registry.get('circular')]
     return jsonify({'machines': machines})
 
 
-# در بالای فایل، بعد از import ها
-from sqlalchemy import and_
+COMPARE_OFFSETS = {'wow': timedelta(days=7), 'mom': timedelta(days=30), 'yoy': timedelta(days=365)}
+
+
+def comparison_windows(start_date, end_date, spec):
+    """بازه‌های مقایسه داشبورد: prev (بازه هم‌طول قبلی) و موارد compare
+
+    compare لیستی جداشده با ویرگول از wow/mom/yoy (همان بازه یک هفته/ماه/سال قبل) یا
+    بازه دلخواه «YYYY-MM-DD:YYYY-MM-DD» است. ValueError برای مقدار نامعتبر.
+    """
+    delta = end_date - start_date
+    windows = {'prev': (start_date - delta - timedelta(days=1), start_date - timedelta(days=1))}
+    for part in (p.strip() for p in spec.split(',')):
+        if not part:
+            continue
+        if part in COMPARE_OFFSETS:
+            offset = COMPARE_OFFSETS[part]
+            windows[part] = (start_date - offset, end_date - offset)
+        else:
+            window_start, window_end = (parse_date_arg(value) for value in part.split(':'))
+            if window_end < window_start:
+                raise ValueError(part)
+            windows[part] = (window_start, window_end)
+    return windows
+
+
+def rollup_frame(filters, windows):
+    """سطرهای تجمیعی (تاریخ، شیفت، شناسه اپراتور) همه بازه‌ها با یک کوئری، به صورت DataFrame"""
+    import pandas as pd
+
+    R = ProductionRollup
+    rows = sqlite_profile.reader.query(
+        R.date, R.shift, R.operator_id,
+        func.sum(R.value_sum).label('total'),
+        func.sum(R.value_count).label('count')
+    ).filter(
+        *filters, or_(*(R.date.between(window_start, window_end) for window_start, window_end in windows))
+    ).group_by(R.date, R.shift, R.operator_id).all()
+
+    frame = pd.DataFrame([tuple(row) for row in rows], columns=['date', 'shift', 'operator_id', 'total', 'count'])
+    frame['date'] = pd.to_datetime(frame['date'])
+    frame['total'] = frame['total'].astype(float).fillna(0)
+    frame['count'] = frame['count'].fillna(0).astype(int)
+    return frame
+
+
+def frame_window(frame, window_start, window_end):
+    """ماسک سطرهای یک بازه تاریخ در DataFrame حاصل از rollup_frame"""
+    import numpy as np
+    dates = frame['date'].to_numpy()
+    return (dates >= np.datetime64(window_start)) & (dates <= np.datetime64(window_end))
+
 
 # در تابع dashboard_data، این خطوط را جایگزین کن:
-@app.route('/api/dashboard-data')
+@api_bp.route('/api/dashboard-data')
 @login_required
+@conditional(lambda params: [dict(params).get('section', 'circular')])
+@response_cache.cached(lambda params: [dict(params).get('section', 'circular')])
 def dashboard_data():
-    # پارامترها
-    section = request.args.get('section', 'circular')
-    shift = request.args.get('shift')
-    machine = request.args.get('machine')
-    period = request.args.get('period', '7d')
-    start_date_str = request.args.get('start_date')
-    end_date_str = request.args.get('end_date')
+    try:
+        filters = dashboard_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return Response(dashboard_json(dashboard_payload(**filters)), mimetype='application/json')
+
+
+def dashboard_filters(params):
+    """پارامترهای داشبورد (request.args یا پارامترهای کار) → آرگومان‌های dashboard_payload
+
+    برای مقدار نامعتبر ValueError با پیام قابل نمایش می‌دهد.
+    """
+    import timeseries  # دیرهنگام: NumPy فقط با اولین درخواست داشبورد بارگذاری می‌شود
+    section = params.get('section', 'circular')
+    if section not in SECTION_MODELS:
+        raise ValueError('بخش نامعتبر')
+    granularity = params.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        raise ValueError('granularity باید day، jweek، jmonth یا jyear باشد')
+    # کاهش نقاط سری در سرور (max_points) و قالب ستونی daily_data (layout=columns)
+    method = params.get('downsample', 'bucket')
+    layout = params.get('layout', 'records')
+    try:
+        max_points = int(params['max_points']) if params.get('max_points') else None
+    except ValueError:
+        max_points = 0
+    if method not in timeseries.METHODS or layout not in timeseries.LAYOUTS or (max_points is not None and max_points < 3):
+        raise ValueError('max_points باید عدد ≥ ۳، downsample یکی از bucket/lttb و layout یکی از records/columns باشد')
+    try:
+        machine = int(params['machine']) if params.get('machine') else None
+    except ValueError:
+        raise ValueError('شماره دستگاه نامعتبر')
 
     # محاسبه بازه زمانی
+    period = params.get('period', '7d')
+    start_date_str = params.get('start_date')
+    end_date_str = params.get('end_date')
     today = date.today()
     if period == 'today':
         start_date = end_date = today
@@ -669,55 +1599,74 @@ def dashboard_data():
         start_date = today - timedelta(days=365)
         end_date = today
     elif period == 'custom' and start_date_str and end_date_str:
-        start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-        end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
+        try:
+            start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+            end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError('فرمت تاریخ نامعتبر (YYYY-MM-DD)')
     else:
         start_date = today - timedelta(days=30)
         end_date = today
 
-    # بازه قبلی برای مقایسه
-    delta = end_date - start_date
-    prev_start = start_date - delta - timedelta(days=1)
-    prev_end = start_date - timedelta(days=1)
+    # بازه‌های مقایسه: همیشه بازه قبلی، به علاوه compare=wow,mom,yoy یا YYYY-MM-DD:YYYY-MM-DD
+    try:
+        windows = comparison_windows(start_date, end_date, params.get('compare', ''))
+    except ValueError:
+        raise ValueError('بازه مقایسه نامعتبر (wow، mom، yoy یا YYYY-MM-DD:YYYY-MM-DD)')
+
+    return {
+        'section': section, 'shift': params.get('shift') or None, 'machine': machine,
+        'start_date': start_date, 'end_date': end_date, 'windows': windows, 'granularity': granularity,
+        'max_points': max_points, 'method': method, 'layout': layout,
+    }
+
+
+def dashboard_json(payload):
+    """بایت‌های JSON پاسخ داشبورد (قالب ستونی با سریال‌کننده timeseries)"""
+    if payload['layout'] == 'columns':
+        import timeseries
+        return timeseries.dumps(payload)
+    return current_app.json.dumps(payload).encode('utf-8')
 
-    # مدل گزارش بر اساس بخش
+
+def dashboard_payload(section, shift=None, machine=None, start_date=None, end_date=None, windows=None,
+                      granularity='day', max_points=None, method='bucket', layout='records'):
+    """آمار داشبورد یک بخش از جدول تجمیعی؛ آرگومان‌ها همان خروجی dashboard_filters"""
+    import numpy as np
+    import timeseries
+
+    # برچسب و استاندارد بر اساس بخش
     if section == 'circular':
-        ReportModel = CircularReport
-        value_field = ReportModel.footage
         label = 'متراژ'
         unit = 'متر'
-        standard_per_machine = 800  # میانگین استاندارد، می‌توانید از STANDARD_FOOTAGE استفاده کنید
+        standard_per_machine = SECTION_STANDARDS['circular']
     elif section == 'extruder':
-        ReportModel = ExtruderReport
-        value_field = ReportModel.material_weight  # یا فیلد مناسب
         label = 'وزن مواد'
         unit = 'کیلو'
-        standard_per_machine = 100  # فرضی، تنظیم کنید
-    elif section == 'sewing':
-        ReportModel = SewingReport
-        value_field = ReportModel.bags_produced
+        standard_per_machine = SECTION_STANDARDS['extruder']
+    else:
         label = 'کیسه'
         unit = 'کیسه'
-        standard_per_machine = 5000  # فرضی
-    else:
-        return jsonify({'error': 'بخش نامعتبر'}), 400
+        standard_per_machine = SECTION_STANDARDS['sewing']
 
-    # فیلتر پایه
-    filters = [ReportModel.date.between(start_date, end_date)]
-    if shift:
-        filters.append(ReportModel.shift == shift)
-    if machine:
-        filters.append(ReportModel.machine_number == int(machine))
+    # همه محاسبات از جدول تجمیعی خوانده می‌شود (نه گزارش‌های خام)
+    R = ProductionRollup
 
-    prev_filters = [ReportModel.date.between(prev_start, prev_end)]
+    # فیلتر پایه (بدون بازه تاریخ؛ بازه‌ها در یک کوئری با OR ترکیب می‌شوند)
+    filters = [R.section == section]
     if shift:
-        prev_filters.append(ReportModel.shift == shift)
+        filters.append(R.shift == shift)
     if machine:
-        prev_filters.append(ReportModel.machine_number == int(machine))
+        filters.append(R.machine_number == machine)
+
+    # یک گذر روی جدول تجمیعی برای بازه جاری و همه بازه‌های مقایسه
+    frame = rollup_frame(filters, [(start_date, end_date)] + list(windows.values()))
+    current = frame[frame_window(frame, start_date, end_date)]
+    prev_start, prev_end = windows['prev']
 
     # مجموع ارزش (total_value)
-    total_value = db.session.query(func.sum(value_field)).filter(*filters).scalar() or 0
-    prev_total = db.session.query(func.sum(value_field)).filter(*prev_filters).scalar() or 0
+    total_value = float(current['total'].sum())
+    prev_total = float(frame.loc[frame_window(frame, prev_start, prev_end), 'total'].sum())
 
     # میانگین روزانه
     days = (end_date - start_date).days + 1
@@ -727,61 +1676,86 @@ def dashboard_data():
 
     # ⭐ محاسبه استاندارد بر اساس دستگاه‌های انتخابی
     if section == 'circular':
+        standards = machine_standards()
+        # برای هر شیفت، استاندارد یکبار محاسبه می‌شود
+        # اگر فیلتر شیفت داریم، فقط یک شیفت، وگرنه سه شیفت
+        shifts_per_day = 1 if shift else 3
         if machine:
             # اگر دستگاه خاص انتخاب شده، استاندارد همان دستگاه
-            selected_machine = Machine.query.filter_by(id=int(machine)).first()
-            standard_per_day = selected_machine.standard_footage if selected_machine else STANDARD_FOOTAGE.get(int(machine), 800)
-            # برای هر شیفت، استاندارد یکبار محاسبه می‌شود
-            # اگر فیلتر شیفت داریم، فقط یک شیفت، وگرنه سه شیفت
-            shifts_per_day = 1 if shift else 3
-            standard_per_day = standard_per_day * shifts_per_day
+            standard_per_day = standards.get(machine) or STANDARD_FOOTAGE.get(machine, 800)
         else:
             # اگر دستگاه خاص انتخاب نشده، کل دستگاه‌ها
-            all_machines = Machine.query.filter_by(section='circular').all()
-            total_standard = sum(m.standard_footage or STANDARD_FOOTAGE.get(m.machine_number, 800) for m in all_machines)
-            shifts_per_day = 1 if shift else 3
-            standard_per_day = total_standard * shifts_per_day
+            standard_per_day = sum(standards.values())
+        standard_per_day = standard_per_day * shifts_per_day
     else:
         # برای سایر بخش‌ها (extruder, sewing)
-        num_machines = 1 if machine else (Machine.query.filter_by(section=section).count() or 1)
+        num_machines = 1 if machine else (len(machine_registry.get(section)) or 1)
         shifts_per_day = 1 if shift else 3
         standard_per_day = standard_per_machine * num_machines * shifts_per_day
 
-    # داده روزانه (با استاندارد)
-    daily_data = db.session.query(
-        ReportModel.date,
-        func.sum(value_field).label('total'),
-        func.avg(value_field).label('avg')
-    ).filter(*filters).group_by(ReportModel.date).order_by(ReportModel.date).all()
-
-    # اضافه کردن استاندارد به هر روز
-    daily_data = [
-        {'date': d.date, 'total': d.total or 0, 'standard': standard_per_day}
-        for d in daily_data
-    ]
+    # داده روزانه یا دوره‌ای شمسی (با استاندارد)؛ استاندارد هر دوره = روزهای آن دوره داخل بازه × استاندارد روزانه
+    labels = None
+    if granularity == 'day':
+        daily = current.groupby('date')['total'].sum()
+        dates = daily.index.to_numpy(dtype='datetime64[D]')
+        standards = np.full(len(dates), standard_per_day)
+    else:
+        buckets = jalali_calendar.bucket_starts(current['date'].to_numpy(), granularity)
+        daily = current['total'].groupby(buckets).sum()
+        period_days = np.arange(np.datetime64(start_date), np.datetime64(end_date) + 1)
+        bucket_days, day_counts = np.unique(jalali_calendar.bucket_starts(period_days, granularity), return_counts=True)
+        day_counts = dict(zip(bucket_days, day_counts))
+        dates = daily.index.to_numpy(dtype='datetime64[D]')
+        labels = [jalali_calendar.bucket_label(bucket, granularity) for bucket in dates]
+        standards = standard_per_day * np.array([int(day_counts.get(bucket, 0)) for bucket in dates], dtype=np.int64)
+    series = {'total': daily.to_numpy(dtype=np.float64), 'standard': standards}
+
+    end_dates = None
+    downsampled = None
+    if max_points and len(dates) > max_points:
+        downsampled = {'method': method, 'source_points': len(dates)}
+        dates, end_dates, series, labels = timeseries.downsample(dates, series, max_points, method, labels)
+    if layout == 'columns':
+        daily_data = timeseries.columns_payload(dates, series, end_dates, labels)
+    else:
+        daily_data = timeseries.records_payload(dates, series, end_dates, labels)
 
     # داده شیفت‌ها
-    shift_data = db.session.query(
-        ReportModel.shift,
-        func.avg(value_field).label('avg')
-    ).filter(*filters).group_by(ReportModel.shift).all()
-    shift_data = [{'shift': s.shift, 'avg': s.avg or 0} for s in shift_data]
+    by_shift = current.groupby('shift')[['total', 'count']].sum()
+    shift_data = [
+        {'shift': name, 'avg': float(row['total'] / row['count']) if row['count'] else 0}
+        for name, row in by_shift.iterrows()
+    ]
 
     # اپراتورهای برتر
-    top_operators = db.session.query(
-        ReportModel.operator_name,
-        func.sum(value_field).label('total')
-    ).filter(*filters).group_by(ReportModel.operator_name).order_by(desc('total')).limit(5).all()
-    top_operators = [{'operator': op.operator_name, 'total': op.total or 0} for op in top_operators]
-
-    # مسائل پرتکرار
-    issues = db.session.query(
-        MachineIssue.issue_type,
-        func.count(MachineIssue.id).label('count')
+    by_operator = current.groupby('operator_id')['total'].sum().sort_values(ascending=False, kind='stable').head(5)
+    names = operator_names(by_operator.index.tolist(), sqlite_profile.reader)
+    top_operators = [{'operator': names.get(operator_id, ''), 'total': float(total)}
+                     for operator_id, total in by_operator.items()]
+
+    # مقایسه با بازه‌های دلخواه (از همان داده خوانده‌شده)
+    comparisons = {}
+    for name, (window_start, window_end) in windows.items():
+        window_total = float(frame.loc[frame_window(frame, window_start, window_end), 'total'].sum())
+        window_days = (window_end - window_start).days + 1
+        comparisons[name] = {
+            'start_date': str(window_start),
+            'end_date': str(window_end),
+            'total': window_total,
+            'avg': window_total / window_days,
+            'change_pct': round((total_value - window_total) / window_total * 100, 1) if window_total else None
+        }
+
+    # مسائل پرتکرار (همراه با سال‌های بایگانی‌شده بازه)
+    reader = sqlite_profile.reader
+    I = archive.source(MachineIssue, start_date, end_date, session=reader)
+    issues = reader.query(
+        I.issue_type,
+        func.count(I.id).label('count')
     ).filter(
-        MachineIssue.section == section,
-        MachineIssue.date.between(start_date, end_date)
-    ).group_by(MachineIssue.issue_type).order_by(desc('count')).limit(3).all()
+        I.section == section,
+        I.date.between(start_date, end_date)
+    ).group_by(I.issue_type).order_by(desc('count')).limit(3).all()
     issues = [{'issue_type': i.issue_type, 'count': i.count} for i in issues]
 
     # ⭐ راندمان کلی (overall_efficiency)
@@ -789,7 +1763,7 @@ def dashboard_data():
     total_standard_period = standard_per_day * days
     overall_efficiency = (total_value / total_standard_period * 100) if total_standard_period > 0 else 0
 
-    return jsonify({
+    return {
         'section': section,
         'start_date': str(start_date),
         'end_date': str(end_date),
@@ -802,29 +1776,328 @@ def dashboard_data():
         'top_operators': top_operators,
         'issues': issues,
         'overall_efficiency': overall_efficiency,
+        'comparisons': comparisons,
+        'granularity': granularity,
+        'downsample': downsampled,
+        'layout': layout,
         'label': label,
         'unit': unit
+    }
+
+@api_bp.route('/api/dashboard-stream')
+@login_required
+def dashboard_stream():
+    """جریان SSE تغییرات داشبورد برای یک بخش (و اختیاری شیفت/دستگاه)"""
+    section = request.args.get('section', 'circular')
+    if section not in SECTION_MODELS:
+        return jsonify({'error': 'بخش نامعتبر'}), 400
+    if live_updates.broker is None:
+        return jsonify({'error': 'جریان زنده غیرفعال است'}), 404
+    shift = request.args.get('shift') or None
+    machine = request.args.get('machine', type=int)
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    # اتصال دیتابیس در طول جریان طولانی نگه داشته نشود (رویدادها داده لازم را دارند)
+    db.session.close()
+    return Response(live_updates.stream(section, shift, machine, last_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@api_bp.route('/api/cache-stats')
+@login_required
+def cache_stats():
+    """آمار hit/miss کش پاسخ‌ها"""
+    return jsonify(response_cache.summary())
+
+
+SEARCH_KINDS = {'report': list(SECTION_MODELS), 'issue': ['issue']}
+
+
+@api_bp.route('/api/search')
+@login_required
+@response_cache.cached(lambda params: [dict(params)['section']] if dict(params).get('section') else list(SECTION_MODELS))
+def search_api():
+    """جستجوی متنی در گزارش‌ها و مسائل دستگاه (q، section، type=report|issue، start_date، end_date)"""
+    q = request.args.get('q', '').strip()
+    section = request.args.get('section')
+    kind = request.args.get('type')
+    if not q:
+        return jsonify({'error': 'متن جستجو (q) الزامی است'}), 400
+    if (section and section not in SECTION_MODELS) or (kind and kind not in SEARCH_KINDS):
+        return jsonify({'error': 'بخش یا نوع نامعتبر'}), 400
+    try:
+        start_date, end_date = report_range(request.args)
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({'error': 'پارامتر نامعتبر (تاریخ YYYY-MM-DD و limit/offset عددی)'}), 400
+
+    hits, total = search_index.search(
+        sqlite_profile.reader, q, sections=[section] if section else None,
+        kinds=SEARCH_KINDS[kind] if kind else None, start_date=start_date, end_date=end_date,
+        limit=limit, offset=offset
+    )
+    return jsonify({
+        'query': q,
+        'total': total,
+        'hits': [{
+            'type': 'issue' if hit.kind == 'issue' else 'report',
+            'section': hit.section,
+            'id': hit.ref_id,
+            'date': hit.date,
+            'operator': hit.name,
+            'machine_number': hit.machine_number,
+            'snippet': hit.snippet,
+            'score': round(-hit.rank, 4),  # bm25 کمتر = مرتبط‌تر
+        } for hit in hits],
+    })
+
+
+# Roll Lineage
+def roll_yield(start_date, end_date, session=None):
+    """بازده و ضایعات رول‌های گردباف تولیدشده در بازه، با یک کوئری
+
+    شجره با ایندکس تاریخ خوانده می‌شود، به گزارش گردباف (کلید اصلی) و به جمع دوخت هر رول
+    (ایندکس roll_barcode) وصل می‌شود؛ نخ مصرفی هر گزارش اکسترودر فقط یک بار شمرده می‌شود.
+    """
+    session = session or db.session
+    L = RollLineage
+    C = archive.source(CircularReport, start_date, end_date, session)
+    S = archive.source(SewingReport, start_date, None, session)  # دوخت ممکن است بعد از بازه باشد
+    E = archive.source(ExtruderReport, start_date - ROLL_YARN_MAX_AGE, end_date, session)
+    in_range = L.date.between(start_date, end_date)
+    rolls = select(L.roll_barcode).where(in_range)
+
+    sewn = select(
+        S.roll_barcode,
+        func.sum(S.footage).label('footage'),
+        func.sum(S.bags_produced).label('bags'),
+        func.sum(S.grade_b_bags).label('grade_b'),
+        func.sum(S.unsewn_bags).label('unsewn'),
+        func.sum(S.waste).label('waste'),
+    ).where(S.roll_barcode.in_(rolls)).group_by(S.roll_barcode).subquery()
+    extruder_ids = select(L.extruder_report_id).where(in_range)
+
+    row = session.execute(
+        select(
+            func.count(L.id).label('rolls'),
+            func.count(sewn.c.roll_barcode).label('sewn_rolls'),
+            func.sum(C.footage).label('circular_footage'),
+            func.sum(C.roll_weight).label('roll_weight'),
+            func.sum(case((sewn.c.roll_barcode.isnot(None), C.footage))).label('sewn_rolls_footage'),
+            func.sum(sewn.c.footage).label('sewn_footage'),
+            func.sum(sewn.c.bags).label('bags_produced'),
+            func.sum(sewn.c.grade_b).label('grade_b_bags'),
+            func.sum(sewn.c.unsewn).label('unsewn_bags'),
+            func.sum(sewn.c.waste).label('sewing_waste'),
+            select(func.sum(E.material_weight)).where(E.id.in_(extruder_ids)).scalar_subquery()
+            .label('material_weight'),
+            select(func.sum(E.waste)).where(E.id.in_(extruder_ids)).scalar_subquery().label('extruder_waste'),
+        ).select_from(L).join(C, C.id == L.circular_report_id).outerjoin(
+            sewn, sewn.c.roll_barcode == L.roll_barcode
+        ).where(in_range)
+    ).one()
+    totals = {key: float(value or 0) for key, value in row._mapping.items()}
+    totals['rolls'], totals['sewn_rolls'] = int(row.rolls), int(row.sewn_rolls)
+    # بازده متراژ فقط روی رول‌هایی که دوخت شده‌اند
+    totals['footage_yield_pct'] = (round(totals['sewn_footage'] / totals['sewn_rolls_footage'] * 100, 1)
+                                   if totals['sewn_rolls_footage'] else None)
+    totals['grade_b_pct'] = (round(totals['grade_b_bags'] / totals['bags_produced'] * 100, 1)
+                             if totals['bags_produced'] else None)
+    return totals
+
+
+@api_bp.route('/api/rolls/yield')
+@login_required
+@response_cache.cached(lambda params: list(SECTION_MODELS))
+def roll_yield_api():
+    """بازده و ضایعات رول‌های بازه (start_date/end_date؛ پیش‌فرض ۳۰ روز اخیر بر اساس تاریخ گردباف)"""
+    try:
+        start_date, end_date = report_range(request.args)
+    except ValueError:
+        return jsonify({'error': 'فرمت تاریخ نامعتبر'}), 400
+    end_date = end_date or date.today()
+    start_date = start_date or end_date - timedelta(days=30)
+    totals = roll_yield(start_date, end_date, sqlite_profile.reader)
+    return jsonify(dict(totals, start_date=start_date.isoformat(), end_date=end_date.isoformat()))
+
+
+@api_bp.route('/api/rolls/<barcode>')
+@login_required
+def roll_chain(barcode):
+    """زنجیره کامل یک رول: گزارش اکسترودر نخ → گزارش گردباف → گزارش‌های دوخت"""
+    code = roll_code(barcode)
+    lineage = db.session.execute(select(RollLineage).where(RollLineage.roll_barcode == code)).scalar()
+    extruder = circular = None
+    if lineage is not None:
+        C = archive.source(CircularReport, lineage.date, lineage.date)
+        circular = db.session.execute(select(C).where(C.id == lineage.circular_report_id)).scalar()
+        if lineage.extruder_report_id is not None:
+            E = archive.source(ExtruderReport, lineage.date - ROLL_YARN_MAX_AGE, lineage.date)
+            extruder = db.session.execute(select(E).where(E.id == lineage.extruder_report_id)).scalar()
+    S = archive.source(SewingReport, lineage.date if lineage else None, None)
+    sewing = db.session.execute(select(S).where(S.roll_barcode == code).order_by(S.date, S.id)).scalars().all()
+    if lineage is None and not sewing:
+        return jsonify({'error': 'رول پیدا نشد'}), 404
+
+    return jsonify({
+        'roll_barcode': code,
+        'extruder': report_row(extruder) if extruder else None,
+        'circular': report_row(circular) if circular else None,
+        'sewing': [report_row(report) for report in sewing],
+        'summary': {
+            'circular_footage': circular.footage if circular else None,
+            'sewn_footage': sum(report.footage or 0 for report in sewing),
+            'bags_produced': sum(report.bags_produced or 0 for report in sewing),
+            'grade_b_bags': sum(report.grade_b_bags or 0 for report in sewing),
+            'waste': sum(report.waste or 0 for report in sewing),
+        },
     })
 
+
 # Export Routes
-@app.route('/export/<report_type>/<format>')
+def iter_export_rows(model, filters, batch_size=1000, source=None):
+    """سطرهای خام گزارش به صورت دسته‌ای (yield_per) بدون ساختن شیء ORM
+
+    source: خروجی archive.source برای بازه‌هایی که گزارش‌های بایگانی‌شده را هم شامل می‌شوند.
+    """
+    source = source or model
+    stmt = select(*(getattr(source, column.name) for column in model.__table__.columns)).where(
+        *filters).order_by(source.id).execution_options(yield_per=batch_size)
+    return db.session.execute(stmt)
+
+
+EXCEL_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def iter_csv_chunks(model, filters, batch_size=1000, on_batch=None, source=None):
+    """متن CSV گزارش‌ها در تکه‌های batch_size سطری؛ on_batch(تعداد سطرهای نوشته‌شده) بعد از هر تکه"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')  # BOM برای باز شدن درست فارسی در اکسل
+    writer.writerow([column.name for column in model.__table__.columns])
+    count = 0
+    for count, row in enumerate(iter_export_rows(model, filters, batch_size, source), 1):
+        writer.writerow(row)
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            if on_batch:
+                on_batch(count)
+    yield buffer.getvalue()
+    if on_batch:
+        on_batch(count)
+
+
+def write_excel_export(model, report_type, filters, output, batch_size=1000, on_batch=None, source=None):
+    """نوشتن گزارش‌ها با حالت write-only در openpyxl (بدون نگه داشتن کل برگه در حافظه)"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(report_type)
+    sheet.append([column.name for column in model.__table__.columns])
+    for count, row in enumerate(iter_export_rows(model, filters, batch_size, source), 1):
+        sheet.append(list(row))
+        if on_batch and count % batch_size == 0:
+            on_batch(count)
+    workbook.save(output)
+
+
+def stream_csv_export(model, report_type, filters, batch_size=1000, source=None):
+    chunks = iter_csv_chunks(model, filters, batch_size, source=source)
+    return Response(stream_with_context(chunks), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename={report_type}_report.csv'})
+
+
+def write_only_excel_export(model, report_type, filters, batch_size=1000, source=None):
+    output = tempfile.TemporaryFile()
+    write_excel_export(model, report_type, filters, output, batch_size, source=source)
+    output.seek(0)
+    return send_file(output, download_name=f'{report_type}_report.xlsx', as_attachment=True,
+                     mimetype=EXCEL_MIMETYPE)
+
+
+def report_frame(section, args, columns=None, months=None):
+    """گزارش‌های یک بخش با فیلترهای خروجی به صورت DataFrame
+
+    ماه‌های گذشته‌ای که snapshot Parquet آن‌ها به‌روز است ستونی از فایل‌ها خوانده می‌شوند
+    (فقط ستون‌ها و سطرهای لازم)؛ ماه جاری و بقیه ماه‌ها با یک کوئری از SQLite.
+    months: نتیجه snapshots.fresh_months اگر فراخواننده آن را قبلاً گرفته است.
+    """
+    import pandas as pd
+
+    model = SECTION_MODELS[section]
+    columns = columns or [column.name for column in model.__table__.columns]
+    start_date, end_date = report_range(args)
+    source = archive.source(model, start_date, end_date)
+    filters = report_filters(source, args)
+
+    parts = []
+    if months is None:
+        months = snapshots.fresh_months(section, start_date, end_date) if snapshots.available else []
+    if months:
+        parts.append(snapshots.read(section, months, columns, start_date, end_date, report_criteria(model, args)))
+        filters.append(func.strftime('%Y-%m', source.date).notin_(months))
+    rows = db.session.execute(
+        select(*(getattr(source, name) for name in columns)).where(*filters).order_by(source.id)
+    ).all()
+    parts.append(pd.DataFrame([tuple(row) for row in rows], columns=columns))
+
+    frame = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+    if months and 'id' in columns:
+        frame = frame.sort_values('id', ignore_index=True)
+    return frame
+
+
+def export_columns(model, value):
+    """ستون‌های درخواستی خروجی (columns=id,date,footage)؛ None یعنی همه"""
+    if not value:
+        return None
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = set(names) - {column.name for column in model.__table__.columns}
+    if unknown:
+        raise ValueError(f"ستون نامعتبر: {', '.join(sorted(unknown))}")
+    return names
+
+
+EXPORT_FORMATS = ('excel', 'csv', 'parquet')
+PARQUET_MIMETYPE = 'application/vnd.apache.parquet'
+
+
+@export_bp.route('/export/<report_type>/<format>')
 @login_required
 def export_reports(report_type, format):
-    models = {'circular': CircularReport, 'extruder': ExtruderReport, 'sewing': SewingReport}
-    model = models.get(report_type)
-    reports = model.query.all()
+    model = SECTION_MODELS.get(report_type)
+    if model is None or format not in EXPORT_FORMATS:
+        abort(404)
+    if format == 'parquet' and not snapshots.available:
+        return jsonify({'error': 'خروجی parquet به pyarrow نیاز دارد'}), 501
+
+    try:
+        source = archive.source(model, *report_range(request.args))
+        filters = report_filters(source, request.args)
+        columns = export_columns(model, request.args.get('columns'))
+    except ValueError:
+        return jsonify({'error': 'فیلتر نامعتبر (تاریخ YYYY-MM-DD، دستگاه عددی و ستون‌های جدول)'}), 400
 
-    data = []
-    for report in reports:
-        row = {column.name: getattr(report, column.name) for column in report.__table__.columns}
-        data.append(row)
+    # حالت استریم: بدون بارگذاری کل جدول در حافظه
+    if request.args.get('mode') == 'stream' and format != 'parquet':
+        if format == 'csv':
+            return stream_csv_export(model, report_type, filters, source=source)
+        return write_only_excel_export(model, report_type, filters, source=source)
 
-    df = pd.DataFrame(data)
+    df = report_frame(report_type, request.args, columns)
 
-    if format == 'excel':
+    if format == 'parquet':
         output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name=report_type)
+        df.to_parquet(output, index=False)
+        output.seek(0)
+        return send_file(output, download_name=f'{report_type}_report.parquet', as_attachment=True,
+                         mimetype=PARQUET_MIMETYPE)
+
+    elif format == 'excel':
+        output = io.BytesIO()
+        df.to_excel(output, index=False, sheet_name=report_type, engine='openpyxl')
         output.seek(0)
         return send_file(output, download_name=f'{report_type}_report.xlsx', as_attachment=True)
 
@@ -836,7 +2109,236 @@ def export_reports(report_type, format):
                          download_name=f'{report_type}_report.csv', as_attachment=True, mimetype='text/csv')
 
 
-def init_db():
+# Background Jobs
+def _validate_export_job(params):
+    model = SECTION_MODELS.get(params.get('report_type'))
+    if model is None or params.get('format') not in EXPORT_FORMATS:
+        raise ValueError('report_type یا format نامعتبر است')
+    if params['format'] == 'parquet' and not snapshots.available:
+        raise ValueError('خروجی parquet به pyarrow نیاز دارد')
+    report_filters(model, params)
+
+
+@jobs.register('export', tags=lambda params: [params['report_type']], validate=_validate_export_job)
+def export_job(job):
+    """خروجی CSV/Excel یک بخش با فیلترهای همان مسیر export"""
+    report_type, format = job.params['report_type'], job.params['format']
+    model = SECTION_MODELS[report_type]
+    source = archive.source(model, *report_range(job.params))
+    filters = report_filters(source, job.params)
+    total = db.session.query(func.count(source.id)).filter(*filters).scalar() or 1
+
+    def on_batch(count):
+        job.progress(count / total, f'{count} از {total} سطر')
+
+    if format == 'parquet':
+        path = job.result_path('.parquet')
+        report_frame(report_type, job.params).to_parquet(path, index=False)
+        return path, f'{report_type}_report.parquet', PARQUET_MIMETYPE
+    if format == 'csv':
+        path = job.result_path('.csv')
+        with open(path, 'w', encoding='utf-8', newline='') as fp:
+            for chunk in iter_csv_chunks(model, filters, on_batch=on_batch, source=source):
+                fp.write(chunk)
+        return path, f'{report_type}_report.csv', 'text/csv'
+    path = job.result_path('.xlsx')
+    write_excel_export(model, report_type, filters, path, on_batch=on_batch, source=source)
+    return path, f'{report_type}_report.xlsx', EXCEL_MIMETYPE
+
+
+def _validate_rollup_job(params):
+    if params.get('section') and params['section'] not in SECTION_MODELS:
+        raise ValueError('بخش نامعتبر')
+
+
+@jobs.register('rebuild_rollups', validate=_validate_rollup_job)
+def rebuild_rollups_job(job):
+    """بازسازی جدول تجمیعی یک بخش یا همه بخش‌ها"""
+    sections = [job.params['section']] if job.params.get('section') else sorted(SECTION_MODELS)
+    for done, section in enumerate(sections):
+        job.progress(done / len(sections), f'بازسازی {section}')
+        rebuild_rollups(section)
+        db.session.commit()
+        response_cache.invalidate(section)
+        live_updates.publish({'type': 'reload', 'section': section})
+    path = job.result_path('.json')
+    with open(path, 'w', encoding='utf-8') as fp:
+        json.dump({'sections': sections}, fp)
+    return path, 'rebuild_rollups.json', 'application/json'
+
+
+@jobs.register('dashboard', tags=lambda params: [params.get('section', 'circular')], validate=dashboard_filters)
+def dashboard_job(job):
+    """پاسخ /api/dashboard-data برای بازه‌های طولانی (مثلاً period=1y) بیرون از worker وب"""
+    job.progress(0, 'محاسبه')
+    payload = dashboard_payload(**dashboard_filters(job.params))
+    path = job.result_path('.json')
+    with open(path, 'wb') as fp:
+        fp.write(dashboard_json(payload))
+    return path, 'dashboard_data.json', 'application/json'
+
+
+def _validate_snapshot_job(params):
+    _validate_rollup_job(params)
+    if not snapshots.available:
+        raise ValueError('snapshot به pyarrow نیاز دارد')
+
+
+@jobs.register('snapshot_reports', validate=_validate_snapshot_job)
+def snapshot_reports_job(job):
+    """همگام‌سازی افزایشی snapshot های Parquet یک بخش یا همه بخش‌ها"""
+    sections = [job.params['section']] if job.params.get('section') else sorted(SECTION_MODELS)
+    result = {}
+    for done, section in enumerate(sections):
+        job.progress(done / len(sections), f'snapshot {section}')
+        result[section] = snapshots.sync(section)
+    path = job.result_path('.json')
+    with open(path, 'w', encoding='utf-8') as fp:
+        json.dump(result, fp, ensure_ascii=False)
+    return path, 'snapshot_reports.json', 'application/json'
+
+
+@api_bp.route('/api/jobs', methods=['GET', 'POST'])
+@login_required
+def job_list():
+    """GET: کارهای اخیر کاربر. POST: ثبت کار {"kind": ..., "params": {...}}"""
+    if request.method == 'GET':
+        return jsonify({'jobs': jobs.recent(user_id=current_user.id)})
+    payload = request.get_json(silent=True) or {}
+    params = payload.get('params') or {}
+    if not isinstance(params, dict):
+        return jsonify({'error': 'params باید یک شیء باشد'}), 400
+    try:
+        job, created = jobs.submit(payload.get('kind'), params, current_user.id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(dict(job, cached=not created)), 202 if created else 200
+
+
+def own_job(job_id):
+    """کار کاربر جاری (مدیر همه کارها را می‌بیند)؛ برای کار دیگران هم 404، تا وجودش معلوم نشود"""
+    job = jobs.get(job_id)
+    if job is None or (job['created_by'] != current_user.id and current_user.role != 'admin'):
+        abort(404)
+    return job
+
+
+@api_bp.route('/api/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    job = own_job(job_id)
+    if job['status'] == 'done':
+        job['result_url'] = url_for('api.job_result', job_id=job_id)
+    return jsonify(job)
+
+
+@api_bp.route('/api/jobs/<job_id>/result')
+@login_required
+def job_result(job_id):
+    own_job(job_id)
+    result = jobs.result(job_id)
+    if result is None:
+        abort(404)
+    path, name, mimetype = result
+    return send_file(path, download_name=name, as_attachment=True, mimetype=mimetype)
+
+
+@api_bp.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+@login_required
+def job_cancel(job_id):
+    own_job(job_id)
+    return jsonify(jobs.cancel(job_id))
+
+
+@reports_bp.cli.command('rebuild-rollups')
+@click.option('--section', type=click.Choice(sorted(SECTION_MODELS)), help='فقط یک بخش (پیش‌فرض: همه)')
+def rebuild_rollups_command(section):
+    """بازسازی جدول تجمیعی داشبورد از روی گزارش‌های خام"""
+    ProductionRollup.__table__.create(db.engine, checkfirst=True)
+    for name in ([section] if section else sorted(SECTION_MODELS)):
+        rebuild_rollups(name)
+        db.session.commit()  # هر بخش جدا، تا ضمیمه کردن بایگانی‌ها بیرون از تراکنش باشد
+        click.echo(f'{name}: بازسازی شد')
+
+
+@reports_bp.cli.command('import-reports')
+@click.argument('section', type=click.Choice(sorted(SECTION_MODELS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--user', 'username', default='admin', show_default=True, help='کاربر ثبت‌کننده')
+@click.option('--batch-size', default=1000, show_default=True)
+def import_reports_command(section, path, username, batch_size):
+    """ورود گروهی گزارش‌های یک بخش از فایل json، csv یا xlsx"""
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.BadParameter(f'کاربر {username} وجود ندارد', param_hint='--user')
+    with open(path, 'rb') as fp:
+        try:
+            rows = read_report_file(fp, path)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+    result = ingest_reports(section, rows, user.id, batch_size)
+    for error in result.errors:
+        click.echo(f"سطر {error['row']}: {error['error']}", err=True)
+    click.echo(f'{section}: {result.inserted} از {len(rows)} سطر ثبت شد')
+    if result.failed:
+        raise click.ClickException(f'{result.failed} سطر به خاطر خطای پایگاه داده ثبت نشد و '
+                                   f'{result.pending} سطر بعدی بررسی نشد')
+
+
+@reports_bp.cli.command('snapshot-reports')
+@click.option('--section', type=click.Choice(sorted(SECTION_MODELS)), help='فقط یک بخش (پیش‌فرض: همه)')
+def snapshot_reports_command(section):
+    """به‌روزرسانی افزایشی snapshot های Parquet ماهانه گزارش‌ها (برای cron بعد از هر شیفت)"""
+    if not snapshots.available:
+        raise click.ClickException('pyarrow نصب نیست')
+    for name in ([section] if section else sorted(SECTION_MODELS)):
+        result = snapshots.sync(name)
+        click.echo(f"{name}: {len(result['appended'])} ماه افزوده، {len(result['rewritten'])} ماه بازنویسی، "
+                   f"{len(result['removed'])} ماه حذف")
+
+
+@reports_bp.cli.command('search-reindex')
+def search_reindex_command():
+    """ساخت دوباره نمایه جستجوی متنی از جدول‌های اصلی و همه بایگانی‌ها"""
+    with db.engine.connect() as connection:
+        years = archive.years()
+        archive.attach(connection, years)
+        search_index.rebuild(connection, [
+            (kind, f'{archive.schema(year)}.{source.name}')
+            for year in years for kind, (_, source, _, _) in search_index.kinds.items()
+        ])
+        connection.commit()
+        count = connection.exec_driver_sql('SELECT count(*) FROM search_index').scalar()
+    click.echo(f'{count} سطر نمایه شد')
+
+
+@reports_bp.cli.command('archive-reports')
+@click.argument('year', type=int)
+def archive_reports_command(year):
+    """انتقال گزارش‌ها و مسائل یک سال شمسی بسته (مثلاً 1402) به فایل بایگانی آن سال"""
+    try:
+        moved = archive.archive_year(year)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    for name, count in moved.items():
+        click.echo(f'{name}: {count} سطر به {archive.path(year)} منتقل شد')
+    if moved:
+        # حذف از جدول اصلی سطرها را از نمایه جستجو هم برداشت؛ از روی بایگانی دوباره نمایه می‌شوند
+        with db.engine.connect() as connection:
+            archive.attach(connection, [year])
+            for kind, (_, source, _, _) in search_index.kinds.items():
+                if source.name in moved:
+                    statement = search_index.populate_statement(kind, f'{archive.schema(year)}.{source.name}')
+                    connection.exec_driver_sql(statement)
+            connection.commit()
+    else:
+        click.echo(f'گزارشی از سال {year} در دیتابیس اصلی نیست')
+    bump_data_version(*SECTION_MODELS)
+    db.session.commit()
+    response_cache.invalidate(*SECTION_MODELS)
+
+
+def init_db(app):
     with app.app_context():
         db.create_all()
 
@@ -853,9 +2355,34 @@ def init_db():
         db.session.commit()
 
 
+# سلول ماتریس اپراتور-دستگاه (هم‌نام ستون‌های کوئری SQL)
+MatrixCell = namedtuple('MatrixCell', 'operator_name machine_number avg_footage shift_count downtime')
+
+
+def matrix_cells(frame):
+    """سلول‌های ماتریس از DataFrame گزارش‌های گردباف (report_frame)، با همان نتیجه کوئری SQL
+
+    میانگین و جمع مثل SQL مقادیر خالی را نادیده می‌گیرند؛ اپراتور بدون نام کنار گذاشته می‌شود
+    (مثل JOIN) و ترتیب بر اساس نام اپراتور و شماره دستگاه است.
+    """
+    frame = frame.dropna(subset=['operator_id', 'machine_number'])
+    grouped = frame.groupby(['operator_id', 'machine_number']).agg(
+        avg_footage=('footage', 'mean'), shift_count=('id', 'size'), downtime=('downtime_hours', 'sum'))
+    names = operator_names(grouped.index.get_level_values(0).astype(int).tolist(), sqlite_profile.reader)
+    cells = [
+        MatrixCell(names[int(operator)], int(machine), None if avg != avg else float(avg), int(count), float(downtime))
+        for (operator, machine), avg, count, downtime in zip(
+            grouped.index, grouped['avg_footage'], grouped['shift_count'], grouped['downtime'])
+        if int(operator) in names
+    ]
+    return sorted(cells, key=lambda cell: (cell.operator_name, cell.machine_number))
+
+
 # --- اضافه کن به انتهای app.py، قبل از if __name__ ---
-@app.route('/api/operator-machine-matrix')
+@api_bp.route('/api/operator-machine-matrix')
 @login_required
+@conditional(lambda params: ['circular'])
+@response_cache.cached(lambda params: ['circular'])
 def operator_machine_matrix():
     """ماتریس عملکرد اپراتور-دستگاه (فقط گردباف)"""
     start_date = request.args.get('start_date')
@@ -874,31 +2401,69 @@ def operator_machine_matrix():
         start_date = today - timedelta(days=days)
         end_date = today
 
-    # ماتریس: اپراتور × دستگاه → میانگین footage
-    matrix = db.session.query(
-        CircularReport.operator_name,
-        CircularReport.machine_number,
-        func.avg(CircularReport.footage).label('avg_footage'),
-        func.count(CircularReport.id).label('shift_count')
-    ).filter(
-        CircularReport.date >= start_date,
-        CircularReport.date <= end_date
-    ).group_by(
-        CircularReport.operator_name, CircularReport.machine_number
-    ).having(func.count(CircularReport.id) >= 1).all()
-
-    operators = list(set(m.operator_name for m in matrix))
-    machines = sorted(list(set(m.machine_number for m in matrix)))
-
-    # ساخت ماتریس 2 بعدی
-    data_matrix = []
-    for op in operators:
-        row = {'operator': op}
-        for mach in machines:
-            val = next((m for m in matrix if m.operator_name == op and m.machine_number == mach), None)
-            row[f'm{mach}'] = round(float(val.avg_footage), 1) if val else 0
-            row[f'c{mach}'] = int(val.shift_count) if val else 0
-        data_matrix.append(row)
+    # سلول‌های اضافه اختیاری: include=efficiency,downtime
+    include = {part.strip() for part in request.args.get('include', '').split(',') if part.strip()}
+
+    # ماتریس: اپراتور × دستگاه → میانگین footage (مرتب بر اساس نام اپراتور و شماره دستگاه)
+    # گروه‌بندی روی شناسه اپراتور؛ نام بعد از تجمیع برای نمایش پیوند می‌شود
+    months = snapshots.fresh_months('circular', start_date, end_date) if snapshots.available else []
+    if months:
+        # بازه بلند با snapshot به‌روز: ماه‌های گذشته ستونی از Parquet، بقیه از SQLite
+        frame = report_frame('circular', {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()},
+                             ['id', 'operator_id', 'machine_number', 'footage', 'downtime_hours'], months)
+        matrix = matrix_cells(frame)
+    else:
+        C = archive.source(CircularReport, start_date, end_date, sqlite_profile.reader)
+        columns = [
+            C.operator_id,
+            C.machine_number,
+            func.avg(C.footage).label('avg_footage'),
+            func.count(C.id).label('shift_count')
+        ]
+        if 'downtime' in include:
+            columns.append(func.sum(C.downtime_hours).label('downtime'))
+
+        grouped = select(*columns).where(
+            C.date >= start_date,
+            C.date <= end_date,
+            C.machine_number.isnot(None)
+        ).group_by(
+            C.operator_id, C.machine_number
+        ).subquery()
+        matrix = sqlite_profile.reader.execute(
+            select(grouped, Operator.name.label('operator_name')).join(
+                Operator, Operator.id == grouped.c.operator_id
+            ).order_by(Operator.name, grouped.c.machine_number)
+        ).all()
+
+    machines = sorted({m.machine_number for m in matrix})
+    standards = machine_standards() if 'efficiency' in include else {}
+
+    # ساخت ماتریس 2 بعدی در یک گذر (سطرها به ترتیب نام اپراتور می‌آیند)
+    rows = {}
+    for m in matrix:
+        row = rows.get(m.operator_name)
+        if row is None:
+            row = rows[m.operator_name] = {'operator': m.operator_name}
+            for mach in machines:
+                row[f'm{mach}'] = 0
+                row[f'c{mach}'] = 0
+                if 'efficiency' in include:
+                    row[f'e{mach}'] = 0
+                if 'downtime' in include:
+                    row[f'd{mach}'] = 0
+        mach = m.machine_number
+        avg_footage = float(m.avg_footage or 0)
+        row[f'm{mach}'] = round(avg_footage, 1)
+        row[f'c{mach}'] = int(m.shift_count)
+        if 'efficiency' in include:
+            standard = standards.get(mach) or STANDARD_FOOTAGE.get(mach, 800)
+            row[f'e{mach}'] = round(avg_footage / standard * 100, 1)
+        if 'downtime' in include:
+            row[f'd{mach}'] = round(float(m.downtime or 0), 1)
+
+    operators = list(rows)
+    data_matrix = list(rows.values())
 
     return jsonify({
         'operators': operators,
@@ -909,64 +2474,77 @@ def operator_machine_matrix():
     })
 
 
-@app.route('/api/machine-diagnostics')
+@api_bp.route('/api/machine-diagnostics')
 @login_required
+@conditional(lambda params: [dict(params).get('section', 'circular')])
+@response_cache.cached(lambda params: [dict(params).get('section', 'circular')])
 def machine_diagnostics():
-    """تشخیص مشکلات دستگاه (گردباف)"""
-    days = int(request.args.get('days', 30))
+    """تشخیص مشکلات دستگاه‌های یک بخش (section=circular|extruder|sewing)
+
+    آستانه‌ها از DIAGNOSTIC_RULES و پارامترهای هم‌نام درخواست (مثلاً max_downtime_hours) می‌آیند.
+    """
+    section = request.args.get('section', 'circular')
+    if section not in SECTION_MODELS:
+        return jsonify({'error': 'بخش نامعتبر'}), 400
+    try:
+        days = bounded_number(request.args.get('days', 30), int, 0, 3650)
+        rules = resolve_rules(section, current_app.config['DIAGNOSTIC_RULES'], request.args)
+    except ValueError:
+        return jsonify({'error': 'پارامتر عددی نامعتبر'}), 400
+
     today = date.today()
     start_date = today - timedelta(days=days)
-
-    # میانگین downtime و footage برای هر دستگاه
-    perf = db.session.query(
-        CircularReport.machine_number,
-        func.avg(CircularReport.footage).label('avg_footage'),
-        func.avg(CircularReport.downtime_hours).label('avg_downtime'),
-        func.count(CircularReport.id).label('shifts')
-    ).filter(CircularReport.date >= start_date) \
-        .group_by(CircularReport.machine_number).all()
-
-    # مسائل گزارش شده
-    issues = db.session.query(
-        MachineIssue.machine_number,
-        MachineIssue.issue_type,
-        func.count(MachineIssue.id).label('count')
+    history_start = start_date - timedelta(days=int(rules['baseline_days']))
+    reader = sqlite_profile.reader
+
+    # سری روزانه هر دستگاه از جدول تجمیعی (سابقه + بازه بررسی)
+    R = ProductionRollup
+    daily = reader.query(
+        R.machine_number, R.date,
+        func.sum(R.value_sum), func.sum(R.value_count), func.sum(R.report_count)
+    ).filter(R.section == section, R.date >= history_start).group_by(R.machine_number, R.date).all()
+
+    # توقف فقط در گزارش گردباف ثبت می‌شود
+    downtime = {}
+    if section == 'circular':
+        C = archive.source(CircularReport, history_start, session=reader)
+        downtime = {
+            (row.machine_number, row.date): row.downtime
+            for row in reader.query(
+                C.machine_number, C.date,
+                func.sum(C.downtime_hours).label('downtime')
+            ).filter(
+                C.date >= history_start, C.machine_number.isnot(None)
+            ).group_by(C.machine_number, C.date)
+        }
+    daily = [(m, d, value, count, shifts, downtime.get((m, d))) for m, d, value, count, shifts in daily]
+
+    # مسائل گزارش‌شده (بخش‌های بدون دستگاه روی دستگاه 0، مثل جدول تجمیعی)
+    I = archive.source(MachineIssue, start_date, session=reader)
+    issue_machine = func.coalesce(I.machine_number, 0)
+    issues = reader.query(
+        issue_machine, I.issue_type, func.count(I.id)
     ).filter(
-        MachineIssue.section == 'circular',
-        MachineIssue.date >= start_date
-    ).group_by(MachineIssue.machine_number, MachineIssue.issue_type).all()
-
-    # ساخت خروجی
-    result = []
-    for p in perf:
-        machine_issues = [i for i in issues if i.machine_number == p.machine_number]
-        top_issue = max(machine_issues, key=lambda x: x.count) if machine_issues else None
-        result.append({
-            'machine': int(p.machine_number),
-            'avg_footage': round(float(p.avg_footage or 0), 1),
-            'avg_downtime': round(float(p.avg_downtime or 0), 1),
-            'shifts': int(p.shifts),
-            'top_issue': top_issue.issue_type if top_issue else 'بدون مشکل',
-            'issue_count': top_issue.count if top_issue else 0
-        })
+        I.section == section,
+        I.date >= start_date
+    ).group_by(issue_machine, I.issue_type).all()
 
-    # پیشنهاد هوشمند
-    suggestions = []
-    for r in result:
-        if r['avg_downtime'] > 2:
-            suggestions.append(f"دستگاه {r['machine']}: توقف بالا ({r['avg_downtime']} ساعت) → بررسی فنی فوری")
-        if r['avg_footage'] < 1500 and r['shifts'] > 3:
-            suggestions.append(f"دستگاه {r['machine']}: تولید پایین → آموزش اپراتور یا تعمیر")
-        if r['issue_count'] > 2:
-            suggestions.append(f"دستگاه {r['machine']}: تکرار مشکل «{r['top_issue']}» → برنامه تعمیر")
+    standards = {**STANDARD_FOOTAGE, **machine_standards(section)} if section == 'circular' else {}
+    result, suggestions = diagnose(daily, issues, standards, SECTION_STANDARDS[section], start_date, rules)
+    if section == 'circular':
+        for r in result:
+            r['avg_footage'] = r['avg_value']  # سازگاری با داشبورد فعلی
 
     return jsonify({
+        'section': section,
         'diagnostics': result,
         'suggestions': suggestions,
-        'period': f'{start_date} تا {end_date}'
+        'rules': rules,
+        'period': f'{start_date} تا {today}'
     })
 
 if __name__ == '__main__':
+    app = create_app()
     if not os.path.exists('factory_monitoring.db'):
-        init_db()
+        init_db(app)
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,204 @@
+"""بایگانی سال‌های بسته گزارش‌ها در فایل‌های SQLite جدا (یک فایل برای هر سال شمسی)
+
+گزارش‌های سال‌هایی که دیگر ویرایش نمی‌شوند از دیتابیس اصلی به archives/reports_1402.db
+منتقل می‌شوند تا جدول‌های «داغ» که شیفت‌ها در آن‌ها می‌نویسند کوچک بمانند. کوئری‌های
+تحلیل و خروجی به جای مدل، source(model, start, end) را می‌خوانند: اگر بازه با هیچ
+بایگانی هم‌پوشانی نداشته باشد خود جدول اصلی است، وگرنه فایل‌های هم‌پوشان روی همان
+اتصال ATTACH می‌شوند و جدول اصلی با جدول‌های بایگانی UNION ALL می‌شود.
+
+جدول تجمیعی داشبورد (production_rollup) در دیتابیس اصلی می‌ماند؛ داشبورد به بایگانی
+نیازی ندارد. گزارش‌های بایگانی‌شده فقط‌خواندنی‌اند (ویرایش و حذف فقط روی جدول اصلی).
+"""
+import os
+import re
+import threading
+from datetime import timedelta
+
+from jdatetime import date as jdate
+from sqlalchemy import Column, Index, MetaData, Table, func, inspect, select, text, union_all
+from sqlalchemy.orm import aliased
+
+_FILE_NAME = re.compile(r'^reports_(\d{4})\.db$')
+
+
+def jalali_year_range(year):
+    """(روز اول، روز آخر) میلادی یک سال شمسی"""
+    return jdate(year, 1, 1).togregorian(), jdate(year + 1, 1, 1).togregorian() - timedelta(days=1)
+
+
+class ReportArchive:
+    """انتقال سال‌های بسته به فایل‌های بایگانی و خواندن شفاف جدول اصلی + بایگانی‌ها"""
+
+    def __init__(self, app=None, db=None):
+        self.models = {}
+        self._tables = {}  # (نام جدول، سال) → Table در schema بایگانی
+        self._years = (None, [])  # (mtime پوشه، سال‌ها)
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.config.setdefault('ARCHIVE_DIR', 'archives')
+        app.config.setdefault('ARCHIVE_MAX_ATTACHED', 8)  # سقف پیش‌فرض SQLite ده دیتابیس ضمیمه است
+
+        self.db = db
+        self.directory = app.config['ARCHIVE_DIR']
+        if not os.path.isabs(self.directory):
+            self.directory = os.path.join(app.instance_path, self.directory)
+        self.max_attached = app.config['ARCHIVE_MAX_ATTACHED']
+        app.extensions['archive'] = self
+
+    def register(self, *models):
+        """مدل‌هایی که بایگانی می‌شوند (هر کدام ستون date دارند)"""
+        for model in models:
+            self.models[model.__table__.name] = model
+
+    def path(self, year):
+        return os.path.join(self.directory, f'reports_{year}.db')
+
+    @staticmethod
+    def schema(year):
+        return f'archive_{year}'
+
+    def years(self):
+        """سال‌های شمسی بایگانی‌شده (فهرست پوشه فقط بعد از تغییر آن دوباره خوانده می‌شود)"""
+        # پوشه با اولین بایگانی ساخته می‌شود
+        if not os.path.isdir(self.directory):
+            return []
+        mtime = os.stat(self.directory).st_mtime_ns
+        if self._years[0] != mtime:
+            years = sorted(int(m.group(1)) for m in map(_FILE_NAME.match, os.listdir(self.directory)) if m)
+            self._years = (mtime, years)
+        return self._years[1]
+
+    def overlapping(self, start=None, end=None):
+        """سال‌های بایگانی‌شده‌ای که با بازه [start, end] هم‌پوشانی دارند"""
+        result = []
+        for year in self.years():
+            first, last = jalali_year_range(year)
+            if (start is None or last >= start) and (end is None or first <= end):
+                result.append(year)
+        return result
+
+    def table(self, model, year):
+        """جدول هم‌شکل مدل در schema بایگانی (بدون کلید خارجی؛ user و machine در دیتابیس اصلی‌اند)"""
+        key = (model.__table__.name, year)
+        if key not in self._tables:
+            with self._lock:
+                if key not in self._tables:
+                    source = model.__table__
+                    table = Table(source.name, MetaData(), schema=self.schema(year),
+                                  *(Column(c.name, c.type, primary_key=c.primary_key) for c in source.columns))
+                    for index in source.indexes:
+                        Index(index.name, *(table.c[c.name] for c in index.columns))
+                    self._tables[key] = table
+        return self._tables[key]
+
+    def attach(self, connection, years):
+        """ATTACH فایل‌های بایگانی سال‌های داده‌شده روی یک اتصال (اگر قبلاً ضمیمه نشده باشند)
+
+        باید بیرون از تراکنش نوشتن صدا زده شود (SQLite داخل تراکنش ATTACH/DETACH نمی‌کند).
+        """
+        attached = {row[1] for row in connection.execute(text('PRAGMA database_list'))}
+        wanted = {self.schema(year) for year in years}
+        missing = wanted - attached
+        if not missing:
+            return
+        # اتصال‌های pool ضمیمه‌های قبلی را نگه می‌دارند؛ قبل از رسیدن به سقف، غیرلازم‌ها جدا می‌شوند
+        stale = sorted(name for name in attached if name.startswith('archive_') and name not in wanted)
+        overflow = len(attached) - 2 + len(missing) - self.max_attached  # main و temp شمرده نمی‌شوند
+        for name in stale[:max(overflow, 0)]:
+            connection.execute(text(f'DETACH DATABASE "{name}"'))
+        for year in sorted(years):
+            if self.schema(year) in missing:
+                connection.execute(text(f'ATTACH DATABASE :path AS "{self.schema(year)}"'),
+                                   {'path': self.path(year)})
+
+    def upgrade_schema(self, connection):
+        """افزودن ستون‌ها و ایندکس‌های تازه مدل‌ها به همه فایل‌های بایگانی (در مهاجرت‌ها)
+
+        جدول بایگانی با ستون‌های فعلی مدل خوانده و با جدول اصلی UNION می‌شود؛ پس ستونی که به
+        مدل اضافه شود باید به فایل‌های قبلی هم اضافه شود (مقدار آن برای سطرهای قدیمی NULL است).
+        """
+        years = self.years()
+        self.attach(connection, years)
+        for year in years:
+            for model in self.models.values():
+                table = self.table(model, year)
+                table.create(connection, checkfirst=True)
+                existing = {column['name'] for column in inspect(connection).get_columns(table.name, table.schema)}
+                for column in table.columns:
+                    if column.name not in existing:
+                        connection.execute(text(
+                            f'ALTER TABLE "{table.schema}".{table.name} '
+                            f'ADD COLUMN {column.name} {column.type.compile(connection.dialect)}'
+                        ))
+                for index in table.indexes:
+                    index.create(connection, checkfirst=True)
+
+    def source(self, model, start=None, end=None, session=None):
+        """موجودیت قابل کوئری برای گزارش‌های بازه: خود مدل یا alias روی UNION ALL با بایگانی‌ها
+
+        ستون‌ها هم‌نام مدل‌اند، پس فیلترها و select ها با source.date و ... مثل مدل نوشته می‌شوند.
+        """
+        years = self.overlapping(start, end) if model.__table__.name in self.models else []
+        if not years:
+            return model
+        self.attach((session or self.db.session).connection(), years)
+        parts = [select(model.__table__)] + [select(self.table(model, year)) for year in years]
+        return aliased(model, union_all(*parts).subquery(f'{model.__table__.name}_all'))
+
+    def archive_year(self, year, today=None):
+        """انتقال گزارش‌های یک سال شمسی بسته به فایل بایگانی آن؛ {نام جدول: تعداد سطر منتقل‌شده}
+
+        ابتدا سطرها با INSERT OR IGNORE کپی و commit می‌شوند و بعد از تطبیق تعداد از جدول
+        اصلی حذف می‌شوند؛ در WAL تراکنش بین چند فایل اتمیک نیست، پس این ترتیب تضمین می‌کند
+        که با قطع برنامه در میانه کار سطری گم نشود و اجرای دوباره همان کار را تمام کند.
+        """
+        today = today or jdate.today().togregorian()
+        if year >= jdate.fromgregorian(date=today).year:
+            raise ValueError(f'سال {year} هنوز بسته نشده است')
+        first, last = jalali_year_range(year)
+        schema = self.schema(year)
+        os.makedirs(self.directory, exist_ok=True)
+        created = not os.path.exists(self.path(year))
+        moved = {}
+
+        with self.db.engine.connect() as connection:
+            connection.execute(text(f'ATTACH DATABASE :path AS "{schema}"'), {'path': self.path(year)})
+            try:
+                for model in self.models.values():
+                    self.table(model, year).create(connection, checkfirst=True)
+                connection.commit()
+
+                for name, model in self.models.items():
+                    source, target = model.__table__, self.table(model, year)
+                    in_year = source.c.date.between(first, last)
+                    count = connection.execute(select(func.count()).select_from(source).where(in_year)).scalar()
+                    if not count:
+                        continue
+                    # شناسه‌ها حفظ می‌شوند؛ اگر جدیدترین سطر جدول اصلی منتقل شود SQLite شناسه آن را دوباره می‌دهد
+                    newest = connection.execute(select(func.max(source.c.id))).scalar()
+                    remaining = connection.execute(select(func.max(source.c.id)).where(~in_year)).scalar()
+                    if remaining is None or remaining < newest:
+                        raise ValueError(f'{name}: جدیدترین سطرها در سال {year} است؛ '
+                                         'بعد از ثبت گزارش‌های سال‌های بعد بایگانی کنید')
+
+                    columns = [c.name for c in source.columns]
+                    connection.execute(target.insert().prefix_with('OR IGNORE').from_select(
+                        columns, select(source).where(in_year)))
+                    connection.commit()
+                    archived = connection.execute(select(func.count()).select_from(target).where(
+                        target.c.id.in_(select(source.c.id).where(in_year)))).scalar()
+                    if archived != count:
+                        raise ValueError(f'{name}: {archived} از {count} سطر در بایگانی پیدا شد')
+                    connection.execute(source.delete().where(in_year))
+                    connection.commit()
+                    moved[name] = count
+            finally:
+                connection.rollback()
+                connection.execute(text(f'DETACH DATABASE "{schema}"'))
+                if created and not moved:
+                    os.remove(self.path(year))  # فایل خالی نباید در فهرست بایگانی‌ها بیاید
+        self._years = (None, [])
+        return moved
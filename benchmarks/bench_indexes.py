@@ -0,0 +1,221 @@
+"""بنچمارک ایندکس‌های جداول گزارش
+
+یک دیتابیس SQLite موقت با میلیون‌ها گزارش شیفت مصنوعی می‌سازد و برای مسیرهای
+تحلیلی، EXPLAIN QUERY PLAN و زمان پاسخ را یک بار بدون ایندکس و یک بار با
+ایندکس‌ها ثبت می‌کند.
+
+    python benchmarks/bench_indexes.py --rows 2000000 --output bench_output.json
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ROUTES = [
+    ('dashboard_data', '/api/dashboard-data?section=circular&period=1y'),
+    ('dashboard_data_filtered', '/api/dashboard-data?section=circular&period=1m&shift=A&machine=3'),
+    ('operator_analytics', '/analytics/operators?days=365'),
+    ('machine_analytics', '/analytics/machines/circular?days=30'),
+    ('operator_machine_matrix', '/api/operator-machine-matrix?days=365'),
+    ('machine_diagnostics', '/api/machine-diagnostics?days=30'),
+]
+
+SHIFTS = ['A', 'B', 'C']
+ISSUE_TYPES = ['گزارش عملیاتی', 'پارگی نخ', 'تعویض قطعه', 'برق']
+
+
+def seed(path, rows, days):
+    """درج مستقیم ردیف‌ها با executemany (بدون ORM) برای سرعت"""
+    from search import normalize
+
+    rng = random.Random(42)
+    operators = [f'اپراتور {i}' for i in range(300)]
+    today = date.today()
+    con = sqlite3.connect(path)
+    con.execute('PRAGMA journal_mode=OFF')
+    con.execute('PRAGMA synchronous=OFF')
+    # شناسه اپراتور i همان i + 1 است (جدول operator در دیتابیس تازه خالی است)
+    con.executemany('INSERT INTO operator (id, name, normalized_name, created_at) VALUES (?, ?, ?, ?)',
+                    [(i + 1, name, normalize(name), datetime.now().isoformat(sep=' '))
+                     for i, name in enumerate(operators)])
+
+    def operator():
+        i = rng.randrange(len(operators))
+        return operators[i], i + 1
+
+    def batches(n, make):
+        batch = []
+        for i in range(n):
+            batch.append(make(i))
+            if len(batch) == 50000:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def day(i):
+        return (today - timedelta(days=i % days)).isoformat()
+
+    def stamp(i):
+        return (datetime.now() - timedelta(minutes=i)).isoformat(sep=' ')
+
+    for batch in batches(rows, lambda i: (
+            day(i), SHIFTS[i % 3], rng.randint(1, 15), *operator(),
+            rng.uniform(400, 1200), rng.uniform(0, 4), stamp(i))):
+        con.executemany(
+            'INSERT INTO circular_report (date, shift, machine_number, operator_name, operator_id, footage, '
+            'downtime_hours, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', batch)
+    for batch in batches(rows // 5, lambda i: (
+            day(i), SHIFTS[i % 3], *operator(), rng.uniform(50, 150), stamp(i))):
+        con.executemany(
+            'INSERT INTO extruder_report (date, shift, operator_name, operator_id, material_weight, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)', batch)
+    for batch in batches(rows // 5, lambda i: (
+            day(i), SHIFTS[i % 3], *operator(), rng.randint(3000, 6000), stamp(i))):
+        con.executemany(
+            'INSERT INTO sewing_report (date, shift, operator_name, operator_id, bags_produced, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)', batch)
+    for batch in batches(rows // 20, lambda i: (
+            rng.randint(1, 15), 'circular', rng.choice(ISSUE_TYPES), day(i), SHIFTS[i % 3], stamp(i))):
+        con.executemany(
+            'INSERT INTO machine_issue (machine_number, section, issue_type, date, shift, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)', batch)
+    con.commit()
+    con.close()
+
+
+def report_indexes(models):
+    return [index for model in models for index in model.__table__.indexes]
+
+
+def run_phase(app, db, client, repeat):
+    """اجرای هر مسیر: ثبت کوئری‌ها و پلن آن‌ها و زمان پاسخ"""
+    from sqlalchemy import event
+
+    with app.app_context():
+        engine = db.engine
+    results = {}
+    for name, url in ROUTES:
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+
+        event.listen(engine, 'before_cursor_execute', capture)
+        status = client.get(url).status_code
+        event.remove(engine, 'before_cursor_execute', capture)
+
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        queries = []
+        raw = engine.raw_connection()
+        try:
+            for statement, parameters in statements:
+                if not statement.lstrip().upper().startswith('SELECT'):
+                    continue
+                plan = raw.cursor().execute('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+                queries.append({'sql': ' '.join(statement.split()), 'plan': [row[-1] for row in plan]})
+        finally:
+            raw.close()
+
+        results[name] = {
+            'url': url,
+            'status': status,
+            'latency_ms': {
+                'median': round(statistics.median(timings), 2),
+                'min': round(min(timings), 2),
+                'max': round(max(timings), 2),
+            },
+            'queries': queries,
+        }
+        print(f'  {name:28} {results[name]["latency_ms"]["median"]:>10.1f} ms  (status {status})')
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2000000, help='تعداد گزارش‌های گردباف')
+    parser.add_argument('--days', type=int, default=3 * 365, help='بازه تاریخی داده مصنوعی')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--db', help='مسیر فایل دیتابیس (پیش‌فرض: فایل موقت)')
+    parser.add_argument('--output', default='bench_output.json')
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(prefix='ntz-bench-'), 'bench.db')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(path)
+    sys.path.insert(0, ROOT)
+    from jinja2 import ChoiceLoader, DictLoader
+    import app as factory
+
+    app, db = factory.create_app(), factory.db
+    # قالب‌ها در بنچمارک مهم نیستند؛ فقط کوئری‌ها اندازه‌گیری می‌شوند
+    app.jinja_loader = ChoiceLoader([app.jinja_loader, DictLoader({
+        'operator_analytics.html': '', 'machine_analytics.html': ''})])
+
+    models = [factory.CircularReport, factory.ExtruderReport, factory.SewingReport, factory.MachineIssue]
+    with app.app_context():
+        db.create_all()
+        with db.engine.begin() as conn:
+            for index in report_indexes(models):
+                index.drop(conn, checkfirst=True)
+        if factory.User.query.filter_by(username='bench').first() is None:
+            user = factory.User(username='bench', role='admin')
+            user.set_password('bench')
+            db.session.add(user)
+            for i in range(1, 16):
+                db.session.add(factory.Machine(machine_number=i, section='circular',
+                                               standard_footage=factory.STANDARD_FOOTAGE[i]))
+            db.session.commit()
+
+            print(f'seeding {args.rows:,} circular reports into {path} ...')
+            started = time.perf_counter()
+            # seed بدون ژورنال و با اتصال خودش می‌نویسد؛ اتصال‌های باز pool باید بسته شوند
+            db.session.remove()
+            db.engine.dispose()
+            seed(path, args.rows, args.days)
+            for section in factory.SECTION_MODELS:
+                factory.rebuild_rollups(section)
+            db.session.commit()
+            print(f'seeded in {time.perf_counter() - started:.1f}s')
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'bench', 'password': 'bench'})
+
+    report = {'rows': args.rows, 'days': args.days, 'database': path, 'phases': {}}
+    for phase in ('before', 'after'):
+        with app.app_context():
+            with db.engine.begin() as conn:
+                for index in report_indexes(models):
+                    if phase == 'after':
+                        index.create(conn, checkfirst=True)
+                    else:
+                        index.drop(conn, checkfirst=True)
+                conn.exec_driver_sql('ANALYZE')
+        print(f'{phase}:')
+        report['phases'][phase] = run_phase(app, db, client, args.repeat)
+
+    report['speedup'] = {
+        name: round(report['phases']['before'][name]['latency_ms']['median']
+                    / max(report['phases']['after'][name]['latency_ms']['median'], 0.001), 2)
+        for name, _ in ROUTES
+    }
+    with open(args.output, 'w', encoding='utf-8') as fp:
+        json.dump(report, fp, ensure_ascii=False, indent=2)
+    print(f'speedup: {report["speedup"]}')
+    print(f'report written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,344 @@
+"""بار مصنوعی تعویض شیفت: تبلت‌های ثبت گزارش و نمایشگرهای سالن به طور همزمان
+
+دیتابیس موقت با تاریخچه مصنوعی (۱۵ دستگاه گردباف، خط اکسترودر و دوخت) ساخته می‌شود؛ بعد
+تبلت‌ها در موج‌های تعویض شیفت (همه تقریباً با هم) چند گزارش پشت سر هم POST می‌کنند و
+نمایشگرها به طور پیوسته داشبورد و ماتریس اپراتور-دستگاه را می‌خوانند. هر تبلت و نمایشگر
+یک نخ است و همه از طریق Flask test client یا یک سرور محلی (--server) درخواست می‌فرستند.
+
+خروجی JSON: throughput و p50/p95/p99 هر مسیر، وضعیت‌های HTTP، خطاهای قفل SQLite (database
+is locked) و گزارش‌های ثبت‌نشده؛ با --baseline نسبت به خروجی یک اجرای قبلی مقایسه می‌شود.
+
+    python benchmarks/bench_shift_change.py --rows 200000 --seconds 60 --output bench_output_load.json
+    python benchmarks/bench_shift_change.py --server --screens 30 --baseline bench_output_load.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, defaultdict
+from datetime import date
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+
+from bench_sqlite_profile import percentiles  # noqa: E402
+
+# مسیرهایی که نمایشگرهای سالن به نوبت می‌خوانند
+SCREEN_ROUTES = [
+    ('dashboard_circular', '/api/dashboard-data?section=circular&period=today'),
+    ('dashboard_circular_7d', '/api/dashboard-data?section=circular&period=7d'),
+    ('dashboard_extruder', '/api/dashboard-data?section=extruder&period=today'),
+    ('dashboard_sewing', '/api/dashboard-data?section=sewing&period=today'),
+    ('operator_machine_matrix', '/api/operator-machine-matrix?days=7'),
+]
+REPORT_PATHS = {'circular': '/report/circular', 'extruder': '/report/extruder', 'sewing': '/report/sewing'}
+
+
+class TestClient:
+    """درخواست از طریق Flask test client (بدون شبکه)"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        return self.client.open(path, method=method, data=data).status_code
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None  # فرم‌ها بعد از ثبت redirect می‌کنند؛ خود POST اندازه‌گیری می‌شود
+
+
+class ServerClient:
+    """همان رابط روی سرور محلی (HTTP واقعی، کوکی نشست جدا برای هر نخ)"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(), _NoRedirect())
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        try:
+            with self.opener.open(urllib.request.Request(self.base_url + path, data=body, method=method)) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as error:
+            error.read()
+            return error.code
+
+
+def prepare(factory, app, path, rows, days):
+    """جدول‌ها، کاربر، ۱۵ دستگاه گردباف و تاریخچه مصنوعی همه بخش‌ها"""
+    from bench_indexes import seed
+
+    with app.app_context():
+        factory.db.create_all()
+        user = factory.User(username='bench', role='admin')
+        user.set_password('bench')
+        factory.db.session.add(user)
+        for i in range(1, 16):
+            factory.db.session.add(factory.Machine(machine_number=i, section='circular',
+                                                   standard_footage=factory.STANDARD_FOOTAGE[i]))
+        factory.db.session.commit()
+        # seed بدون ژورنال و با اتصال خودش می‌نویسد؛ اتصال‌های باز pool باید بسته شوند
+        factory.db.session.remove()
+        factory.db.engine.dispose()
+        seed(path, rows, days)
+        for section in factory.SECTION_MODELS:
+            factory.rebuild_rollups(section)
+        factory.db.session.commit()
+
+
+def report_form(section, rng, tablet, shift, rolls):
+    """فرم یک گزارش واقعی‌نما برای تبلت یک دستگاه/خط"""
+    form = {'date': date.today().isoformat(), 'shift': shift, 'operator_name': f'اپراتور {rng.randrange(300)}'}
+    if section == 'circular':
+        barcode = f'LT-{tablet}-{rng.getrandbits(48):x}'
+        rolls.append(barcode)
+        form.update(machine_number=str(tablet % 15 + 1), footage=f'{rng.uniform(500, 1100):.0f}',
+                    downtime_hours=f'{rng.uniform(0, 2):.1f}', roll_weight=f'{rng.uniform(40, 60):.1f}',
+                    roll_barcode=barcode, notes='پارگی نخ' if rng.random() < 0.1 else '')
+    elif section == 'extruder':
+        form.update(material_weight=f'{rng.uniform(80, 140):.1f}', waste=f'{rng.uniform(0, 5):.1f}')
+    else:
+        form.update(bags_produced=str(rng.randint(3000, 6000)), grade_b_bags=str(rng.randint(0, 200)),
+                    footage=f'{rng.uniform(300, 900):.0f}', waste=f'{rng.uniform(0, 3):.1f}',
+                    roll_barcode=rng.choice(rolls) if rolls else '')
+    return form
+
+
+def run_load(factory, app, args, make_client):
+    """اجرای بار و جمع‌آوری زمان‌ها؛ (نمونه‌ها، وضعیت‌ها، تعداد POST هر بخش، خطاهای قفل)"""
+    from sqlalchemy import event
+
+    samples, statuses, attempted = defaultdict(list), defaultdict(Counter), Counter()
+    lock_errors = Counter()
+    results_lock = threading.Lock()
+    rolls = []
+
+    def on_error(context):
+        message = str(context.original_exception).lower()
+        if 'locked' in message or 'busy' in message:
+            with results_lock:
+                lock_errors[type(context.original_exception).__name__] += 1
+
+    with app.app_context():
+        engines = [factory.db.engine]
+    if factory.sqlite_profile.read_engine is not None:
+        engines.append(factory.sqlite_profile.read_engine)
+    for engine in engines:
+        event.listen(engine, 'handle_error', on_error)
+
+    def record(name, started, status):
+        elapsed = (time.perf_counter() - started) * 1000
+        with results_lock:
+            samples[name].append(elapsed)
+            statuses[name][status] += 1
+
+    def logged_in_client():
+        client = make_client()
+        client.request('POST', '/login', {'username': 'bench', 'password': 'bench'})
+        return client
+
+    def tablet(index, section, client):
+        rng = random.Random(index)
+        burst = 0
+        while True:
+            # همه تبلت‌ها در شروع هر موج (با کمی پراکندگی) گزارش‌های شیفت تمام‌شده را ثبت می‌کنند
+            at = start + burst * args.burst_interval + rng.uniform(0, args.burst_jitter)
+            if stop.wait(max(0.0, at - time.perf_counter())):
+                return
+            for _ in range(args.burst_size):
+                if stop.is_set():
+                    return
+                form = report_form(section, rng, index, 'ABC'[burst % 3], rolls)
+                started = time.perf_counter()
+                status = client.request('POST', REPORT_PATHS[section], form)
+                record(f'post_{section}', started, status)
+                with results_lock:
+                    attempted[section] += 1
+            burst += 1
+
+    def screen(index, client):
+        rng = random.Random(1000 + index)
+        n = index
+        while not stop.is_set():
+            name, path = SCREEN_ROUTES[n % len(SCREEN_ROUTES)]
+            n += 1
+            started = time.perf_counter()
+            record(name, started, client.request('GET', path))
+            stop.wait(args.poll_interval * rng.uniform(0.8, 1.2))
+
+    tablets = (['circular'] * args.circular_tablets + ['extruder'] * args.extruder_tablets
+               + ['sewing'] * args.sewing_tablets)
+    # ورود (hash رمز) جزو بار اندازه‌گیری‌شده نیست
+    threads = [threading.Thread(target=tablet, args=(i, section, logged_in_client()))
+               for i, section in enumerate(tablets)]
+    threads += [threading.Thread(target=screen, args=(i, logged_in_client())) for i in range(args.screens)]
+    stop = threading.Event()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    for engine in engines:
+        event.remove(engine, 'handle_error', on_error)
+    return samples, statuses, attempted, lock_errors, elapsed
+
+
+def summarize(factory, app, args, samples, statuses, attempted, lock_errors, elapsed, counts_before):
+    from sqlalchemy import func, select, text
+
+    with app.app_context():
+        counts_after = {section: factory.db.session.execute(select(func.count()).select_from(model)).scalar()
+                        for section, model in factory.SECTION_MODELS.items()}
+        journal_mode = factory.db.session.execute(text('PRAGMA journal_mode')).scalar()
+
+    endpoints = {}
+    for name in sorted(samples):
+        server_errors = sum(count for status, count in statuses[name].items() if status >= 500)
+        endpoints[name] = {
+            'requests': len(samples[name]),
+            'throughput_per_s': round(len(samples[name]) / elapsed, 1),
+            'latency_ms': percentiles(samples[name]),
+            'status': {str(status): count for status, count in sorted(statuses[name].items())},
+            'server_errors': server_errors,
+        }
+    writes = {}
+    for section in factory.SECTION_MODELS:
+        inserted = counts_after[section] - counts_before[section]
+        # فرم‌ها خطا را flash و redirect می‌کنند؛ گزارش ثبت‌نشده = POST منهای سطر تازه
+        writes[section] = {'attempted': attempted[section], 'inserted': inserted,
+                           'failed': attempted[section] - inserted}
+    total = sum(len(timings) for timings in samples.values())
+    return {
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline', 'db')},
+        'journal_mode': journal_mode,
+        'elapsed_s': round(elapsed, 2),
+        'totals': {
+            'requests': total,
+            'throughput_per_s': round(total / elapsed, 1),
+            'latency_ms': percentiles([t for timings in samples.values() for t in timings]),
+            'server_errors': sum(endpoint['server_errors'] for endpoint in endpoints.values()),
+            'lock_errors': sum(lock_errors.values()),
+            'failed_writes': sum(section['failed'] for section in writes.values()),
+        },
+        'lock_errors': dict(lock_errors),
+        'writes': writes,
+        'endpoints': endpoints,
+    }
+
+
+def compare(report, baseline):
+    """نسبت throughput و p95/p99 هر مسیر به اجرای قبلی (بیشتر از ۱ در latency یعنی کندتر)"""
+    def ratio(current, previous):
+        return round(current / previous, 2) if current is not None and previous else None
+
+    result = {}
+    for name, endpoint in report['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if previous is None:
+            continue
+        result[name] = {
+            'throughput': ratio(endpoint['throughput_per_s'], previous['throughput_per_s']),
+            'p95': ratio(endpoint['latency_ms'].get('p95'), previous['latency_ms'].get('p95')),
+            'p99': ratio(endpoint['latency_ms'].get('p99'), previous['latency_ms'].get('p99')),
+        }
+    result['lock_errors'] = {'current': report['totals']['lock_errors'],
+                             'baseline': baseline.get('totals', {}).get('lock_errors')}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000, help='تعداد گزارش‌های گردباف تاریخچه')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--circular-tablets', type=int, default=15, help='یک تبلت برای هر دستگاه گردباف')
+    parser.add_argument('--extruder-tablets', type=int, default=2)
+    parser.add_argument('--sewing-tablets', type=int, default=3)
+    parser.add_argument('--screens', type=int, default=10, help='نمایشگرهای سالن (نخ‌های خواننده)')
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--burst-size', type=int, default=3, help='گزارش‌های هر تبلت در هر موج')
+    parser.add_argument('--burst-interval', type=float, default=10, help='فاصله موج‌های تعویض شیفت (ثانیه)')
+    parser.add_argument('--burst-jitter', type=float, default=1, help='پراکندگی شروع تبلت‌ها در هر موج (ثانیه)')
+    parser.add_argument('--poll-interval', type=float, default=1, help='فاصله خواندن هر نمایشگر (ثانیه)')
+    parser.add_argument('--server', action='store_true', help='سرور HTTP محلی به جای test client')
+    parser.add_argument('--no-cache', action='store_true', help='بدون کش پاسخ (اندازه‌گیری خود دیتابیس)')
+    parser.add_argument('--sqlite-profile', default=os.environ.get('SQLITE_PROFILE', 'production'))
+    parser.add_argument('--db', help='دیتابیس آماده (پیش‌فرض: ساخت دیتابیس موقت)')
+    parser.add_argument('--baseline', help='خروجی JSON یک اجرای قبلی برای مقایسه')
+    parser.add_argument('--output', default='bench_output_load.json')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='ntz-bench-load-')
+    path = os.path.abspath(args.db or os.path.join(workdir, 'load.db'))
+    # تنظیمات قبل از import app خوانده می‌شوند
+    os.environ['DATABASE_URL'] = 'sqlite:///' + path
+    os.environ['SQLITE_PROFILE'] = args.sqlite_profile
+    os.environ.setdefault('LIVE_UPDATES_BACKEND', 'none')
+    if args.no_cache:
+        os.environ['RESPONSE_CACHE_BACKEND'] = 'none'
+    import app as factory
+
+    app = factory.create_app()
+    if not args.db:
+        print(f'seeding {args.rows:,} circular reports into {path} ...')
+        prepare(factory, app, path, args.rows, args.days)
+    with app.app_context():
+        from sqlalchemy import func, select
+        counts_before = {section: factory.db.session.execute(select(func.count()).select_from(model)).scalar()
+                         for section, model in factory.SECTION_MODELS.items()}
+
+    server = None
+    if args.server:
+        import logging
+        from werkzeug.serving import make_server
+
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)  # لاگ هر درخواست زمان‌ها را هم خراب می‌کند
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{server.server_port}'
+        make_client = lambda: ServerClient(base_url)  # noqa: E731
+    else:
+        make_client = lambda: TestClient(app)  # noqa: E731
+
+    tablets = args.circular_tablets + args.extruder_tablets + args.sewing_tablets
+    print(f'running {tablets} tablets + {args.screens} screens for {args.seconds}s '
+          f'({"server" if args.server else "test client"}) ...')
+    try:
+        measured = run_load(factory, app, args, make_client)
+    finally:
+        if server is not None:
+            server.shutdown()
+    report = summarize(factory, app, args, *measured, counts_before)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as fp:
+            report['comparison'] = compare(report, json.load(fp))
+
+    for name, endpoint in report['endpoints'].items():
+        latency = endpoint['latency_ms']
+        print(f"  {name:26} {endpoint['throughput_per_s']:>8}/s  p50 {latency.get('p50'):>8} ms  "
+              f"p95 {latency.get('p95'):>8} ms  p99 {latency.get('p99'):>8} ms  5xx {endpoint['server_errors']}")
+    totals = report['totals']
+    print(f"  total {totals['throughput_per_s']}/s, lock errors {totals['lock_errors']}, "
+          f"failed writes {totals['failed_writes']}")
+
+    with open(args.output, 'w', encoding='utf-8') as fp:
+        json.dump(report, fp, ensure_ascii=False, indent=2)
+    print(f'report written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
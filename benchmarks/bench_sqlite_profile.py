@@ -0,0 +1,180 @@
+"""بنچمارک همزمانی پروفایل SQLite
+
+چند نخ نویسنده گزارش گردباف ثبت می‌کنند (POST /report/circular) و همزمان چند نخ
+خواننده /api/dashboard-data را می‌خوانند؛ یک بار با SQLITE_PROFILE=off و یک بار با
+پروفایل production (بدون و با engine فقط‌خواندنی تحلیل‌ها). برای هر حالت
+throughput، p50/p95/p99 و تعداد نوشتن‌های ناموفق (قفل) ثبت می‌شود.
+
+    python benchmarks/bench_sqlite_profile.py --rows 200000 --seconds 20 --output bench_output_sqlite.json
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+
+PHASES = [
+    ('off', {'SQLITE_PROFILE': 'off', 'SQLITE_READ_ENGINE': '0'}),
+    ('production', {'SQLITE_PROFILE': 'production', 'SQLITE_READ_ENGINE': '0'}),
+    ('production_read_engine', {'SQLITE_PROFILE': 'production', 'SQLITE_READ_ENGINE': '1'}),
+]
+
+
+def percentiles(timings):
+    if not timings:
+        return {}
+    ordered = sorted(timings)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 2)
+
+    return {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99), 'max': round(ordered[-1], 2),
+            'mean': round(statistics.mean(ordered), 2)}
+
+
+def prepare(path, rows, days):
+    """ساخت دیتابیس پایه با جداول، کاربر، دستگاه‌ها و داده مصنوعی"""
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(path)
+    os.environ['SQLITE_PROFILE'] = 'off'
+    from bench_indexes import seed
+    import app as factory
+
+    with factory.create_app().app_context():
+        factory.db.create_all()
+        user = factory.User(username='bench', role='admin')
+        user.set_password('bench')
+        factory.db.session.add(user)
+        for i in range(1, 16):
+            factory.db.session.add(factory.Machine(machine_number=i, section='circular',
+                                                   standard_footage=factory.STANDARD_FOOTAGE[i]))
+        factory.db.session.commit()
+        seed(path, rows, days)
+        for section in factory.SECTION_MODELS:
+            factory.rebuild_rollups(section)
+        factory.db.session.commit()
+        factory.db.engine.dispose()
+
+
+def run_phase(path, writers, readers, seconds):
+    """یک حالت در همین پردازه (تنظیمات از متغیرهای محیطی خوانده شده‌اند)"""
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(path)
+    os.environ['RESPONSE_CACHE_BACKEND'] = 'none'  # خود دیتابیس اندازه‌گیری شود نه کش
+    from sqlalchemy import text
+    import app as factory
+
+    app = factory.create_app()
+    with app.app_context():
+        rows_before = factory.CircularReport.query.count()
+
+    stop = threading.Event()
+    results = {'write': [], 'read': []}
+    failures = {'write': 0, 'read': 0}
+    lock = threading.Lock()
+    today = date.today().isoformat()
+
+    def worker(kind, index):
+        client = app.test_client()
+        client.post('/login', data={'username': 'bench', 'password': 'bench'})
+        timings, errors, n = [], 0, 0
+        while not stop.is_set():
+            n += 1
+            started = time.perf_counter()
+            if kind == 'write':
+                response = client.post('/report/circular', data={
+                    'date': today, 'shift': 'ABC'[n % 3], 'machine_number': str(index % 15 + 1),
+                    'operator_name': f'اپراتور {index}', 'footage': '850', 'downtime_hours': '0.5'})
+            else:
+                response = client.get('/api/dashboard-data?section=circular&period=1m')
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 500:
+                errors += 1
+        with lock:
+            results[kind].extend(timings)
+            failures[kind] += errors
+
+    threads = [threading.Thread(target=worker, args=('write', i)) for i in range(writers)]
+    threads += [threading.Thread(target=worker, args=('read', i)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        inserted = factory.CircularReport.query.count() - rows_before
+        journal_mode = factory.db.session.execute(text('PRAGMA journal_mode')).scalar()
+    attempted = len(results['write'])
+    return {
+        'journal_mode': journal_mode,
+        'writes': {'attempted': attempted, 'inserted': inserted,
+                   # فرم‌ها خطا را flash می‌کنند؛ نوشتن ناموفق = ثبت‌نشده (عمدتاً database is locked)
+                   'failed': attempted - inserted,
+                   'throughput_per_s': round(inserted / seconds, 1),
+                   'latency_ms': percentiles(results['write'])},
+        'reads': {'requests': len(results['read']), 'errors': failures['read'],
+                  'throughput_per_s': round(len(results['read']) / seconds, 1),
+                  'latency_ms': percentiles(results['read'])},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000, help='تعداد گزارش‌های گردباف پایه')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--output', default='bench_output_sqlite.json')
+    parser.add_argument('--phase', help=argparse.SUPPRESS)  # اجرای داخلی یک حالت در پردازه جدا
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.phase:
+        print(json.dumps(run_phase(args.db, args.writers, args.readers, args.seconds)))
+        return
+
+    workdir = tempfile.mkdtemp(prefix='ntz-bench-sqlite-')
+    base = os.path.join(workdir, 'base.db')
+    print(f'seeding {args.rows:,} circular reports into {base} ...')
+    prepare(base, args.rows, args.days)
+
+    report = {'rows': args.rows, 'writers': args.writers, 'readers': args.readers,
+              'seconds': args.seconds, 'phases': {}}
+    for name, env in PHASES:
+        # هر حالت روی یک کپی تازه؛ حالت off باید با journal پیش‌فرض (DELETE) شروع شود
+        path = os.path.join(workdir, f'{name}.db')
+        shutil.copyfile(base, path)
+        con = sqlite3.connect(path)
+        con.execute('PRAGMA journal_mode=' + ('DELETE' if env['SQLITE_PROFILE'] == 'off' else 'WAL'))
+        con.close()
+
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--phase', name, '--db', path,
+             '--writers', str(args.writers), '--readers', str(args.readers), '--seconds', str(args.seconds)],
+            env={**os.environ, **env}, check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        report['phases'][name] = result
+        print(f"  {name:24} writes {result['writes']['throughput_per_s']:>7}/s "
+              f"(failed {result['writes']['failed']}, p99 {result['writes']['latency_ms'].get('p99')} ms)  "
+              f"reads {result['reads']['throughput_per_s']:>7}/s "
+              f"(p99 {result['reads']['latency_ms'].get('p99')} ms)")
+
+    with open(args.output, 'w', encoding='utf-8') as fp:
+        json.dump(report, fp, ensure_ascii=False, indent=2)
+    print(f'report written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""بنچمارک زمان شروع: import ماژول، ساخت اپ، اولین درخواست و دستورهای flask db
+
+هر سناریو چند بار در یک پردازه تازه اجرا می‌شود (مثل شروع سرد یک worker یا اجرای یک دستور
+CLI) و زمان دیوار-ساعت کل پردازه ثبت می‌شود. علاوه بر آن سنگین‌ترین import های سطح اول
+(python -X importtime) و اینکه وابستگی‌های فقط-خروجی (pandas، openpyxl، pyarrow) هنگام
+شروع بارگذاری شده‌اند یا نه در خروجی JSON می‌آید.
+
+    python benchmarks/bench_startup.py --repeat 10 --output bench_output_startup.json
+    python benchmarks/bench_startup.py --baseline bench_output_startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PROJECT = os.path.dirname(ROOT)
+sys.path.insert(0, ROOT)
+
+from bench_sqlite_profile import percentiles  # noqa: E402
+
+# ماژول‌هایی که نباید هنگام شروع worker بارگذاری شوند
+LAZY_MODULES = ('pandas', 'openpyxl', 'pyarrow')
+
+FIRST_REQUEST = '''
+import app as factory
+app = factory.create_app()
+client = app.test_client()
+client.post('/login', data={'username': 'bench', 'password': 'bench'})
+assert client.get('/api/machines').status_code == 200
+'''
+
+SCENARIOS = [
+    ('interpreter', [sys.executable, '-c', 'pass']),
+    ('import', [sys.executable, '-c', 'import app']),
+    ('create_app', [sys.executable, '-c', 'import app; app.create_app()']),
+    ('first_request', [sys.executable, '-c', FIRST_REQUEST]),
+    ('flask_db_current', [sys.executable, '-m', 'flask', '--app', 'app', 'db', 'current']),
+    ('flask_db_upgrade', [sys.executable, '-m', 'flask', '--app', 'app', 'db', 'upgrade']),
+]
+
+
+def prepare(path):
+    """دیتابیس با جدول‌های مدل، کاربر bench و نسخه migration آخر (upgrade بعدی کاری ندارد)"""
+    script = '''
+import app as factory
+from flask_migrate import stamp
+app = factory.create_app()
+with app.app_context():
+    factory.db.create_all()
+    user = factory.User(username='bench', role='admin')
+    user.set_password('bench')
+    factory.db.session.add(user)
+    factory.db.session.commit()
+    stamp()
+'''
+    subprocess.run([sys.executable, '-c', script], cwd=PROJECT, env=environment(path), check=True,
+                   capture_output=True)
+
+
+def environment(path):
+    return {**os.environ, 'DATABASE_URL': 'sqlite:///' + path}
+
+
+def measure(command, path, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run(command, cwd=PROJECT, env=environment(path), check=True, capture_output=True)
+        timings.append((time.perf_counter() - started) * 1000)
+    return {**percentiles(timings), 'min': round(min(timings), 2)}
+
+
+def import_profile(path, top):
+    """سنگین‌ترین import های سطح اول (میلی‌ثانیه، تجمعی) و ماژول‌های دیرهنگام بارگذاری‌شده"""
+    script = f'import json, sys, app; print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))'
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', script], cwd=PROJECT,
+                            env=environment(path), check=True, capture_output=True, text=True)
+    imports, children = [], []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # هر سطح تو در تو دو فاصله؛ فرزندهای مستقیم app قبل از خود آن چاپ می‌شوند
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entry = (name.strip(), round(int(cumulative) / 1000, 1))
+        if depth == 1:
+            children.append(entry)
+        elif depth == 0:
+            if entry[0] == 'app':
+                imports = children + [entry]
+            children = []
+    loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    return {
+        'top_imports': dict(sorted(imports, key=lambda item: -item[1])[:top]),
+        'lazy_modules_loaded': {name: name in loaded for name in LAZY_MODULES},
+    }
+
+
+def compare(report, baseline):
+    """نسبت p50 هر سناریو به اجرای قبلی (کمتر از ۱ یعنی سریع‌تر)"""
+    result = {}
+    for name, timing in report['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous and previous.get('p50'):
+            result[name] = round(timing['p50'] / previous['p50'], 2)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='تعداد اجرای هر سناریو')
+    parser.add_argument('--top', type=int, default=15, help='تعداد import های سنگین در خروجی')
+    parser.add_argument('--baseline', help='خروجی JSON یک اجرای قبلی برای مقایسه')
+    parser.add_argument('--output', default='bench_output_startup.json')
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix='ntz-bench-startup-'), 'startup.db')
+    prepare(path)
+    # یک اجرای گرم‌کننده تا فایل‌های pyc ساخته شوند و زمان کامپایل در اندازه‌گیری نیاید
+    subprocess.run([sys.executable, '-c', 'import app'], cwd=PROJECT, env=environment(path), check=True)
+
+    report = {'repeat': args.repeat, 'python': sys.version.split()[0], 'scenarios': {}}
+    for name, command in SCENARIOS:
+        report['scenarios'][name] = timing = measure(command, path, args.repeat)
+        print(f"  {name:18} p50 {timing['p50']:>8} ms  min {timing['min']:>8} ms  max {timing['max']:>8} ms")
+    report.update(import_profile(path, args.top))
+    loaded = [name for name, value in report['lazy_modules_loaded'].items() if value]
+    print(f"  lazy modules loaded at import: {', '.join(loaded) or 'none'}")
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as fp:
+            report['comparison'] = compare(report, json.load(fp))
+
+    with open(args.output, 'w', encoding='utf-8') as fp:
+        json.dump(report, fp, ensure_ascii=False, indent=2)
+    print(f'report written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""موتور تشخیص مشکلات دستگاه‌ها (گردباف، اکسترودر، دوخت)
+
+ورودی، سری روزانه هر دستگاه (از جدول تجمیعی) برای بازه بررسی به همراه یک بازه
+سابقه محدود قبل از آن است؛ پس هزینه محاسبه به طول کل تاریخچه بستگی ندارد. همه
+محاسبات برداری (pandas) است:
+
+    - میانگین تولید هر شیفت، تعداد شیفت و میانگین توقف در بازه بررسی
+    - میانگین و انحراف معیار روزانه هر دستگاه در بازه سابقه و z-score بازه بررسی
+      نسبت به سابقه خود دستگاه
+    - راندمان نسبت به استاندارد دستگاه (Machine.standard_footage)
+    - پرتکرارترین مسئله هر دستگاه با یک join روی جدول مسائل
+
+آستانه‌ها از DEFAULT_RULES (و SECTION_RULES مخصوص هر بخش) می‌آیند و با تنظیمات اپ
+و پارامترهای درخواست قابل تغییرند.
+"""
+import math
+
+DEFAULT_RULES = {
+    'baseline_days': 90,        # طول بازه سابقه قبل از بازه بررسی
+    'min_history_days': 7,      # حداقل روزهای سابقه برای محاسبه z-score
+    'max_downtime_hours': 2.0,  # میانگین توقف هر شیفت
+    'min_efficiency': 75.0,     # درصد تولید نسبت به استاندارد (0 = خاموش)
+    'min_avg_value': 0.0,       # حداقل میانگین تولید هر شیفت (0 = خاموش)
+    'min_shifts': 3,            # حداقل شیفت برای قضاوت درباره تولید
+    'zscore': 2.0,              # افت معنادار نسبت به سابقه خود دستگاه
+    'max_issue_repeats': 2,     # تکرار یک مسئله
+}
+
+# پیش‌فرض‌های مخصوص بخش؛ گردباف همان قانون قبلی «میانگین متراژ شیفت کمتر از 1500» را دارد
+SECTION_RULES = {
+    'circular': {'min_avg_value': 1500.0, 'min_efficiency': 0.0},
+}
+
+# بازه مجاز هر قانون در پارامترهای درخواست (نوع از DEFAULT_RULES)
+RULE_LIMITS = {
+    'baseline_days': (1, 3650),
+    'min_history_days': (0, 3650),
+    'max_downtime_hours': (0, 24),
+    'min_efficiency': (0, 1000),
+    'min_avg_value': (0, 1e9),
+    'min_shifts': (0, 100000),
+    'zscore': (0, 100),
+    'max_issue_repeats': (0, 100000),
+}
+
+DAILY_COLUMNS = ['machine', 'date', 'value', 'count', 'shifts', 'downtime']
+ISSUE_COLUMNS = ['machine', 'issue_type', 'count']
+
+
+def bounded_number(value, kind, low, high):
+    """عدد متناهی kind (int یا float) در بازه [low, high]؛ وگرنه ValueError
+
+    int('1e400') و timedelta(days=inf) به جای ValueError خطای OverflowError می‌دهند؛
+    اینجا همه به ValueError تبدیل می‌شوند.
+    """
+    number = float(value)
+    if not math.isfinite(number) or not low <= number <= high:
+        raise ValueError(f'{value} خارج از بازه {low} تا {high}')
+    if kind is int:
+        if not number.is_integer():
+            raise ValueError(f'{value} عدد صحیح نیست')
+        return int(number)
+    return number
+
+
+def resolve_rules(section, configured=None, overrides=None):
+    """قوانین نهایی: پیش‌فرض ← پیش‌فرض بخش ← تنظیمات اپ (کلی یا مخصوص بخش) ← پارامترهای درخواست
+
+    ValueError اگر مقدار پارامتری عددی نباشد یا از بازه RULE_LIMITS بیرون باشد.
+    """
+    rules = dict(DEFAULT_RULES)
+    rules.update(SECTION_RULES.get(section, {}))
+    configured = configured or {}
+    rules.update({k: v for k, v in configured.items() if k in DEFAULT_RULES})
+    rules.update(configured.get(section, {}))
+    for key, value in (overrides or {}).items():
+        if key in DEFAULT_RULES and value not in (None, ''):
+            rules[key] = bounded_number(value, type(DEFAULT_RULES[key]), *RULE_LIMITS[key])
+    return rules
+
+
+def machine_label(machine):
+    return f'دستگاه {machine}' if machine else 'خط تولید'
+
+
+def diagnose(daily, issues, standards, default_standard, start_date, rules):
+    """ساخت جدول تشخیص و پیشنهادها
+
+    daily: سطرهای DAILY_COLUMNS (سابقه و بازه بررسی)، downtime برای بخش‌های بدون توقف None است
+    issues: سطرهای ISSUE_COLUMNS در بازه بررسی
+    standards: شماره دستگاه → استاندارد هر شیفت
+    """
+    import numpy as np
+    import pandas as pd  # دیرهنگام: شروع worker و دستورهای flask بدون pandas
+
+    daily = pd.DataFrame([tuple(row) for row in daily], columns=DAILY_COLUMNS)
+    daily['date'] = pd.to_datetime(daily['date'])
+    for column in ('value', 'downtime'):
+        daily[column] = daily[column].astype(float)
+    in_window = (daily['date'] >= np.datetime64(start_date)).to_numpy()
+
+    # آمار بازه بررسی برای هر دستگاه
+    window = daily[in_window].groupby('machine')[['value', 'count', 'shifts', 'downtime']].sum(min_count=1)
+    window = window[window['shifts'] > 0]
+    window['avg_value'] = (window['value'] / window['count'].where(window['count'] > 0)).fillna(0)
+    window['avg_downtime'] = window['downtime'] / window['shifts']
+
+    # سابقه: میانگین و انحراف معیار تولید روزانه هر شیفت برای هر دستگاه
+    history = daily[~in_window & (daily['count'] > 0).to_numpy()]
+    per_shift = (history['value'] / history['count']).groupby(history['machine'])
+    baseline = per_shift.agg(['mean', 'std', 'count']).rename(
+        columns={'mean': 'baseline_mean', 'std': 'baseline_std', 'count': 'history_days'})
+    result = window.join(baseline, how='left')
+    usable = (result['history_days'] >= rules['min_history_days']) & (result['baseline_std'] > 0)
+    result['zscore'] = ((result['avg_value'] - result['baseline_mean']) / result['baseline_std']).where(usable)
+
+    # راندمان نسبت به استاندارد هر دستگاه
+    standard = pd.Series(result.index.map(lambda m: standards.get(m) or default_standard), index=result.index)
+    result['efficiency'] = result['avg_value'] / standard * 100
+
+    # پرتکرارترین مسئله هر دستگاه (یک join به جای جستجو در حلقه)
+    issues = pd.DataFrame([tuple(row) for row in issues], columns=ISSUE_COLUMNS)
+    top = issues.sort_values(['machine', 'count'], ascending=[True, False], kind='stable') \
+        .drop_duplicates('machine').set_index('machine')
+    result = result.join(top.rename(columns={'count': 'issue_count'}), how='left')
+    result['issue_type'] = result['issue_type'].fillna('بدون مشکل')
+    result['issue_count'] = result['issue_count'].fillna(0).astype(int)
+
+    # قوانین (ماسک‌های برداری)
+    high_downtime = result['avg_downtime'] > rules['max_downtime_hours']
+    enough_shifts = result['shifts'] > rules['min_shifts']
+    low_efficiency = result['efficiency'] < rules['min_efficiency']
+    low_output = enough_shifts & (low_efficiency | (result['avg_value'] < rules['min_avg_value']))
+    dropping = enough_shifts & (result['zscore'] <= -rules['zscore'])
+    repeated = result['issue_count'] > rules['max_issue_repeats']
+
+    diagnostics, suggestions = [], []
+    for machine, row in result.iterrows():
+        machine = int(machine)
+        label = machine_label(machine)
+        diagnostics.append({
+            'machine': machine,
+            'avg_value': round(float(row['avg_value']), 1),
+            'avg_downtime': None if pd.isna(row['avg_downtime']) else round(float(row['avg_downtime']), 1),
+            'shifts': int(row['shifts']),
+            'efficiency': round(float(row['efficiency']), 1),
+            'baseline_mean': None if pd.isna(row['baseline_mean']) else round(float(row['baseline_mean']), 1),
+            'baseline_std': None if pd.isna(row['baseline_std']) else round(float(row['baseline_std']), 1),
+            'zscore': None if pd.isna(row['zscore']) else round(float(row['zscore']), 2),
+            'top_issue': row['issue_type'],
+            'issue_count': int(row['issue_count']),
+        })
+        if high_downtime[machine]:
+            suggestions.append(f"{label}: توقف بالا ({row['avg_downtime']:.1f} ساعت) → بررسی فنی فوری")
+        if low_output[machine] and low_efficiency[machine]:
+            suggestions.append(f"{label}: تولید پایین ({row['efficiency']:.0f}٪ استاندارد) → آموزش اپراتور یا تعمیر")
+        elif low_output[machine]:
+            suggestions.append(f"{label}: تولید پایین ({row['avg_value']:.0f} در شیفت) → آموزش اپراتور یا تعمیر")
+        if dropping[machine]:
+            suggestions.append(f"{label}: افت تولید نسبت به سابقه خود دستگاه (z={row['zscore']:.1f}) → بررسی علت")
+        if repeated[machine]:
+            suggestions.append(f"{label}: تکرار مشکل «{row['issue_type']}» → برنامه تعمیر")
+    return diagnostics, suggestions
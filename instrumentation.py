@@ -0,0 +1,211 @@
+"""اندازه‌گیری زمان پاسخ مسیرها و کوئری‌های SQL
+
+با hookهای before/after_request زمان هر درخواست و با listenerهای
+before/after_cursor_execute تعداد و زمان کوئری‌های همان درخواست ثبت می‌شود:
+
+    - هیستوگرام زمان پاسخ هر endpoint
+    - تعداد کل کوئری‌ها و زمان کل آن‌ها برای هر endpoint
+    - کندترین کوئری‌ها بر اساس «اثر انگشت» (متن نرمال‌شده بدون مقادیر)
+
+خروجی با فرمت متنی Prometheus روی /metrics است؛ با METRICS_TOKEN فقط با
+Authorization: Bearer <token> و بدون آن فقط از خود سرور (loopback، نه از پشت proxy).
+اگر METRICS_SLOW_REQUEST_MS تنظیم شود، درخواست‌های کندتر از آن با تعداد کوئری و
+کندترین کوئری در لاگ ثبت می‌شوند.
+
+شمارنده اثر انگشت‌ها هیچ‌وقت حذف نمی‌شوند (شمارنده Prometheus نباید صفر شود)؛ بعد از
+METRICS_MAX_FINGERPRINTS اثر انگشت، کوئری‌های تازه در سری statement="other" جمع می‌شوند.
+"""
+import ipaddress
+import re
+import threading
+import time
+
+from flask import Response, abort, g, has_request_context, request
+from sqlalchemy import event
+
+# سری کوئری‌هایی که بعد از پر شدن سقف اثر انگشت‌ها دیده می‌شوند
+OTHER_STATEMENTS = 'other'
+
+# مرزهای هیستوگرام (ثانیه)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_LITERALS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)'), '(?+)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def fingerprint(statement):
+    """متن کوئری بدون مقادیر ثابت و فاصله‌های اضافه (برای گروه‌بندی کوئری‌های هم‌شکل)"""
+    for pattern, replacement in _LITERALS:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()[:300]
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class EndpointStats:
+    __slots__ = ('buckets', 'count', 'duration', 'queries', 'query_time')
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.duration = 0.0
+        self.queries = 0
+        self.query_time = 0.0
+
+
+class Instrumentation:
+    """آمار درخواست‌ها و کوئری‌ها و endpoint متنی /metrics"""
+
+    def __init__(self, app=None, db=None):
+        self.endpoints = {}
+        self.statements = {}  # اثر انگشت → [تعداد، زمان کل، بیشترین زمان]
+        self.slow_request_ms = None
+        self.max_statements = 20
+        self.max_fingerprints = 500
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.config.setdefault('METRICS_TOKEN', None)  # اگر تنظیم شود: Authorization: Bearer <token>
+        app.config.setdefault('METRICS_SLOW_REQUEST_MS', None)  # None = بدون لاگ کندی
+        app.config.setdefault('METRICS_MAX_STATEMENTS', 20)  # تعداد کندترین کوئری‌ها در ntz_statement_max_seconds
+        app.config.setdefault('METRICS_MAX_FINGERPRINTS', 500)
+        app.extensions['instrumentation'] = self
+        if not app.config['METRICS_ENABLED']:
+            return
+
+        self.app = app
+        self.slow_request_ms = app.config['METRICS_SLOW_REQUEST_MS']
+        self.max_statements = app.config['METRICS_MAX_STATEMENTS']
+        self.max_fingerprints = app.config['METRICS_MAX_FINGERPRINTS']
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        with app.app_context():
+            self.watch(db.engine)
+        app.add_url_rule('/metrics', 'metrics', self._metrics_view)
+
+    def watch(self, engine):
+        """ثبت کوئری‌های یک engine (مثلاً engine فقط‌خواندنی تحلیل‌ها)"""
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _before_request(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_query_time = 0.0
+        g.metrics_slowest = (0.0, None)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['metrics_started'].pop()
+        key = fingerprint(statement)
+        with self._lock:
+            stats = self.statements.get(key)
+            if stats is None:
+                # حافظه محدود: بعد از سقف، اثر انگشت تازه جدا نگه داشته نمی‌شود
+                series = key if len(self.statements) < self.max_fingerprints else OTHER_STATEMENTS
+                stats = self.statements.setdefault(series, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] = max(stats[2], elapsed)
+        if has_request_context() and 'metrics_started' in g:
+            g.metrics_queries += 1
+            g.metrics_query_time += elapsed
+            if elapsed > g.metrics_slowest[0]:
+                g.metrics_slowest = (elapsed, key)
+
+    def _after_request(self, response):
+        if 'metrics_started' not in g:
+            return response
+        duration = time.perf_counter() - g.metrics_started
+        endpoint = request.endpoint or 'unmatched'
+        with self._lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = EndpointStats()
+            for i, bound in enumerate(BUCKETS):
+                if duration <= bound:
+                    stats.buckets[i] += 1
+            stats.count += 1
+            stats.duration += duration
+            stats.queries += g.metrics_queries
+            stats.query_time += g.metrics_query_time
+
+        if self.slow_request_ms is not None and duration * 1000 >= self.slow_request_ms:
+            slowest_time, slowest = g.metrics_slowest
+            self.app.logger.warning(
+                'slow request %s %s: %.1f ms, %d queries (%.1f ms), slowest %.1f ms: %s',
+                request.method, request.full_path, duration * 1000, g.metrics_queries,
+                g.metrics_query_time * 1000, slowest_time * 1000, slowest
+            )
+        return response
+
+    @staticmethod
+    def _is_local_request():
+        """درخواست مستقیم از خود سرور؛ درخواستی که proxy جلو فرستاده (X-Forwarded-For) محلی نیست"""
+        if request.headers.get('X-Forwarded-For') or request.headers.get('Forwarded'):
+            return False
+        try:
+            return ipaddress.ip_address(request.remote_addr or '').is_loopback
+        except ValueError:
+            return False
+
+    def _metrics_view(self):
+        token = self.app.config['METRICS_TOKEN']
+        if token:
+            if request.headers.get('Authorization') != f'Bearer {token}':
+                abort(401)
+        elif not self._is_local_request():
+            abort(403)
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+    def render(self):
+        """متن Prometheus از آمار فعلی"""
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+            statements = sorted(self.statements.items())
+            slowest = sorted(statements, key=lambda item: item[1][2], reverse=True)[:self.max_statements]
+            lines = [
+                '# HELP ntz_request_duration_seconds Request latency per endpoint.',
+                '# TYPE ntz_request_duration_seconds histogram',
+            ]
+            for name, stats in endpoints:
+                label = _label(name)
+                for bound, count in zip(BUCKETS, stats.buckets):
+                    lines.append(f'ntz_request_duration_seconds_bucket{{endpoint="{label}",le="{bound}"}} {count}')
+                lines.append(f'ntz_request_duration_seconds_bucket{{endpoint="{label}",le="+Inf"}} {stats.count}')
+                lines.append(f'ntz_request_duration_seconds_sum{{endpoint="{label}"}} {stats.duration:.6f}')
+                lines.append(f'ntz_request_duration_seconds_count{{endpoint="{label}"}} {stats.count}')
+
+            lines += ['# HELP ntz_request_queries_total SQL statements executed per endpoint.',
+                      '# TYPE ntz_request_queries_total counter']
+            lines += [f'ntz_request_queries_total{{endpoint="{_label(name)}"}} {stats.queries}'
+                      for name, stats in endpoints]
+            lines += ['# HELP ntz_request_query_seconds_total Time spent in SQL per endpoint.',
+                      '# TYPE ntz_request_query_seconds_total counter']
+            lines += [f'ntz_request_query_seconds_total{{endpoint="{_label(name)}"}} {stats.query_time:.6f}'
+                      for name, stats in endpoints]
+
+            lines += ['# HELP ntz_statement_max_seconds Slowest execution of each statement fingerprint.',
+                      '# TYPE ntz_statement_max_seconds gauge']
+            lines += [f'ntz_statement_max_seconds{{statement="{_label(key)}"}} {stats[2]:.6f}'
+                      for key, stats in slowest]
+            lines += ['# HELP ntz_statement_calls_total Executions of each statement fingerprint.',
+                      '# TYPE ntz_statement_calls_total counter']
+            lines += [f'ntz_statement_calls_total{{statement="{_label(key)}"}} {stats[0]}'
+                      for key, stats in statements]
+            lines += ['# HELP ntz_statement_seconds_total Time spent in each statement fingerprint.',
+                      '# TYPE ntz_statement_seconds_total counter']
+            lines += [f'ntz_statement_seconds_total{{statement="{_label(key)}"}} {stats[1]:.6f}'
+                      for key, stats in statements]
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,117 @@
+"""جدول تبدیل تاریخ میلادی ↔ شمسی برای نمایش و گروه‌بندی تحلیل‌ها
+
+به جای ساختن یک شیء jdate برای هر سطر، سال/ماه/روز شمسی همه روزهای بازه داده یک
+بار در آرایه‌های NumPy محاسبه می‌شود و بعد هر تبدیل فقط یک اندیس‌گذاری است. جدول
+با اولین تبدیل ساخته می‌شود (نه هنگام import، تا شروع worker و دستورهای flask کند نشود)
+و در صورت نیاز (تاریخ خارج از بازه) به اندازه سال‌های کامل بزرگ می‌شود.
+
+    jalali_calendar.label(date)                  → '1404/07/25'
+    jalali_calendar.convert(dates)               → آرایه‌های سال، ماه، روز
+    jalali_calendar.bucket_starts(dates, 'jmonth') → تاریخ میلادی شروع هر دوره
+"""
+import threading
+from datetime import date, timedelta
+
+from jdatetime import date as jdate, j_days_in_month
+
+GRANULARITIES = ('day', 'jweek', 'jmonth', 'jyear')
+
+_EPOCH = '1970-01-01'
+
+
+def _day_numbers(dates):
+    """روزهای بعد از 1970-01-01 برای آرایه‌ای از تاریخ‌ها (date یا datetime64)"""
+    import numpy as np  # دیرهنگام مثل ساخت جدول: import این ماژول NumPy را بارگذاری نمی‌کند
+
+    return (np.asarray(dates, dtype='datetime64[D]') - np.datetime64(_EPOCH, 'D')).astype(np.int64)
+
+
+class JalaliCalendar:
+    """آرایه‌های سال/ماه/روز/روزِ سالِ شمسی برای یک بازه پیوسته از روزهای میلادی"""
+
+    def __init__(self, first=date(2015, 1, 1), last=None):
+        self._lock = threading.Lock()
+        self._table = None  # (روز اول، سال، ماه، روز، روز سال)
+        self._initial = (first, last)
+
+    def _loaded(self):
+        """جدول؛ بار اول ساخته می‌شود"""
+        if self._table is None:
+            with self._lock:
+                if self._table is None:
+                    first, last = self._initial
+                    self._build(first, last or date.today() + timedelta(days=366))
+        return self._table
+
+    def _build(self, first, last):
+        import numpy as np
+
+        # از اول فروردین قبل تا آخر سال شمسی بعد، تا شروع سال/ماه/هفته داخل جدول باشد
+        first = jdate(jdate.fromgregorian(date=first).year - 1, 1, 1).togregorian()
+        last = jdate(jdate.fromgregorian(date=last).year + 2, 1, 1).togregorian() - timedelta(days=1)
+        count = (last - first).days + 1
+        years = np.empty(count, dtype=np.int16)
+        months = np.empty(count, dtype=np.int8)
+        days = np.empty(count, dtype=np.int8)
+
+        current = jdate.fromgregorian(date=first)
+        y, m, d = current.year, current.month, current.day
+        for i in range(count):
+            years[i], months[i], days[i] = y, m, d
+            d += 1
+            if d > j_days_in_month[m - 1] and not (m == 12 and d == 30 and jdate(y, 1, 1).isleap()):
+                y, m, d = (y + 1, 1, 1) if m == 12 else (y, m + 1, 1)
+        month_numbers = months.astype(np.int16)
+        ydays = np.where(month_numbers <= 6, (month_numbers - 1) * 31, 186 + (month_numbers - 7) * 30) + days
+        self._table = (_day_numbers([first])[0], years, months, days, ydays.astype(np.int16))
+
+    def _lookup(self, numbers):
+        start, *columns = self._loaded()
+        index = numbers - start
+        if len(index) and (index.min() < 0 or index.max() >= len(columns[0])):
+            with self._lock:
+                start, *columns = self._table
+                low = min(int(numbers.min()), int(start))
+                high = max(int(numbers.max()), int(start) + len(columns[0]) - 1)
+                self._build(date(1970, 1, 1) + timedelta(days=low), date(1970, 1, 1) + timedelta(days=high))
+            start, *columns = self._table
+            index = numbers - start
+        return index, columns
+
+    def convert(self, dates):
+        """آرایه‌های (سال، ماه، روز) شمسی برای آرایه‌ای از تاریخ‌های میلادی"""
+        index, (years, months, days, _) = self._lookup(_day_numbers(dates))
+        return years[index], months[index], days[index]
+
+    def label(self, value, format='%Y/%m/%d'):
+        """متن تاریخ شمسی یک تاریخ میلادی (قالب‌های غیر پیش‌فرض از jdate ساخته می‌شوند)"""
+        if format != '%Y/%m/%d':
+            return jdate.fromgregorian(date=value).strftime(format)
+        years, months, days = self.convert([value])
+        return f'{years[0]:04d}/{months[0]:02d}/{days[0]:02d}'
+
+    def bucket_starts(self, dates, granularity):
+        """تاریخ میلادی (datetime64[D]) شروع دوره شمسی هر تاریخ: هفته از شنبه، ماه، سال"""
+        import numpy as np
+
+        numbers = _day_numbers(dates)
+        if granularity == 'day':
+            offsets = 0
+        elif granularity == 'jweek':
+            offsets = (numbers + 5) % 7  # 1970-01-01 پنجشنبه بود؛ شنبه → 0
+        else:
+            index, (_, _, days, ydays) = self._lookup(numbers)
+            offsets = (days[index] if granularity == 'jmonth' else ydays[index]).astype(np.int64) - 1
+        return np.datetime64(_EPOCH, 'D') + (numbers - offsets).astype('timedelta64[D]')
+
+    def bucket_label(self, start, granularity):
+        """برچسب یک دوره از روی تاریخ شروع آن"""
+        years, months, days = self.convert([start])
+        if granularity == 'jyear':
+            return f'{years[0]:04d}'
+        if granularity == 'jmonth':
+            return f'{years[0]:04d}/{months[0]:02d}'
+        return f'{years[0]:04d}/{months[0]:02d}/{days[0]:02d}'
+
+
+jalali_calendar = JalaliCalendar()
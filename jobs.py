@@ -0,0 +1,300 @@
+"""اجرای کارهای سنگین (خروجی، بازسازی جدول تجمیعی، تحلیل بلندمدت) در پس‌زمینه
+
+کارها در یک ThreadPoolExecutor داخل همان پردازه اجرا می‌شوند و وضعیتشان در یک جدول
+SQLite محلی (jobs.db در پوشه instance) ثبت می‌شود؛ پس هر worker گانیکورن می‌تواند
+وضعیت، پیشرفت و نتیجه کاری را که worker دیگری اجرا می‌کند ببیند یا آن را لغو کند.
+به هیچ broker خارجی نیازی نیست.
+
+نتیجه هر کار یک فایل در JOBS_RESULT_DIR است. پوشه‌ها، jobs.db و thread ها با اولین ثبت کار
+ساخته می‌شوند (نه در شروع اپ یا دستورهای flask). کارهای تمام‌شده قدیمی‌تر از
+JOBS_RESULT_TTL همراه با فایل نتیجه‌شان حذف می‌شوند. کلید کش هر کار از نوع، پارامترها،
+تاریخ امروز و نسخه ذخیره‌شده داده بخش‌های مرتبط (تابع versions، مثل ETag ها) ساخته می‌شود؛
+درخواست دوباره با همان پارامترها تا وقتی داده آن بخش تغییر نکرده و روز عوض نشده، همان فایل
+قبلی را برمی‌گرداند. نسخه‌ها در دیتابیس‌اند، پس بعد از ری‌استارت، در worker های دیگر و بعد
+از تغییرهای دستورهای flask هم معتبرند.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+STATUSES = ('queued', 'running', 'done', 'failed', 'cancelled')
+
+
+class JobCancelled(Exception):
+    """کار به درخواست کاربر لغو شد"""
+
+
+class JobContext:
+    """دسترسی تابع کار به پارامترها، فایل نتیجه، گزارش پیشرفت و بررسی لغو"""
+
+    def __init__(self, runner, job_id, params):
+        self.runner = runner
+        self.id = job_id
+        self.params = params
+        self._reported_at = 0.0
+
+    def result_path(self, extension):
+        return os.path.join(self.runner.result_dir, f'{self.id}{extension}')
+
+    def progress(self, fraction, message=None):
+        """ثبت پیشرفت (حداکثر دو بار در ثانیه) و بررسی لغو"""
+        self.check_cancelled()
+        now = time.monotonic()
+        if now - self._reported_at >= 0.5 or fraction >= 1:
+            self._reported_at = now
+            self.runner._update(self.id, progress=round(min(max(fraction, 0), 1), 4), message=message)
+
+    def check_cancelled(self):
+        if self.runner._row(self.id)['cancel_requested']:
+            raise JobCancelled()
+
+
+class JobRunner:
+    """صف کارهای پس‌زمینه با جدول وضعیت SQLite و فایل‌های نتیجه روی دیسک"""
+
+    def __init__(self, app=None, versions=None):
+        self.kinds = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._prepared = False
+        self._purged_at = 0.0
+        self.executor = None
+        if app is not None:
+            self.init_app(app, versions)
+
+    def init_app(self, app, versions=None):
+        """versions(tags) → {برچسب: نسخه}؛ برچسب بدون نسخه یعنی هنوز تغییری نکرده (بدون آن کاری دوباره استفاده نمی‌شود)"""
+        app.config.setdefault('JOBS_PATH', 'jobs.db')
+        app.config.setdefault('JOBS_RESULT_DIR', 'job_results')
+        app.config.setdefault('JOBS_WORKERS', 2)
+        app.config.setdefault('JOBS_RESULT_TTL', 7 * 24 * 3600)  # ثانیه
+        app.config.setdefault('JOBS_PURGE_INTERVAL', 600)  # ثانیه بین دو پاک‌سازی
+
+        self.app = app
+        self.versions = versions
+        # اپ دیگری در همین پردازه (مثلاً در تست‌ها) jobs.db و thread های خودش را دارد
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+        self._local = threading.local()
+        self._prepared = False
+        self._purged_at = 0.0
+        self.executor = None
+        self.path = self._instance_path(app, app.config['JOBS_PATH'])
+        self.result_dir = self._instance_path(app, app.config['JOBS_RESULT_DIR'])
+        app.extensions['jobs'] = self
+
+    @staticmethod
+    def _instance_path(app, path):
+        return path if os.path.isabs(path) else os.path.join(app.instance_path, path)
+
+    def _connect(self, create=False):
+        """اتصال این thread به jobs.db؛ None اگر فایل هنوز ساخته نشده و create=False باشد"""
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            if not create and not os.path.exists(self.path):
+                return None
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            con = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            con.row_factory = sqlite3.Row
+            con.execute('PRAGMA journal_mode=WAL')
+            con.execute('PRAGMA synchronous=NORMAL')
+            self._local.con = con
+            with self._lock:
+                if not self._prepared:
+                    self._prepare(con)
+                    self._prepared = True
+        return con
+
+    def _prepare(self, con):
+        """جدول وضعیت و (یک بار در هر پردازه) علامت زدن کارهای یتیم"""
+        con.execute('CREATE TABLE IF NOT EXISTS job ('
+                    'id TEXT PRIMARY KEY, kind TEXT, params TEXT, cache_key TEXT, status TEXT, '
+                    'progress REAL DEFAULT 0, message TEXT, error TEXT, result_path TEXT, '
+                    'result_name TEXT, mimetype TEXT, cancel_requested INTEGER DEFAULT 0, pid INTEGER, '
+                    'created_by INTEGER, created_at REAL, finished_at REAL)')
+        con.execute('CREATE INDEX IF NOT EXISTS ix_job_cache_key ON job (cache_key, status)')
+        self._fail_orphans(con)
+
+    def _start(self):
+        """پوشه نتیجه، jobs.db و thread های اجرا؛ با اولین ثبت کار در هر پردازه"""
+        con = self._connect(create=True)
+        if self.executor is None:
+            with self._lock:
+                if self.executor is None:
+                    os.makedirs(self.result_dir, exist_ok=True)
+                    self.executor = ThreadPoolExecutor(max_workers=self.app.config['JOBS_WORKERS'],
+                                                       thread_name_prefix='job')
+        return con
+
+    def _row(self, job_id):
+        return self._connect().execute('SELECT * FROM job WHERE id = ?', (job_id,)).fetchone()
+
+    def _update(self, job_id, **fields):
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        self._connect().execute(f'UPDATE job SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+
+    def _fail_orphans(self, con):
+        """کارهای در حال اجرای پردازه‌هایی که دیگر وجود ندارند (مثلاً بعد از ری‌استارت)"""
+        rows = con.execute("SELECT id, pid FROM job WHERE status IN ('queued', 'running')").fetchall()
+        for row in rows:
+            try:
+                os.kill(row['pid'], 0)
+            except (OSError, TypeError):
+                con.execute("UPDATE job SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                            ('پردازه اجراکننده متوقف شد', time.time(), row['id']))
+
+    def purge(self, max_age=None):
+        """حذف کارهای تمام‌شده قدیمی‌تر از max_age ثانیه (پیش‌فرض JOBS_RESULT_TTL) و فایل‌هایشان
+
+        فایل‌های پوشه نتیجه که سطری ندارند (مثلاً از پردازه‌ای که وسط نوشتن متوقف شد) هم با
+        همین سن حذف می‌شوند. تعداد کارهای حذف‌شده را برمی‌گرداند.
+        """
+        con = self._connect()
+        if con is None:
+            return 0
+        cutoff = time.time() - (self.app.config['JOBS_RESULT_TTL'] if max_age is None else max_age)
+        rows = con.execute("SELECT id, result_path FROM job WHERE status NOT IN ('queued', 'running') "
+                           'AND finished_at < ?', (cutoff,)).fetchall()
+        for row in rows:
+            self._discard_results(row['id'])
+        con.executemany('DELETE FROM job WHERE id = ?', [(row['id'],) for row in rows])
+        if os.path.isdir(self.result_dir):
+            known = {row['id'] for row in con.execute('SELECT id FROM job')}
+            for name in os.listdir(self.result_dir):
+                path = os.path.join(self.result_dir, name)
+                if name[:32] not in known and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+        return len(rows)
+
+    def register(self, kind, tags=None, validate=None):
+        """دکوریتور ثبت نوع کار؛ tags(params) بخش‌هایی است که نتیجه به داده آن‌ها وابسته است
+
+        فقط کارهای دارای tags (نتیجه‌ای که از داده خوانده می‌شود) دوباره استفاده می‌شوند؛ کارهای
+        بدون tags (مثل بازسازی) عمل‌اند و هر ثبت دوباره اجرا می‌شود.
+
+        تابع کار JobContext می‌گیرد و (مسیر فایل نتیجه، نام دانلود، mimetype) برمی‌گرداند.
+        validate(params) در زمان ثبت کار صدا زده می‌شود و برای پارامتر نامعتبر ValueError می‌دهد.
+        """
+        def decorator(func):
+            self.kinds[kind] = (func, tags, validate)
+            return func
+        return decorator
+
+    def _cache_key(self, kind, params, tags):
+        if tags is None or self.versions is None:
+            return None  # بدون نسخه داده، معلوم نیست نتیجه قبلی هنوز معتبر است
+        names = sorted(set(tags(params)))
+        versions = self.versions(names)
+        # تاریخ امروز: بازه‌های نسبی (period=7d، today) هر روز نتیجه دیگری دارند
+        state = [date.today().isoformat(), *(f'{name}:{versions.get(name)}' for name in names)]
+        raw = json.dumps([kind, params, state], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def submit(self, kind, params, user_id=None):
+        """ثبت کار؛ (کار، آیا تازه ساخته شد). کار هم‌کلید تمام‌شده یا در جریان همین کاربر دوباره استفاده می‌شود"""
+        if kind not in self.kinds:
+            raise ValueError(f'نوع کار نامعتبر: {kind}')
+        func, tags, validate = self.kinds[kind]
+        if validate is not None:
+            validate(params)
+
+        con = self._start()
+        now = time.monotonic()
+        if now - self._purged_at >= self.app.config['JOBS_PURGE_INTERVAL']:
+            self._purged_at = now
+            self.purge()
+
+        cache_key = self._cache_key(kind, params, tags)
+        if cache_key is not None:
+            for row in con.execute(
+                    "SELECT * FROM job WHERE cache_key = ? AND created_by IS ? "
+                    "AND status IN ('queued', 'running', 'done') ORDER BY created_at DESC", (cache_key, user_id)):
+                if row['status'] != 'done' or (row['result_path'] and os.path.exists(row['result_path'])):
+                    return self.describe(row), False
+
+        job_id = uuid.uuid4().hex
+        con.execute(
+            'INSERT INTO job (id, kind, params, cache_key, status, pid, created_by, created_at) '
+            "VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)",
+            (job_id, kind, json.dumps(params, ensure_ascii=False), cache_key, os.getpid(), user_id, time.time()))
+        self.executor.submit(self._run, job_id)
+        return self.get(job_id), True
+
+    def _run(self, job_id):
+        row = self._row(job_id)
+        func = self.kinds[row['kind']][0]
+        context = JobContext(self, job_id, json.loads(row['params']))
+        try:
+            context.check_cancelled()
+            self._update(job_id, status='running')
+            with self.app.app_context():
+                result_path, result_name, mimetype = func(context)
+            self._update(job_id, status='done', progress=1, result_path=result_path, result_name=result_name,
+                         mimetype=mimetype, finished_at=time.time())
+        except JobCancelled:
+            self._discard_results(job_id)
+            self._update(job_id, status='cancelled', finished_at=time.time())
+        except Exception as e:
+            self._discard_results(job_id)
+            self.app.logger.exception('job %s (%s) failed', job_id, row['kind'])
+            self._update(job_id, status='failed', error=str(e), finished_at=time.time())
+
+    def _discard_results(self, job_id):
+        if not os.path.isdir(self.result_dir):
+            return
+        for name in os.listdir(self.result_dir):
+            if name.startswith(job_id):
+                os.remove(os.path.join(self.result_dir, name))
+
+    def cancel(self, job_id):
+        """درخواست لغو؛ کار در صف اجرا نمی‌شود و کار در حال اجرا در اولین گزارش پیشرفت متوقف می‌شود"""
+        con = self._connect()
+        if con is None:
+            return None
+        con.execute(
+            "UPDATE job SET cancel_requested = 1 WHERE id = ? AND status IN ('queued', 'running')", (job_id,))
+        return self.get(job_id)
+
+    def get(self, job_id):
+        row = self._row(job_id) if self._connect() is not None else None
+        return self.describe(row) if row else None
+
+    def recent(self, limit=50, user_id=None):
+        con = self._connect()
+        if con is None:
+            return []
+        if user_id is None:
+            rows = con.execute('SELECT * FROM job ORDER BY created_at DESC LIMIT ?', (limit,))
+        else:
+            rows = con.execute(
+                'SELECT * FROM job WHERE created_by = ? ORDER BY created_at DESC LIMIT ?', (user_id, limit))
+        return [self.describe(row) for row in rows]
+
+    def result(self, job_id):
+        """(مسیر، نام دانلود، mimetype) نتیجه یک کار تمام‌شده، یا None"""
+        row = self._row(job_id) if self._connect() is not None else None
+        if row is None or row['status'] != 'done' or not os.path.exists(row['result_path'] or ''):
+            return None
+        return row['result_path'], row['result_name'], row['mimetype']
+
+    @staticmethod
+    def describe(row):
+        return {
+            'id': row['id'],
+            'kind': row['kind'],
+            'params': json.loads(row['params']),
+            'status': row['status'],
+            'progress': row['progress'],
+            'message': row['message'],
+            'error': row['error'],
+            'cancel_requested': bool(row['cancel_requested']),
+            'created_by': row['created_by'],
+            'created_at': row['created_at'],
+            'finished_at': row['finished_at'],
+        }
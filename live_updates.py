@@ -0,0 +1,213 @@
+"""ارسال زنده تغییرات داشبورد با Server-Sent Events
+
+بعد از هر ثبت/ویرایش/حذف گزارش یک رویداد «delta» منتشر می‌شود که سطرهای جدول
+تجمیعی همان روز را دارد (تعداد کمی سطر: شیفت × دستگاه × اپراتور). هر مشترک فقط
+رویدادهای بخش، شیفت و دستگاه خودش را می‌گیرد و جمع روز، میانگین شیفت‌ها و جمع روز
+اپراتورهای تغییرکرده برای فیلتر او محاسبه می‌شود؛ پس صفحه‌های سالن بدون نظرسنجی
+/api/dashboard-data به‌روز می‌مانند. رویداد «reload» (مثلاً بعد از ورود گروهی) یعنی
+کل داده دوباره خوانده شود.
+
+دو backend وجود دارد:
+    memory  — صف داخل همان پردازه (فقط مشترکین همان worker)
+    sqlite  — جدول رویداد در یک فایل SQLite مشترک که همه workerها آن را دنبال می‌کنند
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+
+class MemoryBroker:
+    """انتشار رویداد به صف مشترکین همین پردازه"""
+    name = 'memory'
+
+    def __init__(self, max_queue=256):
+        self.max_queue = max_queue
+        self._subscribers = set()
+        self._last_id = 0
+        self._lock = threading.Lock()
+
+    def publish(self, event):
+        with self._lock:
+            self._last_id += 1
+            event = dict(event, id=self._last_id)
+            for subscriber in list(self._subscribers):
+                try:
+                    subscriber.put_nowait(event)
+                except queue.Full:
+                    # مشترک کند: به جای رویدادهای جاافتاده یک reload می‌گیرد
+                    with subscriber.mutex:
+                        subscriber.queue.clear()
+                    subscriber.put_nowait({'id': event['id'], 'type': 'reload', 'section': event['section']})
+
+    def subscribe(self, last_id=None):
+        subscriber = _QueueSubscription(self, self.max_queue)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+
+class _QueueSubscription(queue.Queue):
+    def __init__(self, broker, maxsize):
+        super().__init__(maxsize)
+        self.broker = broker
+
+    def next(self, timeout):
+        try:
+            return [self.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class SQLiteBroker:
+    """رویدادها در جدول live_event؛ مشترکین با شناسه آخرین رویداد، سطرهای جدید را می‌خوانند"""
+    name = 'sqlite'
+
+    def __init__(self, path, retention=1000, poll_interval=1.0):
+        self.path = path
+        self.retention = retention
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._connect().execute('CREATE TABLE IF NOT EXISTS live_event (id INTEGER PRIMARY KEY, payload TEXT)')
+
+    def _connect(self):
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            con.execute('PRAGMA journal_mode=WAL')
+            con.execute('PRAGMA synchronous=NORMAL')
+            self._local.con = con
+        return con
+
+    def publish(self, event):
+        con = self._connect()
+        con.execute('INSERT INTO live_event (payload) VALUES (?)', (json.dumps(event, ensure_ascii=False),))
+        con.execute('DELETE FROM live_event WHERE id <= (SELECT MAX(id) FROM live_event) - ?', (self.retention,))
+
+    def subscribe(self, last_id=None):
+        if last_id is None:
+            last_id = self._connect().execute('SELECT COALESCE(MAX(id), 0) FROM live_event').fetchone()[0]
+        return _PollingSubscription(self, last_id)
+
+
+class _PollingSubscription:
+    def __init__(self, broker, last_id):
+        self.broker = broker
+        self.last_id = last_id
+
+    def next(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            rows = self.broker._connect().execute(
+                'SELECT id, payload FROM live_event WHERE id > ? ORDER BY id LIMIT 100', (self.last_id,)
+            ).fetchall()
+            if rows or time.monotonic() >= deadline:
+                break
+            time.sleep(self.broker.poll_interval)
+        events = []
+        for event_id, payload in rows:
+            self.last_id = event_id
+            events.append(dict(json.loads(payload), id=event_id))
+        return events
+
+    def close(self):
+        pass
+
+
+def project(event, section, shift=None, machine=None):
+    """رویداد از دید یک مشترک (بخش/شیفت/دستگاه)؛ None اگر به او مربوط نباشد"""
+    if event['section'] != section:
+        return None
+    if event['type'] != 'delta':
+        return event
+
+    def matches(item_shift, item_machine):
+        return (not shift or item_shift == shift) and (machine is None or item_machine == machine)
+
+    changed = [c for c in event['changed'] if matches(c[0], c[1])]
+    if not changed:
+        return None
+    rows = [r for r in event['rows'] if matches(r[0], r[1])]
+
+    shifts = {}
+    for row_shift, _, _, value_sum, value_count in rows:
+        bucket = shifts.setdefault(row_shift, [0, 0])
+        bucket[0] += value_sum
+        bucket[1] += value_count
+    changed_operators = {c[2] for c in changed}
+    operators = dict.fromkeys(sorted(changed_operators), 0)
+    for _, _, operator, value_sum, _ in rows:
+        if operator in changed_operators:
+            operators[operator] += value_sum
+
+    return {
+        'id': event['id'],
+        'type': 'delta',
+        'section': section,
+        'date': event['date'],
+        'total': sum(r[3] for r in rows),
+        'shift_data': [{'shift': name, 'total': total, 'avg': total / count if count else 0}
+                       for name, (total, count) in sorted(shifts.items())],
+        'operators': [{'operator': name, 'total': total} for name, total in operators.items()],
+    }
+
+
+class LiveUpdates:
+    """انتشار تغییرات گزارش‌ها و جریان SSE برای مشترکین"""
+
+    def __init__(self, app=None):
+        self.broker = None
+        self.keepalive = 15
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('LIVE_UPDATES_BACKEND', 'memory')  # memory | sqlite | none
+        app.config.setdefault('LIVE_UPDATES_PATH', 'live_updates.db')
+        app.config.setdefault('LIVE_UPDATES_KEEPALIVE', 15)  # ثانیه
+
+        kind = app.config['LIVE_UPDATES_BACKEND']
+        if kind == 'sqlite':
+            path = app.config['LIVE_UPDATES_PATH']
+            if not os.path.isabs(path):
+                os.makedirs(app.instance_path, exist_ok=True)
+                path = os.path.join(app.instance_path, path)
+            self.broker = SQLiteBroker(path)
+        elif kind == 'memory':
+            self.broker = MemoryBroker()
+        else:
+            self.broker = None
+        self.keepalive = app.config['LIVE_UPDATES_KEEPALIVE']
+        app.extensions['live_updates'] = self
+
+    def publish(self, event):
+        """انتشار یک رویداد (بعد از commit صدا زده شود)"""
+        if self.broker is not None:
+            self.broker.publish(event)
+
+    def stream(self, section, shift=None, machine=None, last_id=None):
+        """تولیدکننده متن SSE برای یک مشترک؛ هر keepalive ثانیه یک کامنت برای زنده نگه داشتن اتصال"""
+        subscription = self.broker.subscribe(last_id)
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                events = subscription.next(self.keepalive)
+                if not events:
+                    yield ': keepalive\n\n'
+                    continue
+                for event in events:
+                    message = project(event, section, shift, machine)
+                    if message is not None:
+                        data = json.dumps(message, ensure_ascii=False)
+                        yield f"id: {event['id']}\nevent: {message['type']}\ndata: {data}\n\n"
+        finally:
+            subscription.close()
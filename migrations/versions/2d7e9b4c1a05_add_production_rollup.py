@@ -0,0 +1,64 @@
+"""add production_rollup table and backfill it from the report tables
+
+Revision ID: 2d7e9b4c1a05
+Revises:
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2d7e9b4c1a05'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# بخش → (جدول گزارش، ستون مقدار، ستون دستگاه یا None برای بخش‌های بدون دستگاه)
+SECTIONS = {
+    'circular': ('circular_report', 'footage', 'machine_number'),
+    'extruder': ('extruder_report', 'material_weight', None),
+    'sewing': ('sewing_report', 'bags_produced', None),
+}
+
+
+def upgrade():
+    bind = op.get_bind()
+    # دیتابیس‌هایی که جدول را با create_all یا flask rebuild-rollups ساخته‌اند دست نمی‌خورند
+    if sa.inspect(bind).has_table('production_rollup'):
+        return
+    op.create_table(
+        'production_rollup',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('section', sa.String(length=50), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('shift', sa.String(length=20), nullable=False),
+        sa.Column('machine_number', sa.Integer(), nullable=False),
+        sa.Column('operator_name', sa.String(length=100), nullable=False),
+        sa.Column('value_sum', sa.Float(), nullable=False),
+        sa.Column('value_count', sa.Integer(), nullable=False),
+        sa.Column('report_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('section', 'date', 'shift', 'machine_number', 'operator_name',
+                            name='uq_production_rollup_key'),
+    )
+
+    # همان تجمیع flask rebuild-rollups
+    for section, (table, value, machine) in SECTIONS.items():
+        machine = f'coalesce({machine}, 0)' if machine else '0'
+        # ثابت در GROUP BY شماره ستون خوانده می‌شود
+        group = f'date, shift, {machine}, operator_name' if machine != '0' else 'date, shift, operator_name'
+        bind.exec_driver_sql(
+            'INSERT INTO production_rollup '
+            '(section, date, shift, machine_number, operator_name, value_sum, value_count, report_count) '
+            f"SELECT '{section}', date, shift, {machine}, operator_name, "
+            f'coalesce(sum({value}), 0), count({value}), count(id) '
+            f'FROM {table} WHERE operator_name IS NOT NULL '
+            f'GROUP BY {group}'
+        )
+
+
+def downgrade():
+    op.drop_table('production_rollup')
@@ -0,0 +1,46 @@
+"""add composite indexes to report tables
+
+Revision ID: 3f1c2a9d7b10
+Revises: 2d7e9b4c1a05
+Create Date: 2026-10-17 16:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7b10'
+down_revision = '2d7e9b4c1a05'
+branch_labels = None
+depends_on = None
+
+
+# (نام ایندکس، جدول، ستون‌ها) — باید با __table_args__ مدل‌ها یکی باشد
+INDEXES = [
+    ('ix_circular_report_date_shift', 'circular_report', ['date', 'shift']),
+    ('ix_circular_report_machine_date', 'circular_report', ['machine_number', 'date']),
+    ('ix_circular_report_operator_date', 'circular_report', ['operator_name', 'date']),
+    ('ix_circular_report_created_at', 'circular_report', ['created_at']),
+    ('ix_extruder_report_date_shift', 'extruder_report', ['date', 'shift']),
+    ('ix_extruder_report_operator_date', 'extruder_report', ['operator_name', 'date']),
+    ('ix_extruder_report_created_at', 'extruder_report', ['created_at']),
+    ('ix_sewing_report_date_shift', 'sewing_report', ['date', 'shift']),
+    ('ix_sewing_report_operator_date', 'sewing_report', ['operator_name', 'date']),
+    ('ix_sewing_report_date_created_at', 'sewing_report', ['date', 'created_at']),
+    ('ix_sewing_report_created_at', 'sewing_report', ['created_at']),
+    ('ix_machine_issue_section_date', 'machine_issue', ['section', 'date']),
+    ('ix_machine_issue_section_machine_date', 'machine_issue', ['section', 'machine_number', 'date']),
+]
+
+
+def upgrade():
+    # دیتابیس‌هایی که با init_db ساخته شده‌اند ممکن است ایندکس‌ها را از قبل داشته باشند
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False, if_not_exists=True)
+    op.execute('ANALYZE')
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
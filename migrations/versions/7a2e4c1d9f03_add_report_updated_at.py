@@ -0,0 +1,35 @@
+"""add updated_at to report tables for incremental parquet snapshots
+
+Revision ID: 7a2e4c1d9f03
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a2e4c1d9f03'
+down_revision = '3f1c2a9d7b10'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ['circular_report', 'extruder_report', 'sewing_report']
+
+
+def upgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        # سطرهای قبلی از زمان ثبت شروع می‌کنند
+        op.execute(f'UPDATE {table} SET updated_at = created_at WHERE updated_at IS NULL')
+        op.create_index(f'ix_{table}_date_updated_at', table, ['date', 'updated_at'], unique=False)
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        op.drop_index(f'ix_{table}_date_updated_at', table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('updated_at')
@@ -0,0 +1,31 @@
+"""add fts5 search index over reports and machine issues
+
+Revision ID: b5d8e2f4a611
+Revises: 7a2e4c1d9f03
+Create Date: 2026-10-17 18:30:00.000000
+
+"""
+from alembic import op
+from flask import current_app
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d8e2f4a611'
+down_revision = '7a2e4c1d9f03'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ['circular_report', 'extruder_report', 'sewing_report', 'machine_issue']
+
+
+def upgrade():
+    # جدول FTS5 و triggerها از همان تعریف search_index در app ساخته و با داده فعلی پر می‌شوند
+    current_app.extensions['search'].rebuild(op.get_bind())
+
+
+def downgrade():
+    for table in TABLES:
+        for suffix in ('ai', 'ad', 'au'):
+            op.execute(f'DROP TRIGGER IF EXISTS search_{table}_{suffix}')
+    op.execute('DROP TABLE IF EXISTS search_index')
@@ -0,0 +1,167 @@
+"""add operator dimension with integer keys on reports and production rollup
+
+Revision ID: c3f9a1e7d204
+Revises: b5d8e2f4a611
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+from flask import current_app
+
+from search import normalize
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f9a1e7d204'
+down_revision = 'b5d8e2f4a611'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ['circular_report', 'extruder_report', 'sewing_report']
+ROLLUP_KEY = ['section', 'date', 'shift', 'machine_number']
+
+
+def _archive_schemas(bind):
+    """ضمیمه کردن همه فایل‌های بایگانی (قبل از هر نوشتنی؛ SQLite داخل تراکنش ATTACH نمی‌کند)"""
+    archive = current_app.extensions['archive']
+    archive.attach(bind, archive.years())
+    return [archive.schema(year) for year in archive.years()]
+
+
+def _display_name(counter):
+    """پرتکرارترین املا؛ در تساوی املایی که خودش یکسان‌سازی‌شده است (ی و ک فارسی، بدون فاصله اضافه)"""
+    return max(counter, key=lambda name: (counter[name], normalize(name) == name.lower()))
+
+
+def _has_table(bind, table, schema=None):
+    return sa.inspect(bind).has_table(table, schema=schema)
+
+
+def upgrade():
+    bind = op.get_bind()
+    schemas = _archive_schemas(bind)
+    op.create_table(
+        'operator',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('normalized_name', sa.String(length=100), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('normalized_name'),
+    )
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('operator_id', sa.Integer(), nullable=True))
+            batch_op.create_foreign_key(f'fk_{table}_operator_id_operator', 'operator', ['operator_id'], ['id'])
+
+    # جدول‌های بایگانی هم‌شکل مدل‌اند؛ ستون (بدون کلید خارجی) به آن‌ها هم اضافه می‌شود
+    sources = [(None, table) for table in TABLES]
+    for schema in schemas:
+        for table in TABLES:
+            if not _has_table(bind, table, schema):
+                continue
+            # بعد از downgrade ستون در بایگانی مانده است
+            if 'operator_id' not in {c['name'] for c in sa.inspect(bind).get_columns(table, schema=schema)}:
+                bind.exec_driver_sql(f'ALTER TABLE "{schema}".{table} ADD COLUMN operator_id INTEGER')
+            sources.append((schema, table))
+
+    # املاهای یک نفر با normalize یکی می‌شوند
+    spellings = defaultdict(Counter)
+    for schema, table in sources:
+        prefix = f'"{schema}".' if schema else ''
+        for name, count in bind.exec_driver_sql(
+                f'SELECT operator_name, count(*) FROM {prefix}{table} GROUP BY operator_name'):
+            if normalize(name):
+                spellings[normalize(name)][name] += count
+    now = datetime.utcnow()
+    operator = sa.table('operator', sa.column('id', sa.Integer), sa.column('name', sa.String),
+                        sa.column('normalized_name', sa.String), sa.column('created_at', sa.DateTime))
+    if spellings:
+        bind.execute(operator.insert(), [
+            {'name': _display_name(counter), 'normalized_name': key, 'created_at': now}
+            for key, counter in sorted(spellings.items())
+        ])
+    ids = dict(bind.execute(sa.select(operator.c.normalized_name, operator.c.id)).all())
+    names = [{'name': name, 'operator': ids[key]} for key, counter in spellings.items() for name in counter]
+
+    # updated_at هم جلو می‌رود تا snapshot های Parquet این ماه‌ها با ستون تازه دوباره نوشته شوند
+    for schema, table in sources:
+        report = sa.table(table, sa.column('operator_name', sa.String), sa.column('operator_id', sa.Integer),
+                          sa.column('updated_at', sa.DateTime), schema=schema)
+        if names:
+            bind.execute(
+                report.update().where(report.c.operator_name == sa.bindparam('name'))
+                .values(operator_id=sa.bindparam('operator'), updated_at=now),
+                names
+            )
+        prefix = f'"{schema}".' if schema else ''
+        bind.exec_driver_sql(f'DROP INDEX IF EXISTS {prefix}ix_{table}_operator_date')
+        bind.exec_driver_sql(f'CREATE INDEX IF NOT EXISTS {prefix}ix_{table}_operator_id_date '
+                             f'ON {table} (operator_id, date)')
+
+    # جدول تجمیعی: کلید نام به شناسه تبدیل و املاهای مختلف یک نفر با هم جمع می‌شوند
+    if _has_table(bind, 'production_rollup'):
+        op.rename_table('production_rollup', '_production_rollup_old')
+        bind.exec_driver_sql('ALTER TABLE _production_rollup_old ADD COLUMN operator_id INTEGER')
+        old = sa.table('_production_rollup_old', sa.column('operator_name', sa.String),
+                       sa.column('operator_id', sa.Integer))
+        if names:
+            bind.execute(old.update().where(old.c.operator_name == sa.bindparam('name'))
+                         .values(operator_id=sa.bindparam('operator')), names)
+        _create_rollup('operator_id', sa.Integer(), sa.ForeignKey('operator.id'))
+        key = ', '.join(ROLLUP_KEY + ['operator_id'])
+        bind.exec_driver_sql(
+            f'INSERT INTO production_rollup ({key}, value_sum, value_count, report_count) '
+            f'SELECT {key}, sum(value_sum), sum(value_count), sum(report_count) FROM _production_rollup_old '
+            f'WHERE operator_id IS NOT NULL GROUP BY {key}'
+        )
+        op.drop_table('_production_rollup_old')
+
+    # بازسازی batch جدول‌ها triggerهای نمایه جستجو را حذف می‌کند؛ دوباره ساخته می‌شوند
+    current_app.extensions['search'].create(bind)
+
+
+def _create_rollup(operator_column, operator_type, *operator_args):
+    op.create_table(
+        'production_rollup',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('section', sa.String(length=50), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('shift', sa.String(length=20), nullable=False),
+        sa.Column('machine_number', sa.Integer(), nullable=False),
+        sa.Column(operator_column, operator_type, *operator_args, nullable=False),
+        sa.Column('value_sum', sa.Float(), nullable=False),
+        sa.Column('value_count', sa.Integer(), nullable=False),
+        sa.Column('report_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint(*ROLLUP_KEY, operator_column, name='uq_production_rollup_key'),
+    )
+
+
+def downgrade():
+    bind = op.get_bind()
+    if _has_table(bind, 'production_rollup'):
+        op.rename_table('production_rollup', '_production_rollup_old')
+        _create_rollup('operator_name', sa.String(length=100))
+        key = ', '.join(ROLLUP_KEY)
+        bind.exec_driver_sql(
+            f'INSERT INTO production_rollup ({key}, operator_name, value_sum, value_count, report_count) '
+            f'SELECT {key}, operator.name, value_sum, value_count, report_count FROM _production_rollup_old '
+            f'JOIN operator ON operator.id = _production_rollup_old.operator_id'
+        )
+        op.drop_table('_production_rollup_old')
+
+    # ستون operator_id جدول‌های بایگانی می‌ماند؛ جدول بایگانی از ستون‌های مدل خوانده می‌شود
+    for table in reversed(TABLES):
+        op.drop_index(f'ix_{table}_operator_id_date', table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_constraint(f'fk_{table}_operator_id_operator', type_='foreignkey')
+            batch_op.drop_column('operator_id')
+        op.create_index(f'ix_{table}_operator_date', table, ['operator_name', 'date'], unique=False)
+    op.drop_table('operator')
+    current_app.extensions['search'].create(bind)
@@ -0,0 +1,75 @@
+"""add roll lineage: roll barcode on circular reports and roll_lineage table
+
+Revision ID: e1a7c5b9d382
+Revises: c3f9a1e7d204
+Create Date: 2026-10-17 19:30:00.000000
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+from flask import current_app
+
+from search import normalize
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1a7c5b9d382'
+down_revision = 'c3f9a1e7d204'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    # ستون و ایندکس تازه به فایل‌های بایگانی هم اضافه می‌شود (قبل از هر نوشتنی؛ ATTACH بیرون از تراکنش)
+    current_app.extensions['archive'].upgrade_schema(bind)
+
+    with op.batch_alter_table('circular_report') as batch_op:
+        batch_op.add_column(sa.Column('roll_barcode', sa.String(length=100), nullable=True))
+    op.create_index('ix_sewing_report_roll_barcode', 'sewing_report', ['roll_barcode'], unique=False)
+    op.create_table(
+        'roll_lineage',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('roll_barcode', sa.String(length=100), nullable=False),
+        sa.Column('circular_report_id', sa.Integer(), nullable=False),
+        sa.Column('extruder_report_id', sa.Integer(), nullable=True),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.ForeignKeyConstraint(['circular_report_id'], ['circular_report.id']),
+        sa.ForeignKeyConstraint(['extruder_report_id'], ['extruder_report.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('roll_barcode'),
+    )
+    op.create_index('ix_roll_lineage_date', 'roll_lineage',
+                    ['date', 'circular_report_id', 'roll_barcode', 'extruder_report_id'], unique=False)
+    op.create_index('ix_roll_lineage_circular_report_id', 'roll_lineage', ['circular_report_id'], unique=False)
+    op.create_index('ix_roll_lineage_extruder_report_id', 'roll_lineage', ['extruder_report_id'], unique=False)
+
+    # بارکدهای دوخت قبلی به همان شکلی درمی‌آیند که app.roll_code برای گزارش‌های تازه می‌سازد
+    sewing = sa.table('sewing_report', sa.column('id', sa.Integer), sa.column('roll_barcode', sa.String),
+                      sa.column('updated_at', sa.DateTime))
+    now = datetime.utcnow()
+    changed = [
+        {'report': report_id, 'code': normalize(barcode).replace(' ', '').upper() or None}
+        for report_id, barcode in bind.execute(
+            sa.select(sewing.c.id, sewing.c.roll_barcode).where(sewing.c.roll_barcode.isnot(None)))
+        if barcode != (normalize(barcode).replace(' ', '').upper() or None)
+    ]
+    if changed:
+        bind.execute(sewing.update().where(sewing.c.id == sa.bindparam('report'))
+                     .values(roll_barcode=sa.bindparam('code'), updated_at=now), changed)
+
+    current_app.extensions['search'].create(bind)
+
+
+def downgrade():
+    op.drop_index('ix_roll_lineage_extruder_report_id', table_name='roll_lineage')
+    op.drop_index('ix_roll_lineage_circular_report_id', table_name='roll_lineage')
+    op.drop_index('ix_roll_lineage_date', table_name='roll_lineage')
+    op.drop_table('roll_lineage')
+    op.drop_index('ix_sewing_report_roll_barcode', table_name='sewing_report')
+    with op.batch_alter_table('circular_report') as batch_op:
+        batch_op.drop_column('roll_barcode')
+    # بازسازی batch جدول triggerهای نمایه جستجو را حذف می‌کند
+    current_app.extensions['search'].create(op.get_bind())
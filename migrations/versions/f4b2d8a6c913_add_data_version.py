@@ -0,0 +1,31 @@
+"""add data_version table for conditional GET on analytics endpoints
+
+Revision ID: f4b2d8a6c913
+Revises: e1a7c5b9d382
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4b2d8a6c913'
+down_revision = 'e1a7c5b9d382'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # برچسب بدون سطر نسخه 0 دارد؛ اولین نوشتن هر بخش سطر آن را می‌سازد
+    op.create_table(
+        'data_version',
+        sa.Column('tag', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('tag'),
+    )
+
+
+def downgrade():
+    op.drop_table('data_version')
@@ -0,0 +1,36 @@
+"""کش داخل پردازه برای جدول‌های کوچک و کم‌تغییر (کاربران، دستگاه‌ها)
+
+هر کلید یک بار با loader خوانده می‌شود و تا ابطال صریح یا پایان TTL از حافظه برمی‌گردد.
+ابطال صریح بعد از commit تغییرات همین پردازه انجام می‌شود؛ TTL سقف کهنگی برای
+تغییراتی است که worker دیگری ثبت کرده است.
+"""
+import threading
+import time
+
+
+class Registry:
+    """نگاشت کلید → مقدار با loader، TTL و ابطال"""
+
+    def __init__(self, loader, ttl=300):
+        self.loader = loader
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        value = self.loader(key)
+        if value is not None:
+            with self._lock:
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+        return value
+
+    def invalidate(self, key=None):
+        """ابطال یک کلید یا (بدون کلید) همه ورودی‌ها"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
@@ -0,0 +1,209 @@
+"""کش پاسخ‌های JSON تحلیلی
+
+کلید هر ورودی از نام endpoint، پارامترهای نرمال‌شده کوئری و «نسل» بخش‌های مرتبط
+ساخته می‌شود. با هر ثبت/ویرایش/حذف گزارش، نسل آن بخش یک واحد بالا می‌رود و
+ورودی‌های قبلی دیگر خوانده نمی‌شوند (و به مرور با LRU/TTL حذف می‌شوند).
+
+دو backend وجود دارد:
+    memory  — LRU/TTL داخل همان پردازه (پیش‌فرض)
+    sqlite  — یک فایل SQLite مشترک تا چند worker گانیکورن ورودی‌ها و نسل‌ها را ببینند
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+
+from flask import Response, make_response, request
+
+
+class MemoryBackend:
+    """کش LRU با انقضای زمانی، مخصوص یک پردازه"""
+    name = 'memory'
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def generation(self, tag):
+        return self._generations.get(tag, 0)
+
+    def bump(self, tag):
+        with self._lock:
+            self._generations[tag] = self._generations.get(tag, 0) + 1
+
+    def size(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteBackend:
+    """کش مشترک بین چند پردازه روی یک فایل SQLite محلی"""
+    name = 'sqlite'
+
+    def __init__(self, path, max_entries=1024):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._connect() as con:
+            con.execute('CREATE TABLE IF NOT EXISTS cache_entry ('
+                        'key TEXT PRIMARY KEY, status INTEGER, body BLOB, expires_at REAL)')
+            con.execute('CREATE TABLE IF NOT EXISTS cache_generation (tag TEXT PRIMARY KEY, value INTEGER)')
+
+    def _connect(self):
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            con.execute('PRAGMA journal_mode=WAL')
+            con.execute('PRAGMA synchronous=NORMAL')
+            self._local.con = con
+        return con
+
+    def get(self, key):
+        row = self._connect().execute(
+            'SELECT status, body FROM cache_entry WHERE key = ? AND expires_at >= ?', (key, time.time())
+        ).fetchone()
+        return (row[0], bytes(row[1])) if row else None
+
+    def set(self, key, value, ttl):
+        con = self._connect()
+        status, body = value
+        con.execute('INSERT OR REPLACE INTO cache_entry (key, status, body, expires_at) VALUES (?, ?, ?, ?)',
+                    (key, status, body, time.time() + ttl))
+        # پاکسازی ورودی‌های منقضی و مازاد بر ظرفیت (قدیمی‌ترین انقضا اول حذف می‌شود)
+        con.execute('DELETE FROM cache_entry WHERE expires_at < ?', (time.time(),))
+        con.execute('DELETE FROM cache_entry WHERE key IN (SELECT key FROM cache_entry '
+                    'ORDER BY expires_at DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+
+    def generation(self, tag):
+        row = self._connect().execute('SELECT value FROM cache_generation WHERE tag = ?', (tag,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, tag):
+        self._connect().execute(
+            'INSERT INTO cache_generation (tag, value) VALUES (?, 1) '
+            'ON CONFLICT(tag) DO UPDATE SET value = value + 1', (tag,))
+
+    def size(self):
+        return self._connect().execute('SELECT COUNT(*) FROM cache_entry').fetchone()[0]
+
+    def clear(self):
+        self._connect().execute('DELETE FROM cache_entry')
+
+
+class ResponseCache:
+    """کش پاسخ endpointهای تحلیلی با ابطال بر اساس بخش و شمارنده hit/miss"""
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = 60
+        self.stats = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RESPONSE_CACHE_BACKEND', 'memory')  # memory | sqlite | none
+        app.config.setdefault('RESPONSE_CACHE_PATH', 'response_cache.db')
+        app.config.setdefault('RESPONSE_CACHE_TTL', 60)
+        app.config.setdefault('RESPONSE_CACHE_MAX_ENTRIES', 1024)
+
+        kind = app.config['RESPONSE_CACHE_BACKEND']
+        max_entries = app.config['RESPONSE_CACHE_MAX_ENTRIES']
+        if kind == 'sqlite':
+            path = app.config['RESPONSE_CACHE_PATH']
+            if not os.path.isabs(path):
+                os.makedirs(app.instance_path, exist_ok=True)
+                path = os.path.join(app.instance_path, path)
+            self.backend = SQLiteBackend(path, max_entries)
+        elif kind == 'memory':
+            self.backend = MemoryBackend(max_entries)
+        else:
+            self.backend = None
+        self.ttl = app.config['RESPONSE_CACHE_TTL']
+        app.extensions['response_cache'] = self
+
+    def _count(self, endpoint, field):
+        with self._lock:
+            counters = self.stats.setdefault(endpoint, {'hits': 0, 'misses': 0})
+            counters[field] += 1
+
+    def cached(self, tags):
+        """دکوریتور کش؛ tags تابعی است که پارامترهای نرمال‌شده را گرفته و لیست بخش‌ها را برمی‌گرداند"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if self.backend is None:
+                    return view(*args, **kwargs)
+
+                params = normalize_args(request.args)
+                generations = ','.join(f'{tag}:{self.backend.generation(tag)}' for tag in tags(params))
+                # تاریخ امروز در کلید است چون بازه‌های نسبی (7d، 1m) به آن وابسته‌اند
+                key = '|'.join([request.endpoint, date.today().isoformat(), generations,
+                                '&'.join(f'{k}={v}' for k, v in params)])
+
+                cached_value = self.backend.get(key)
+                if cached_value is not None:
+                    self._count(request.endpoint, 'hits')
+                    status, body = cached_value
+                    return Response(body, status=status, mimetype='application/json')
+
+                self._count(request.endpoint, 'misses')
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200 and response.is_json:
+                    self.backend.set(key, (response.status_code, response.get_data()), self.ttl)
+                return response
+            return wrapper
+        return decorator
+
+    def invalidate(self, *tags):
+        """ابطال همه ورودی‌های وابسته به این بخش‌ها (بعد از commit صدا زده شود)"""
+        if self.backend is None:
+            return
+        for tag in tags:
+            self.backend.bump(tag)
+
+    def summary(self):
+        with self._lock:
+            endpoints = {name: dict(counters) for name, counters in self.stats.items()}
+        hits = sum(c['hits'] for c in endpoints.values())
+        misses = sum(c['misses'] for c in endpoints.values())
+        return {
+            'backend': self.backend.name if self.backend else 'none',
+            'entries': self.backend.size() if self.backend else 0,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 3) if hits + misses else 0,
+            'endpoints': endpoints,
+        }
+
+
+def normalize_args(args):
+    """پارامترهای کوئری: حذف مقادیر خالی، trim و مرتب‌سازی بر اساس نام"""
+    return sorted((key, value.strip()) for key, value in args.items(multi=True) if value and value.strip())
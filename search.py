@@ -0,0 +1,185 @@
+"""جستجوی متنی نمایه‌شده (SQLite FTS5) روی گزارش‌ها و مسائل دستگاه
+
+یک جدول مجازی search_index برای همه نوع‌ها: نام اپراتور در ستون operator و بقیه متن
+(توضیحات، رنگ، بارکد، شرح خرابی) در ستون body. triggerهای INSERT/UPDATE/DELETE هر جدول
+آن را همگام نگه می‌دارند؛ پس ورود گروهی با Core و ویرایش‌ها هم بدون کد اضافه نمایه می‌شوند.
+
+متن قبل از نمایه شدن یکسان‌سازی می‌شود: ی/ک عربی به فارسی، حذف اعراب و کشیده، نیم‌فاصله
+به فاصله و ارقام فارسی/عربی به لاتین. همین کار در trigger با replace های SQL و در پایتون
+برای متن جستجو انجام می‌شود، پس هر اتصالی (حتی sqlite3 خط فرمان) می‌تواند بنویسد
+(بدون تابع SQL ثبت‌شده از پایتون).
+
+rowid هر سطر نمایه = شناسه × KIND_SLOTS + کد نوع، تا بدون ایندکس اضافه حذف شود.
+"""
+from sqlalchemy import column, func, literal_column, select, table
+
+# جایگزینی نویسه‌ها (مبدأ → مقصد) برای نمایه و متن جستجو
+CHARACTER_MAP = {
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی', 'ك': 'ک', 'ة': 'ه', 'ۀ': 'ه', 'أ': 'ا', 'إ': 'ا', 'ٱ': 'ا',
+    '\u200c': ' ', '\u0640': '',  # نیم‌فاصله و کشیده
+    **{chr(code): '' for code in range(0x064B, 0x0653)},  # اعراب
+    **{fa: str(i) for i, fa in enumerate('۰۱۲۳۴۵۶۷۸۹')},
+    **{ar: str(i) for i, ar in enumerate('٠١٢٣٤٥٦٧٨٩')},
+}
+_TRANSLATION = str.maketrans(CHARACTER_MAP)
+
+KIND_SLOTS = 4
+TOKENIZER = 'unicode61 remove_diacritics 2'
+
+search_table = table(
+    'search_index',
+    column('rowid'), column('operator'), column('body'), column('name'),
+    column('kind'), column('section'), column('ref_id'), column('date'), column('machine_number'),
+)
+
+
+def normalize(value):
+    """یکسان‌سازی متن فارسی/عربی (همان کاری که trigger ها در SQL می‌کنند)"""
+    return ' '.join(str(value).translate(_TRANSLATION).lower().split()) if value else ''
+
+
+# هر زیرکوئری حداکثر این تعداد replace تو در تو دارد (زنجیر بلندتر از پشته parser در SQLite بیشتر می‌شود)
+_CHUNK = 20
+_CHUNKS = [list(CHARACTER_MAP.items())[i:i + _CHUNK] for i in range(0, len(CHARACTER_MAP), _CHUNK)]
+
+
+def _replace_chain(expression, pairs):
+    for source, target in pairs:
+        expression = f"replace({expression}, '{source}', '{target}')"
+    return expression
+
+
+def normalized_select(columns, source=None):
+    """SELECT ستون‌ها که ستون‌های متنی آن یکسان‌سازی شده‌اند؛ columns: [(عبارت SQL، متنی؟)]
+
+    replace ها در چند زیرکوئری پشت هم می‌آیند (هر کدام یک تکه از CHARACTER_MAP).
+    """
+    names = [f'c{i}' for i in range(len(columns))]
+    level = 'SELECT ' + ', '.join(
+        f"{_replace_chain(f'coalesce({expression}, {chr(39) * 2})', _CHUNKS[0]) if is_text else expression} AS {name}"
+        for name, (expression, is_text) in zip(names, columns)
+    ) + (f' FROM {source}' if source else '')
+    for depth, pairs in enumerate(_CHUNKS[1:] + [None], 1):
+        level = 'SELECT ' + ', '.join(
+            (f'lower({name})' if pairs is None else _replace_chain(name, pairs)) + f' AS {name}'
+            if is_text else name
+            for name, (_, is_text) in zip(names, columns)
+        ) + f' FROM ({level}) AS n{depth}'
+    return level
+
+
+def match_query(value, prefix=True):
+    """عبارت MATCH امن از متن کاربر: همه کلمه‌ها (AND)، هر کلمه پیشوندی؛ None برای متن خالی"""
+    tokens = [token.replace('"', '""') for token in normalize(value).split()]
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"' + ('*' if prefix else '') for token in tokens)
+
+
+class SearchIndex:
+    """ثبت جدول‌های قابل جستجو، ساخت جدول FTS5 و triggerها، و جستجو"""
+
+    def __init__(self, app=None, db=None):
+        self.kinds = {}  # نوع → (کد، جدول، ستون‌های متن، بخش ثابت یا None برای ستون section)
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        self.db = db
+        app.extensions['search'] = self
+
+    def register(self, kind, model, text_columns, section=None):
+        """ثبت یک جدول؛ section=None یعنی بخش از ستون section خود سطر خوانده شود"""
+        self.kinds[kind] = (len(self.kinds), model.__table__, text_columns, section)
+
+    def _select(self, kind, row, source=None):
+        """SELECT مقادیر ستون‌های نمایه برای سطرهای یک جدول (row: new یا نام مستعار جدول)"""
+        code, table_, text_columns, section = self.kinds[kind]
+        operator = f'{row}.operator_name' if 'operator_name' in table_.c else 'NULL'
+        body = 'trim(' + " || ' ' || ".join(f"coalesce({row}.{name}, '')" for name in text_columns) + ')'
+        machine = f'{row}.machine_number' if 'machine_number' in table_.c else 'NULL'
+        return normalized_select([
+            (f'{row}.id * {KIND_SLOTS} + {code}', False), (operator, True), (body, True), (operator, False),
+            (f"'{kind}'", False), (f"'{section}'" if section else f'{row}.section', False),
+            (f'{row}.id', False), (f'{row}.date', False), (machine, False),
+        ], source)
+
+    def ddl(self):
+        """دستورهای ساخت جدول FTS5 و triggerها (IF NOT EXISTS؛ چند بار اجرا شدن بی‌خطر است)"""
+        columns = 'operator, body, name UNINDEXED, kind UNINDEXED, section UNINDEXED, ' \
+                  'ref_id UNINDEXED, date UNINDEXED, machine_number UNINDEXED'
+        statements = [f"CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5({columns}, "
+                      f"tokenize='{TOKENIZER}')"]
+        names = ', '.join(column.name for column in search_table.c)
+        for kind, (code, source, _, _) in self.kinds.items():
+            name = source.name
+            insert = f"INSERT INTO search_index ({names}) {self._select(kind, 'new')};"
+            delete = f'DELETE FROM search_index WHERE rowid = old.id * {KIND_SLOTS} + {code};'
+            statements += [
+                f'CREATE TRIGGER IF NOT EXISTS search_{name}_ai AFTER INSERT ON {name} BEGIN {insert} END',
+                f'CREATE TRIGGER IF NOT EXISTS search_{name}_ad AFTER DELETE ON {name} BEGIN {delete} END',
+                f'CREATE TRIGGER IF NOT EXISTS search_{name}_au AFTER UPDATE ON {name} BEGIN {delete} {insert} END',
+            ]
+        return statements
+
+    def populate_statement(self, kind, source_name=None):
+        """INSERT ... SELECT نمایه همه سطرهای یک جدول (مثلاً جدول بایگانی archive_1402.circular_report)"""
+        source_name = source_name or self.kinds[kind][1].name
+        alias = source_name.replace('.', '_')
+        names = ', '.join(column.name for column in search_table.c)
+        return (f"INSERT OR REPLACE INTO search_index ({names}) "
+                f"{self._select(kind, alias, f'{source_name} AS {alias}')}")
+
+    def create(self, connection):
+        for statement in self.ddl():
+            connection.exec_driver_sql(statement)
+
+    def rebuild(self, connection, extra_sources=()):
+        """پاک کردن و نمایه دوباره همه جدول‌ها؛ extra_sources: [(نوع، نام جدول)] مثل جدول‌های بایگانی"""
+        self.create(connection)
+        connection.exec_driver_sql('DELETE FROM search_index')
+        for kind in self.kinds:
+            connection.exec_driver_sql(self.populate_statement(kind))
+        for kind, source_name in extra_sources:
+            connection.exec_driver_sql(self.populate_statement(kind, source_name))
+        connection.exec_driver_sql("INSERT INTO search_index(search_index) VALUES ('optimize')")
+
+    @staticmethod
+    def _match(query):
+        return literal_column('search_index').op('MATCH')(query)
+
+    def operator_names(self, value, kinds=None):
+        """زیرکوئری نام‌های اپراتوری (همان متن واردشده) که با متن می‌خوانند؛ فقط ستون operator"""
+        query = match_query(value)
+        s = search_table.c
+        criteria = [self._match(f'operator : ({query})')] if query else [literal_column('0') == 1]
+        if kinds:
+            criteria.append(s.kind.in_(kinds))
+        return select(s.name).where(*criteria).distinct()
+
+    def search(self, session, value, sections=None, kinds=None, start_date=None, end_date=None,
+               limit=20, offset=0):
+        """(نتیجه‌ها به ترتیب رتبه bm25، تعداد کل)؛ نام اپراتور وزن بیشتری از متن دارد"""
+        query = match_query(value)
+        if query is None:
+            return [], 0
+        s = search_table.c
+        rank = func.bm25(literal_column('search_index'), 5.0, 1.0)
+        criteria = [self._match(query)]
+        if sections:
+            criteria.append(s.section.in_(sections))
+        if kinds:
+            criteria.append(s.kind.in_(kinds))
+        if start_date:
+            criteria.append(s.date >= start_date.isoformat())
+        if end_date:
+            criteria.append(s.date <= end_date.isoformat())
+        stmt = select(
+            s.kind, s.section, s.ref_id, s.date, s.name, s.machine_number,
+            func.snippet(literal_column('search_index'), 1, '[', ']', '…', 12).label('snippet'),
+            rank.label('rank')
+        ).select_from(search_table).where(*criteria).order_by(rank).limit(limit).offset(offset)
+        rows = session.execute(stmt).all()
+        # توابع کمکی FTS5 (bm25/snippet) با window function در یک کوئری نمی‌آیند
+        total = session.execute(select(func.count()).select_from(search_table).where(*criteria)).scalar()
+        return rows, total
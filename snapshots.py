@@ -0,0 +1,229 @@
+"""snapshot ستونی (Parquet) گزارش‌ها برای تحلیل بلندمدت و کار آفلاین با pandas
+
+هر بخش در snapshots/<بخش>/month=YYYY-MM/*.parquet نوشته می‌شود (پارتیشن hive ماهانه).
+همگام‌سازی افزایشی است: با شناسه آخرین سطر، زمان همگام‌سازی قبلی و تعداد سطرهای هر ماه
+معلوم می‌شود کدام ماه فقط سطر جدید دارد (یک فایل part تازه کنار فایل‌های قبلی) و کدام ماه
+ویرایش یا حذف داشته است (کل پارتیشن آن ماه دوباره نوشته می‌شود).
+
+خواندن با pyarrow.dataset انجام می‌شود: فقط ستون‌های لازم (projection) و فقط ماه‌ها و
+سطرهای منطبق با فیلتر (predicate pushdown). ماه جاری و هر ماهی که بعد از آخرین
+همگام‌سازی تغییر کرده همچنان از SQLite خوانده می‌شود؛ پس نتیجه همیشه با دیتابیس یکی است.
+
+pyarrow وابستگی اختیاری است؛ بدون آن available برابر False است و همه چیز از SQLite می‌آید.
+"""
+import json
+import os
+import shutil
+import threading
+import uuid
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import Date, DateTime, Float, Integer, case, func, select
+
+# حاشیه زمان همگام‌سازی: سطرهایی که کمی قبل از شروع آن commit شده‌اند دفعه بعد هم بررسی می‌شوند
+SYNC_MARGIN = timedelta(minutes=1)
+
+
+def month_key(column):
+    return func.strftime('%Y-%m', column)
+
+
+def month_bounds(start=None, end=None):
+    """گسترش بازه به ماه‌های کامل (شمارش سطرهای هر ماه باید با snapshot مقایسه‌پذیر باشد)"""
+    if start is not None:
+        start = start.replace(day=1)
+    if end is not None:
+        end = (end.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return start, end
+
+
+class ParquetSnapshots:
+    """همگام‌سازی و خواندن snapshot های Parquet جدول‌های گزارش"""
+
+    def __init__(self, app=None, db=None, archive=None):
+        self.models = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, db, archive)
+
+    def init_app(self, app, db, archive=None):
+        app.config.setdefault('SNAPSHOT_DIR', 'snapshots')
+
+        self.db = db
+        self.archive = archive
+        self.directory = app.config['SNAPSHOT_DIR']
+        if not os.path.isabs(self.directory):
+            self.directory = os.path.join(app.instance_path, self.directory)
+        app.extensions['snapshots'] = self
+
+    def register(self, section, model):
+        self.models[section] = model
+
+    @property
+    def available(self):
+        try:
+            import pyarrow.dataset  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def _section_dir(self, section):
+        return os.path.join(self.directory, section)
+
+    def _state_path(self, section):
+        return os.path.join(self._section_dir(section), '_state.json')
+
+    def state(self, section):
+        """وضعیت آخرین همگام‌سازی: last_id، synced_at و تعداد سطرهای هر ماه"""
+        try:
+            with open(self._state_path(section), encoding='utf-8') as fp:
+                return json.load(fp)
+        except FileNotFoundError:
+            return None
+
+    def _save_state(self, section, state):
+        path = self._state_path(section)
+        with open(path + '.tmp', 'w', encoding='utf-8') as fp:
+            json.dump(state, fp)
+        os.replace(path + '.tmp', path)
+
+    def _schema(self, section):
+        import pyarrow as pa
+
+        types = {Integer: pa.int64(), Float: pa.float64(), Date: pa.date32(), DateTime: pa.timestamp('us')}
+        fields = []
+        for column in self.models[section].__table__.columns:
+            arrow_type = next((t for sql_type, t in types.items() if isinstance(column.type, sql_type)), pa.string())
+            fields.append(pa.field(column.name, arrow_type))
+        return pa.schema(fields)
+
+    def _source(self, section, start=None, end=None, session=None):
+        model = self.models[section]
+        if self.archive is None:
+            return model
+        return self.archive.source(model, start, end, session)
+
+    def month_stats(self, section, start=None, end=None, last_id=0, session=None):
+        """{ماه: (تعداد، بیشترین شناسه، تعداد سطرهای جدیدتر از last_id، آخرین ویرایش سطرهای قدیمی‌تر)}"""
+        session = session or self.db.session
+        start, end = month_bounds(start, end)
+        source = self._source(section, start, end, session)
+        month = month_key(source.date)
+        criteria = []
+        if start is not None:
+            criteria.append(source.date >= start)
+        if end is not None:
+            criteria.append(source.date <= end)
+        rows = session.execute(
+            select(
+                month, func.count(source.id), func.max(source.id),
+                func.sum(case((source.id > last_id, 1), else_=0)),
+                func.max(case((source.id <= last_id, source.updated_at)))
+            ).where(*criteria).group_by(month)
+        ).all()
+        return {row[0]: tuple(row[1:]) for row in rows}
+
+    def _write(self, section, month, path, criteria, session):
+        """نوشتن سطرهای یک ماه (با فیلتر اضافه) در یک فایل Parquet؛ تعداد سطرها"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        first = datetime.strptime(month, '%Y-%m').date()
+        _, last = month_bounds(first, first)
+        source = self._source(section, first, last, session)
+        schema = self._schema(section)
+        rows = session.execute(
+            select(*(getattr(source, name) for name in schema.names))
+            .where(source.date.between(first, last), *criteria(source)).order_by(source.id)
+        ).all()
+        columns = list(zip(*rows)) if rows else [[] for _ in schema.names]
+        table = pa.table([pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # نام‌های «_» را pyarrow.dataset نادیده می‌گیرد؛ فایل فقط بعد از کامل شدن دیده می‌شود
+        temporary = os.path.join(os.path.dirname(path), f'_{uuid.uuid4().hex}.tmp')
+        pq.write_table(table, temporary)
+        os.replace(temporary, path)
+        return len(rows)
+
+    def _partition(self, section, month):
+        return os.path.join(self._section_dir(section), f'month={month}')
+
+    def sync(self, section, session=None):
+        """همگام‌سازی افزایشی یک بخش؛ {'appended': ماه‌ها، 'rewritten': ماه‌ها، 'removed': ماه‌ها}"""
+        session = session or self.db.session
+        with self._lock:
+            os.makedirs(self._section_dir(section), exist_ok=True)
+            started = datetime.utcnow() - SYNC_MARGIN
+            state = self.state(section) or {'last_id': 0, 'synced_at': None, 'months': {}}
+            last_id = state['last_id']
+            synced_at = datetime.fromisoformat(state['synced_at']) if state['synced_at'] else None
+            stats = self.month_stats(section, last_id=last_id, session=session)
+
+            result = {'appended': [], 'rewritten': [], 'removed': []}
+            months = {}
+            for month, (count, max_id, new_count, changed_at) in sorted(stats.items()):
+                recorded = state['months'].get(month)
+                changed = synced_at is None or (changed_at is not None and changed_at > synced_at)
+                if recorded is None or changed or recorded + new_count != count:
+                    # ویرایش، حذف یا ماه تازه: کل پارتیشن در پوشه موقت نوشته و جایگزین می‌شود
+                    partition = self._partition(section, month)
+                    staging = os.path.join(self._section_dir(section), f'_{month}.staging')
+                    shutil.rmtree(staging, ignore_errors=True)
+                    self._write(section, month, os.path.join(staging, 'part-0.parquet'), lambda s: [], session)
+                    shutil.rmtree(partition, ignore_errors=True)
+                    os.replace(staging, partition)
+                    result['rewritten'].append(month)
+                elif new_count:
+                    path = os.path.join(self._partition(section, month), f'part-{last_id + 1}.parquet')
+                    self._write(section, month, path, lambda s: [s.id > last_id], session)
+                    result['appended'].append(month)
+                months[month] = count
+
+            for month in set(state['months']) - set(months):
+                shutil.rmtree(self._partition(section, month), ignore_errors=True)
+                result['removed'].append(month)
+
+            max_ids = [stat[1] for stat in stats.values()]
+            self._save_state(section, {
+                'last_id': max(max_ids + [last_id]),
+                'synced_at': started.isoformat(),
+                'months': months,
+            })
+        return result
+
+    def fresh_months(self, section, start=None, end=None, today=None, session=None):
+        """ماه‌های گذشته بازه که snapshot آن‌ها هنوز با دیتابیس یکی است"""
+        state = self.state(section)
+        if not state or not state['synced_at']:
+            return []
+        current_month = (today or date.today()).replace(day=1)
+        end = min(end, current_month - timedelta(days=1)) if end else current_month - timedelta(days=1)
+        if start is not None and start > end:
+            return []
+        synced_at = datetime.fromisoformat(state['synced_at'])
+        fresh = []
+        for month, (count, max_id, new_count, changed_at) in self.month_stats(
+                section, start, end, state['last_id'], session).items():
+            if (state['months'].get(month) == count and not new_count
+                    and (changed_at is None or changed_at <= synced_at)):
+                fresh.append(month)
+        return sorted(fresh)
+
+    def read(self, section, months, columns=None, start=None, end=None, equals=None):
+        """DataFrame سطرهای ماه‌های داده‌شده از snapshot با projection و فیلتر روی خود فایل‌ها"""
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        schema = self._schema(section)
+        dataset = ds.dataset(
+            self._section_dir(section), format='parquet', schema=schema.append(pa.field('month', pa.string())),
+            partitioning=ds.partitioning(pa.schema([('month', pa.string())]), flavor='hive')
+        )
+        expression = ds.field('month').isin(months)
+        if start is not None:
+            expression &= ds.field('date') >= pa.scalar(start, type=pa.date32())
+        if end is not None:
+            expression &= ds.field('date') <= pa.scalar(end, type=pa.date32())
+        for name, value in (equals or {}).items():
+            expression &= ds.field(name) == value
+        return dataset.to_table(columns=columns or schema.names, filter=expression).to_pandas()
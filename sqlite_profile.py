@@ -0,0 +1,103 @@
+"""پروفایل تنظیمات SQLite برای بار همزمان شیفت
+
+با هر اتصال جدید pragmaهای زیر اعمال می‌شوند تا ثبت گزارش‌ها و نظرسنجی داشبورد
+همدیگر را قفل نکنند:
+
+    journal_mode=WAL      خواننده‌ها نویسنده را منتظر نمی‌گذارند
+    synchronous=NORMAL    در WAL امن است و fsync هر commit را حذف می‌کند
+    busy_timeout          به جای خطای «database is locked» منتظر می‌ماند
+    mmap_size/cache_size  خواندن صفحات از حافظه به جای فراخوانی read
+
+اگر SQLITE_READ_ENGINE روشن باشد، کوئری‌های سنگین تحلیلی روی یک engine جدای
+فقط‌خواندنی (mode=ro) اجرا می‌شوند و اتصال‌های pool نوشتن را اشغال نمی‌کنند.
+"""
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+# pool اتصال‌های فایل: ۱۰ اتصال ثابت و ۲۰ اتصال اضافه در اوج تغییر شیفت
+POOL_OPTIONS = {'pool_size': 10, 'max_overflow': 20, 'pool_timeout': 30}
+
+
+def is_memory_database(uri):
+    """دیتابیس SQLite داخل حافظه (sqlite:// یا :memory:) که با StaticPool ساخته می‌شود"""
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and (
+        url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory')
+
+
+def engine_options(uri):
+    """گزینه‌های پیش‌فرض create_engine؛ StaticPool حافظه pool_size و max_overflow نمی‌پذیرد"""
+    return {} if is_memory_database(uri) else dict(POOL_OPTIONS)
+
+
+class SQLiteProfile:
+    """اعمال pragmaهای پروفایل روی engine اصلی و ساخت engine فقط‌خواندنی اختیاری"""
+
+    def __init__(self, app=None, db=None):
+        self.db = None
+        self.enabled = False
+        self.read_engine = None
+        self._read_session = None
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.config.setdefault('SQLITE_PROFILE', 'production')  # production | off
+        app.config.setdefault('SQLITE_BUSY_TIMEOUT_MS', 5000)
+        app.config.setdefault('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)
+        app.config.setdefault('SQLITE_CACHE_SIZE_KB', 64 * 1024)
+        app.config.setdefault('SQLITE_READ_ENGINE', False)
+
+        self.db = db
+        app.extensions['sqlite_profile'] = self
+        with app.app_context():
+            engine = db.engine
+        if app.config['SQLITE_PROFILE'] == 'off' or engine.dialect.name != 'sqlite':
+            return
+
+        self.enabled = True
+        self.pragmas = [
+            f"busy_timeout={int(app.config['SQLITE_BUSY_TIMEOUT_MS'])}",
+            'synchronous=NORMAL',
+            f"mmap_size={int(app.config['SQLITE_MMAP_SIZE'])}",
+            f"cache_size=-{int(app.config['SQLITE_CACHE_SIZE_KB'])}",
+            'temp_store=MEMORY',
+        ]
+        event.listen(engine, 'connect', self._on_connect)
+
+        path = engine.url.database
+        if app.config['SQLITE_READ_ENGINE'] and path and path != ':memory:':
+            self.read_engine = create_engine(
+                f'sqlite:///file:{path}?mode=ro&uri=true',
+                **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+            )
+            event.listen(self.read_engine, 'connect', self._on_connect_read)
+            self._read_session = scoped_session(sessionmaker(bind=self.read_engine))
+            app.teardown_appcontext(self._remove_read_session)
+
+    def _apply(self, dbapi_connection, pragmas):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(f'PRAGMA {pragma}')
+        finally:
+            cursor.close()
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        # journal_mode در خود فایل ذخیره می‌شود؛ اتصال فقط‌خواندنی نمی‌تواند آن را عوض کند
+        self._apply(dbapi_connection, ['journal_mode=WAL'] + self.pragmas)
+
+    def _on_connect_read(self, dbapi_connection, connection_record):
+        self._apply(dbapi_connection, self.pragmas + ['query_only=ON'])
+
+    def _remove_read_session(self, exc=None):
+        self._read_session.remove()
+
+    @property
+    def reader(self):
+        """session مناسب کوئری‌های تحلیلی (فقط‌خواندنی اگر فعال باشد، وگرنه db.session)"""
+        if self._read_session is not None:
+            return self._read_session
+        return self.db.session
+
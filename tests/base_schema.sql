@@ -0,0 +1,107 @@
+-- جدول‌های نسخه اول (قبل از اولین مهاجرت؛ با db.create_all ساخته می‌شدند)
+
+CREATE TABLE machine (
+	id INTEGER NOT NULL,
+	machine_number INTEGER NOT NULL,
+	section VARCHAR(50),
+	status VARCHAR(20),
+	standard_footage FLOAT,
+	PRIMARY KEY (id)
+);
+
+CREATE TABLE user (
+	id INTEGER NOT NULL,
+	username VARCHAR(80) NOT NULL,
+	password_hash VARCHAR(200) NOT NULL,
+	full_name VARCHAR(100),
+	role VARCHAR(20),
+	PRIMARY KEY (id),
+	UNIQUE (username)
+);
+
+CREATE TABLE circular_report (
+	id INTEGER NOT NULL,
+	date DATE NOT NULL,
+	shift VARCHAR(20) NOT NULL,
+	machine_number INTEGER,
+	operator_name VARCHAR(100) NOT NULL,
+	bag_width FLOAT,
+	color VARCHAR(50),
+	cleanliness VARCHAR(50),
+	machine_speed FLOAT,
+	footage FLOAT,
+	roll_weight FLOAT,
+	downtime_hours FLOAT,
+	notes TEXT,
+	created_by INTEGER,
+	created_at DATETIME,
+	PRIMARY KEY (id),
+	FOREIGN KEY(machine_number) REFERENCES machine (id),
+	FOREIGN KEY(created_by) REFERENCES user (id)
+);
+
+CREATE TABLE extruder_report (
+	id INTEGER NOT NULL,
+	date DATE NOT NULL,
+	shift VARCHAR(20) NOT NULL,
+	operator_name VARCHAR(100) NOT NULL,
+	color_material FLOAT,
+	carbon_material FLOAT,
+	brightener_material FLOAT,
+	material_weight FLOAT,
+	machine_speed FLOAT,
+	water_temp FLOAT,
+	mardon_temp FLOAT,
+	mold_temp FLOAT,
+	furnace_temp FLOAT,
+	denier_measurement_time VARCHAR(10),
+	salon_denier FLOAT,
+	wall_denier FLOAT,
+	color VARCHAR(50),
+	remaining_weight FLOAT,
+	waste FLOAT,
+	notes TEXT,
+	created_by INTEGER,
+	created_at DATETIME,
+	PRIMARY KEY (id),
+	FOREIGN KEY(created_by) REFERENCES user (id)
+);
+
+CREATE TABLE machine_issue (
+	id INTEGER NOT NULL,
+	machine_number INTEGER,
+	section VARCHAR(50),
+	issue_type VARCHAR(100),
+	description TEXT,
+	date DATE NOT NULL,
+	shift VARCHAR(20),
+	reported_by INTEGER,
+	created_at DATETIME,
+	PRIMARY KEY (id),
+	FOREIGN KEY(machine_number) REFERENCES machine (id),
+	FOREIGN KEY(reported_by) REFERENCES user (id)
+);
+
+CREATE TABLE sewing_report (
+	id INTEGER NOT NULL,
+	date DATE NOT NULL,
+	shift VARCHAR(20) NOT NULL,
+	operator_name VARCHAR(100) NOT NULL,
+	roll_barcode VARCHAR(100),
+	roll_weight FLOAT,
+	footage FLOAT,
+	bag_width FLOAT,
+	bag_length FLOAT,
+	color VARCHAR(50),
+	bags_produced INTEGER,
+	grade_b_bags INTEGER,
+	unsewn_bags INTEGER,
+	bundle_count INTEGER,
+	waste FLOAT,
+	notes TEXT,
+	created_by INTEGER,
+	created_at DATETIME,
+	PRIMARY KEY (id),
+	FOREIGN KEY(created_by) REFERENCES user (id)
+);
+
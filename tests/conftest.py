@@ -0,0 +1,66 @@
+"""fixture های مشترک: اپ با SQLite داخل حافظه و کاربر واردشده
+
+از ریشه مخزن اجرا شود: python -m pytest
+"""
+import os
+
+import pytest
+
+import app as factory
+from app import db
+
+TEST_CONFIG = {
+    'TESTING': True,
+    'SECRET_KEY': 'test',
+    'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+    'RESPONSE_CACHE_BACKEND': 'none',
+    'LIVE_UPDATES_BACKEND': 'none',
+}
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = factory.create_app(dict(TEST_CONFIG, ARCHIVE_DIR=str(tmp_path / 'archives'),
+                                  SNAPSHOT_DIR=str(tmp_path / 'snapshots'), JOBS_PATH=str(tmp_path / 'jobs.db'),
+                                  JOBS_RESULT_DIR=str(tmp_path / 'job_results')))
+    # بدون app context باز: هر درخواست تست context (و g و session) خودش را دارد
+    with app.app_context():
+        db.create_all()
+        # کش‌های سطح ماژول بین اپ‌های تست مشترک‌اند
+        for registry in (factory.machine_registry, factory.user_registry, factory.operator_registry):
+            registry.invalidate()
+    yield app
+    with app.app_context():
+        db.drop_all()
+
+
+@pytest.fixture
+def user(app):
+    with app.app_context():
+        user = factory.User(username='tester', full_name='تست', role='admin')
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+@pytest.fixture
+def client(app, user):
+    client = app.test_client()
+    response = client.post('/login', data={'username': 'tester', 'password': 'secret'})
+    assert response.status_code == 302
+    return client
+
+
+@pytest.fixture
+def legacy_app():
+    """دیتابیس با جدول‌های نسخه اول (قبل از اولین مهاجرت)"""
+    app = factory.create_app(TEST_CONFIG)
+    with app.app_context():
+        with db.engine.begin() as connection:
+            with open(os.path.join(os.path.dirname(__file__), 'base_schema.sql'), encoding='utf-8') as fp:
+                connection.connection.executescript(fp.read())
+        factory.operator_registry.invalidate()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
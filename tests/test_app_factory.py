@@ -0,0 +1,36 @@
+from sqlalchemy.pool import StaticPool
+
+import app as factory
+from app import db
+from sqlite_profile import POOL_OPTIONS, engine_options
+
+
+def test_memory_database_has_no_pool_options(app):
+    assert app.config['SQLALCHEMY_ENGINE_OPTIONS'] == {}
+    with app.app_context():
+        assert isinstance(db.engine.pool, StaticPool)
+
+
+def test_file_database_keeps_pool_options():
+    assert engine_options('sqlite:///factory_monitoring.db') == POOL_OPTIONS
+    assert engine_options('sqlite:///:memory:') == {}
+    assert engine_options('sqlite:///file:data?mode=memory&uri=true') == {}
+
+
+def test_engine_options_from_config_win(tmp_path):
+    options = {'pool_size': 2}
+    app = factory.create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "app.db"}',
+                              'SQLALCHEMY_ENGINE_OPTIONS': options, 'RESPONSE_CACHE_BACKEND': 'none'})
+    assert app.config['SQLALCHEMY_ENGINE_OPTIONS'] is options
+
+
+def test_init_db_seeds_machines(app):
+    factory.init_db(app)
+    with app.app_context():
+        assert factory.Machine.query.filter_by(section='circular').count() == 15
+        assert factory.User.query.filter_by(username='admin').count() == 1
+
+
+def test_login_required(app, client):
+    assert app.test_client().get('/api/dashboard-data').status_code == 302
+    assert client.get('/api/dashboard-data?section=circular').status_code == 200
@@ -0,0 +1,49 @@
+import os
+
+import app as factory
+from app import db
+
+# ۱۴۰۴ سال بسته است؛ بازه‌ها از اسفند ۱۴۰۴ تا اردیبهشت ۱۴۰۵ را می‌گیرند
+ROWS = [
+    {'date': '2026-03-05', 'shift': 'A', 'machine_number': 1, 'operator_name': 'علی', 'footage': 1000,
+     'notes': 'پارگی نخ'},
+    {'date': '2026-03-15', 'shift': 'B', 'machine_number': 2, 'operator_name': 'رضا', 'footage': 800,
+     'notes': 'پارگی نخ'},
+    {'date': '2026-03-19', 'shift': 'A', 'machine_number': 1, 'operator_name': 'رضا', 'footage': 1200},
+    {'date': '2026-04-02', 'shift': 'A', 'machine_number': 2, 'operator_name': 'علی', 'footage': 900,
+     'notes': 'توقف برق'},
+]
+URLS = [
+    '/api/dashboard-data?section=circular&period=custom&start_date=2026-03-01&end_date=2026-04-30',
+    '/api/dashboard-data?section=circular&period=custom&start_date=2026-03-01&end_date=2026-03-20',
+    '/api/operator-machine-matrix?start_date=2026-03-01&end_date=2026-04-30&include=efficiency,downtime',
+    '/api/machine-diagnostics?section=circular&days=3650',
+]
+
+
+def responses(client):
+    return [client.get(url).get_json() for url in URLS]
+
+
+def test_archived_year_keeps_analytics(app, user, client):
+    with app.app_context():
+        assert factory.ingest_reports('circular', ROWS, user).inserted == len(ROWS)
+    before = responses(client)
+    assert before[0]['total_value'] == 3900
+    assert before[0]['issues'] == [{'issue_type': 'گزارش عملیاتی', 'count': 3}]
+
+    result = app.test_cli_runner().invoke(args=['archive-reports', '1404'])
+    assert result.exit_code == 0, result.output
+    assert os.path.exists(os.path.join(app.config['ARCHIVE_DIR'], 'reports_1404.db'))
+    with app.app_context():
+        # فقط گزارش و مسئله ۱۴۰۵ در جدول اصلی مانده است
+        assert factory.CircularReport.query.count() == 1
+        assert factory.MachineIssue.query.count() == 1
+
+    assert responses(client) == before
+
+
+def test_archive_rejects_open_year(app):
+    result = app.test_cli_runner().invoke(args=['archive-reports', '1499'])
+    assert result.exit_code != 0
+    assert not os.path.exists(app.config['ARCHIVE_DIR'])
@@ -0,0 +1,57 @@
+from datetime import date, timedelta
+
+import pytest
+
+import app as factory
+from diagnostics import bounded_number, resolve_rules
+
+URL = '/api/machine-diagnostics'
+
+
+def shifts(machine, footage, count=4):
+    return [{'date': (date.today() - timedelta(days=day)).isoformat(), 'shift': 'A', 'machine_number': machine,
+             'operator_name': 'علی', 'footage': footage} for day in range(1, count + 1)]
+
+
+@pytest.mark.parametrize('value', ['inf', '-inf', 'nan', '1e400', '3651', '-1', '2.5', 'x'])
+def test_bounded_number_rejects(value):
+    with pytest.raises(ValueError):
+        bounded_number(value, int, 0, 3650)
+
+
+def test_bounded_number_accepts():
+    assert bounded_number('30', int, 0, 3650) == 30
+    assert bounded_number('30.0', int, 0, 3650) == 30
+    assert bounded_number('2.5', float, 0, 24) == 2.5
+
+
+def test_section_defaults():
+    circular = resolve_rules('circular')
+    assert (circular['min_avg_value'], circular['min_efficiency']) == (1500, 0)
+    extruder = resolve_rules('extruder')
+    assert (extruder['min_avg_value'], extruder['min_efficiency']) == (0, 75)
+    # تنظیمات بخش و پارامتر درخواست روی پیش‌فرض بخش می‌نشینند
+    assert resolve_rules('circular', {'circular': {'min_avg_value': 1200}})['min_avg_value'] == 1200
+    assert resolve_rules('circular', None, {'min_avg_value': '0'})['min_avg_value'] == 0
+
+
+@pytest.mark.parametrize('query', [
+    'days=inf', 'days=1e400', 'days=3651', 'days=-1', 'baseline_days=inf', 'baseline_days=0',
+    'max_downtime_hours=25', 'zscore=nan', 'min_shifts=1.5', 'min_avg_value=-1',
+])
+def test_out_of_range_parameters_are_rejected(client, query):
+    response = client.get(f'{URL}?section=circular&{query}')
+    assert response.status_code == 400
+
+
+def test_circular_low_average_rule(app, user, client):
+    with app.app_context():
+        # دستگاه ۲ بالای استاندارد خودش (۸۰۰) است ولی میانگین شیفتش زیر ۱۵۰۰ است
+        factory.ingest_reports('circular', shifts(2, 1000) + shifts(1, 1600), user)
+    body = client.get(f'{URL}?section=circular').get_json()
+    assert body['rules']['min_avg_value'] == 1500
+    assert body['suggestions'] == ['دستگاه 2: تولید پایین (1000 در شیفت) → آموزش اپراتور یا تعمیر']
+
+    assert client.get(f'{URL}?section=circular&min_avg_value=0').get_json()['suggestions'] == []
+    # بدون شیفت کافی قضاوتی درباره تولید نمی‌شود
+    assert client.get(f'{URL}?section=circular&min_shifts=4').get_json()['suggestions'] == []
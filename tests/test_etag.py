@@ -0,0 +1,59 @@
+import app as factory
+from app import db
+
+URL = '/api/dashboard-data?section=circular&period=7d'
+
+
+def ingest(app, user, section, row):
+    with app.app_context():
+        assert factory.ingest_reports(section, [row], user).inserted == 1
+
+
+def test_not_modified_until_section_changes(app, user, client):
+    first = client.get(URL)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert {'private', 'no-cache'} <= {part.strip() for part in first.headers['Cache-Control'].split(',')}
+
+    again = client.get(URL, headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.headers['ETag'] == etag and not again.data
+
+    # گزارش بخش دیگر ETag این بخش را عوض نمی‌کند
+    ingest(app, user, 'sewing', {'date': '2026-02-01', 'shift': 'A', 'operator_name': 'مریم', 'bags_produced': 10})
+    assert client.get(URL, headers={'If-None-Match': etag}).status_code == 304
+
+    ingest(app, user, 'circular', {'date': '2026-02-01', 'shift': 'A', 'machine_number': 1,
+                                   'operator_name': 'علی', 'footage': 900})
+    changed = client.get(URL, headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+
+
+def test_etag_depends_on_parameters(client):
+    assert client.get(URL).headers['ETag'] != client.get(URL + '&shift=A').headers['ETag']
+
+
+def test_machine_change_invalidates_every_section(app, client):
+    factory.init_db(app)
+    etags = {section: client.get(f'/api/dashboard-data?section={section}').headers['ETag']
+             for section in factory.SECTION_MODELS}
+    with app.app_context():
+        db.session.query(factory.Machine).filter_by(machine_number=3).one().standard_footage = 1200
+        db.session.commit()
+    for section, etag in etags.items():
+        response = client.get(f'/api/dashboard-data?section={section}', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+
+
+def test_one_version_bump_per_flush(app):
+    factory.init_db(app)
+    with app.app_context():
+        versions = factory.data_versions(['machines', *factory.SECTION_MODELS])
+        assert {tag: version for tag, (version, _) in versions.items()} == {
+            'machines': 1, 'circular': 1, 'extruder': 1, 'sewing': 1}
+
+        for machine in factory.Machine.query.limit(3):
+            machine.status = 'inactive'
+        db.session.flush()
+        db.session.rollback()
+        assert factory.data_versions(['machines'])['machines'][0] == 1
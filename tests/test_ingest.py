@@ -0,0 +1,91 @@
+import io
+import json
+
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+
+import app as factory
+from app import db
+
+
+def circular_row(day, footage=1000, **extra):
+    return dict({'date': f'2026-02-{day:02d}', 'shift': 'A', 'machine_number': 1,
+                 'operator_name': 'علی', 'footage': footage}, **extra)
+
+
+def report_count(app, section='circular'):
+    with app.app_context():
+        return factory.SECTION_MODELS[section].query.count()
+
+
+def test_bulk_json_reports_row_errors(app, client):
+    rows = [circular_row(1), {'date': '2026-02-02', 'shift': 'A'}, 'x', circular_row(3, footage='abc')]
+    response = client.post('/api/reports/circular/bulk', json=rows)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['received'], body['inserted'], body['failed'], body['pending']) == (4, 1, 0, 0)
+    assert [error['row'] for error in body['errors']] == [2, 3, 4]
+    assert report_count(app) == 1
+
+
+def test_bulk_csv_upload(app, client):
+    text = 'date,shift,operator_name,bags_produced\n2026-02-01,A,مریم,40\n2026-02-01,B,مریم,\n'
+    response = client.post('/api/reports/sewing/bulk', content_type='multipart/form-data',
+                           data={'file': (io.BytesIO(text.encode('utf-8')), 'sewing.csv')})
+    assert response.status_code == 200
+    assert response.get_json()['inserted'] == 2
+    with app.app_context():
+        assert sorted(r.bags_produced for r in factory.SewingReport.query) == [0, 40]
+
+
+def test_bulk_rejects_bad_requests(client):
+    assert client.post('/api/reports/unknown/bulk', json=[]).status_code == 400
+    assert client.post('/api/reports/circular/bulk', json={'rows': []}).status_code == 400
+    response = client.post('/api/reports/circular/bulk', content_type='multipart/form-data',
+                           data={'file': (io.BytesIO(b'x'), 'reports.txt')})
+    assert response.status_code == 400
+
+
+def test_failed_batch_keeps_committed_batches(app, user, monkeypatch):
+    rebuild = factory.rebuild_rollups
+    calls = []
+
+    def failing_rebuild(section, start_date=None, end_date=None):
+        calls.append(section)
+        if len(calls) == 2:
+            raise OperationalError('INSERT INTO production_rollup', {}, Exception('database is locked'))
+        rebuild(section, start_date, end_date)
+
+    monkeypatch.setattr(factory, 'rebuild_rollups', failing_rebuild)
+    rows = [circular_row(day) for day in range(1, 8)]
+    with app.app_context():
+        result = factory.ingest_reports('circular', rows, user, batch_size=2)
+    # دسته اول ثبت شده، دسته دوم (سطرهای ۳ و ۴) شکست خورده و سه سطر بعدی بررسی نشده‌اند
+    assert (result.inserted, result.failed, result.pending) == (2, 2, 3)
+    assert [error['row'] for error in result.errors] == [3, 4]
+    assert report_count(app) == 2
+    with app.app_context():
+        assert db.session.query(func.sum(factory.ProductionRollup.value_sum)).scalar() == 2000
+
+
+def test_bulk_route_reports_partial_failure(client, monkeypatch):
+    def failing_rebuild(section, start_date=None, end_date=None):
+        raise OperationalError('INSERT INTO production_rollup', {}, Exception('disk I/O error'))
+
+    monkeypatch.setattr(factory, 'rebuild_rollups', failing_rebuild)
+    response = client.post('/api/reports/circular/bulk', data=json.dumps([circular_row(1), circular_row(2)]),
+                           content_type='application/json')
+    assert response.status_code == 500
+    body = response.get_json()
+    assert (body['inserted'], body['failed'], body['pending']) == (0, 2, 0)
+
+
+def test_sewing_form_error_is_logged(app, client, monkeypatch, caplog):
+    def broken_refresh(section, keys):
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(factory, 'refresh_rollups', broken_refresh)
+    response = client.post('/report/sewing', data={'date': '2026-02-01', 'shift': 'A', 'operator_name': 'مریم'})
+    assert response.status_code == 302
+    assert 'sewing report failed' in caplog.text
+    assert report_count(app, 'sewing') == 0
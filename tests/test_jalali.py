@@ -0,0 +1,30 @@
+from datetime import date
+
+import numpy as np
+from jdatetime import date as jdate
+
+from jalali import JalaliCalendar
+
+
+def test_table_is_built_on_first_use():
+    calendar = JalaliCalendar(first=date(2024, 1, 1), last=date(2024, 12, 31))
+    assert calendar._table is None
+    assert calendar.label(date(2025, 10, 17)) == '1404/07/25'
+    assert calendar._table is not None
+
+
+def test_matches_jdatetime_and_grows_outside_range():
+    calendar = JalaliCalendar(first=date(2024, 1, 1), last=date(2024, 12, 31))
+    days = np.arange(np.datetime64('2010-03-15'), np.datetime64('2031-03-25'), 37)
+    years, months, days_of_month = calendar.convert(days)
+    expected = [jdate.fromgregorian(date=day) for day in days.astype(object)]
+    assert list(zip(years, months, days_of_month)) == [(d.year, d.month, d.day) for d in expected]
+
+
+def test_bucket_starts():
+    calendar = JalaliCalendar()
+    day = np.array(['2025-10-17'], dtype='datetime64[D]')  # جمعه ۲۵ مهر ۱۴۰۴
+    assert str(calendar.bucket_starts(day, 'jweek')[0]) == '2025-10-11'  # شنبه
+    assert str(calendar.bucket_starts(day, 'jmonth')[0]) == '2025-09-23'  # ۱ مهر
+    assert str(calendar.bucket_starts(day, 'jyear')[0]) == '2025-03-21'  # ۱ فروردین
+    assert calendar.bucket_label(np.datetime64('2025-09-23'), 'jmonth') == '1404/07'
@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+
+import pytest
+
+import app as factory
+from app import db
+
+ROWS = [
+    {'date': '2026-01-10', 'shift': 'A', 'machine_number': 1, 'operator_name': 'علی', 'footage': 1000},
+    {'date': '2026-01-12', 'shift': 'B', 'machine_number': 2, 'operator_name': 'رضا', 'footage': 700},
+]
+PARAMS = {'section': 'circular', 'period': 'custom', 'start_date': '2026-01-01', 'end_date': '2026-01-31'}
+
+
+def submit(client, kind='dashboard', params=PARAMS):
+    return client.post('/api/jobs', json={'kind': kind, 'params': params})
+
+
+def wait(job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = factory.jobs.get(job_id)
+        if job['status'] not in ('queued', 'running') or time.monotonic() > deadline:
+            return job
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def data(app, user):
+    with app.app_context():
+        factory.ingest_reports('circular', ROWS, user)
+
+
+def test_dashboard_job_matches_view_and_is_reused(app, client, data):
+    response = submit(client)
+    assert response.status_code == 202
+    job = response.get_json()
+    assert job['status'] in ('queued', 'running') and not job['cached']
+    assert wait(job['id'])['status'] == 'done'
+
+    status = client.get(f"/api/jobs/{job['id']}").get_json()
+    result = client.get(status['result_url'])
+    assert result.status_code == 200
+    view = client.get('/api/dashboard-data', query_string=PARAMS)
+    assert result.get_json() == view.get_json()
+
+    again = submit(client)
+    assert again.status_code == 200
+    assert again.get_json()['id'] == job['id'] and again.get_json()['cached']
+
+
+def test_changed_data_makes_a_new_job(app, user, client, data):
+    first = submit(client).get_json()
+    wait(first['id'])
+    with app.app_context():
+        factory.ingest_reports('circular', [dict(ROWS[0], date='2026-01-20', footage=500)], user)
+    second = submit(client)
+    assert second.status_code == 202 and second.get_json()['id'] != first['id']
+    wait(second.get_json()['id'])
+    total = client.get(f"/api/jobs/{second.get_json()['id']}/result").get_json()['total_value']
+    assert total == 2200
+
+
+def test_purge_removes_finished_jobs_and_files(app, client, data):
+    job = submit(client).get_json()
+    wait(job['id'])
+    result_dir = app.config['JOBS_RESULT_DIR']
+    assert any(name.startswith(job['id']) for name in os.listdir(result_dir))
+
+    assert factory.jobs.purge() == 0  # هنوز از JOBS_RESULT_TTL جوان‌تر است
+    assert factory.jobs.purge(max_age=0) == 1
+    assert os.listdir(result_dir) == []
+    assert client.get(f"/api/jobs/{job['id']}").status_code == 404
+
+
+def test_cancel_running_job(app, client, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def slow(job):
+        started.set()
+        while not release.wait(0.01):
+            job.check_cancelled()
+
+    monkeypatch.setitem(factory.jobs.kinds, 'slow', (slow, None, None))
+    job = submit(client, 'slow', {}).get_json()
+    assert started.wait(5)
+    response = client.post(f"/api/jobs/{job['id']}/cancel")
+    assert response.status_code == 200 and response.get_json()['cancel_requested']
+    assert wait(job['id'])['status'] == 'cancelled'
+    assert client.get(f"/api/jobs/{job['id']}/result").status_code == 404
+
+
+def test_jobs_are_private_to_their_owner(app, client, data):
+    with app.app_context():
+        other = factory.User(username='other', full_name='دیگری', role='operator')
+        other.set_password('secret')
+        db.session.add(other)
+        db.session.commit()
+    other_client = app.test_client()
+    other_client.post('/login', data={'username': 'other', 'password': 'secret'})
+
+    job = submit(other_client).get_json()
+    wait(job['id'])
+    assert other_client.get(f"/api/jobs/{job['id']}").status_code == 200
+    # مدیر همه کارها را می‌بیند
+    assert client.get(f"/api/jobs/{job['id']}").status_code == 200
+
+    mine = submit(client)
+    assert mine.status_code == 202  # کار هم‌کلید کاربر دیگر دوباره استفاده نمی‌شود
+    mine = mine.get_json()
+    wait(mine['id'])
+    for url in (f"/api/jobs/{mine['id']}", f"/api/jobs/{mine['id']}/result"):
+        assert other_client.get(url).status_code == 404
+    assert other_client.post(f"/api/jobs/{mine['id']}/cancel").status_code == 404
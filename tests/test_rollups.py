@@ -0,0 +1,87 @@
+import os
+from datetime import date
+
+import flask_migrate
+from sqlalchemy import select, text
+
+import app as factory
+from app import ProductionRollup, db
+
+ROWS = [
+    {'date': '2026-01-10', 'shift': 'A', 'machine_number': 1, 'operator_name': 'علی', 'footage': 1000},
+    {'date': '2026-01-10', 'shift': 'A', 'machine_number': 1, 'operator_name': 'علي', 'footage': 500},
+    {'date': '2026-01-10', 'shift': 'B', 'machine_number': 2, 'operator_name': 'رضا', 'footage': 700},
+    {'date': '2026-01-11', 'shift': 'A', 'machine_number': 1, 'operator_name': 'رضا', 'footage': 900},
+]
+
+
+def rollup_rows(section='circular'):
+    R = ProductionRollup
+    return sorted(db.session.execute(
+        select(R.date, R.shift, R.machine_number, R.operator_id, R.value_sum, R.value_count, R.report_count)
+        .where(R.section == section)
+    ).all())
+
+
+def test_ingest_matches_rebuild(app, user):
+    with app.app_context():
+        result = factory.ingest_reports('circular', ROWS, user)
+        assert result.inserted == 4 and not result.errors
+        ingested = rollup_rows()
+        factory.rebuild_rollups('circular')
+        db.session.commit()
+        assert rollup_rows() == ingested
+        # دو املای یک اپراتور یک سطر تجمیعی‌اند
+        first = ingested[0]
+        assert (first.date, first.shift, first.value_sum, first.report_count) == (date(2026, 1, 10), 'A', 1500, 2)
+        assert len(ingested) == 3
+        assert len({row.operator_id for row in ingested}) == 2
+
+
+def test_refresh_after_edit_and_delete(app, user):
+    with app.app_context():
+        factory.ingest_reports('circular', ROWS, user)
+        report = factory.CircularReport.query.filter_by(shift='B').one()
+        old_key = factory.rollup_key(report)
+        report.footage, report.shift = 300, 'C'
+        factory.refresh_rollups('circular', [old_key, factory.rollup_key(report)])
+        db.session.commit()
+        shifts = {row.shift: row.value_sum for row in rollup_rows() if row.date == date(2026, 1, 10)}
+        assert shifts == {'A': 1500, 'C': 300}
+
+        key = factory.rollup_key(report)
+        db.session.delete(report)
+        factory.refresh_rollups('circular', [key])
+        db.session.commit()
+        assert 'C' not in {row.shift for row in rollup_rows()}
+
+
+def test_rollup_bumps_data_version(app, user):
+    with app.app_context():
+        factory.ingest_reports('circular', ROWS[:1], user)
+        before = factory.data_versions(['circular'])['circular'][0]
+        factory.ingest_reports('circular', ROWS[1:], user)
+        assert factory.data_versions(['circular'])['circular'][0] == before + 1
+
+
+def test_migrations_backfill_rollup(legacy_app):
+    with legacy_app.app_context():
+        db.session.execute(text(
+            'INSERT INTO circular_report (date, shift, machine_number, operator_name, footage) VALUES '
+            "('2026-01-10', 'A', 1, 'علی', 1000), ('2026-01-10', 'A', 1, 'علي', 500), "
+            "('2026-01-10', 'B', NULL, 'رضا', 700), ('2026-01-11', 'A', 1, 'رضا', NULL)"
+        ))
+        db.session.execute(text(
+            'INSERT INTO sewing_report (date, shift, operator_name, bags_produced) VALUES '
+            "('2026-01-10', 'A', 'مریم', 40), ('2026-01-10', 'A', 'مریم', 60)"
+        ))
+        db.session.commit()
+        flask_migrate.upgrade(os.path.join(legacy_app.root_path, 'migrations'))
+        db.session.remove()
+
+        migrated = rollup_rows('circular'), rollup_rows('sewing')
+        assert len(migrated[0]) == 3 and [row.value_sum for row in migrated[1]] == [100]
+        for section in ('circular', 'sewing'):
+            factory.rebuild_rollups(section)
+        db.session.commit()
+        assert (rollup_rows('circular'), rollup_rows('sewing')) == migrated
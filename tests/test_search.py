@@ -0,0 +1,118 @@
+import os
+from datetime import date
+
+import flask_migrate
+from sqlalchemy import text
+
+import app as factory
+from app import db
+
+ROWS = [
+    {'date': '2026-01-10', 'shift': 'A', 'machine_number': 1, 'operator_name': 'علی', 'footage': 1000},
+    {'date': '2026-01-11', 'shift': 'A', 'machine_number': 1, 'operator_name': 'علي', 'footage': 900},
+    {'date': '2026-01-10', 'shift': 'B', 'machine_number': 2, 'operator_name': 'علیرضا', 'footage': 700},
+    {'date': '2026-01-11', 'shift': 'B', 'machine_number': 2, 'operator_name': 'رضا', 'footage': 800},
+]
+NOTES = [
+    {'date': '2026-01-10', 'shift': 'A', 'machine_number': 1, 'operator_name': 'علی', 'footage': 1000,
+     'notes': 'پارگی نخ', 'color': 'سفید'},
+    {'date': '2026-02-03', 'shift': 'B', 'machine_number': 2, 'operator_name': 'رضا', 'footage': 700,
+     'notes': 'پارگی نخ و توقف'},
+]
+
+
+def leaderboard_names(search):
+    rows, total = factory.operator_leaderboard(date(2026, 1, 1), date(2026, 1, 31), search=search)
+    assert total == len(rows)
+    return sorted(row.operator_name for row in rows)
+
+
+def test_leaderboard_search_uses_index(app, user):
+    with app.app_context():
+        factory.ingest_reports('circular', ROWS, user)
+        # پیشوند کلمه در نمایه؛ هر دو املای «علی» یک اپراتورند
+        assert leaderboard_names('علي') == ['علی', 'علیرضا']
+        assert leaderboard_names('رضا') == ['رضا']
+        assert leaderboard_names('حسن') == []
+        assert len(leaderboard_names(None)) == 3
+
+
+def found(q, **params):
+    """(type، id) نتیجه‌های جستجو از خود نمایه"""
+    hits, _ = factory.search_index.search(db.session, q, **params)
+    return sorted((hit.kind, hit.ref_id) for hit in hits)
+
+
+def test_triggers_follow_report_changes(app, user):
+    with app.app_context():
+        factory.ingest_reports('circular', NOTES[:1], user)
+        report = factory.CircularReport.query.one()
+        issue = factory.MachineIssue.query.one()
+        # ی عربی، کشیده و حروف بزرگ/کوچک مثل متن نمایه یکسان می‌شوند
+        assert found('پارگي') == [('circular', report.id), ('issue', issue.id)]
+        assert found('سفـید', kinds=['circular']) == [('circular', report.id)]
+
+        report.notes = 'توقف برق'
+        db.session.commit()
+        assert found('پارگی', kinds=['circular']) == []
+        assert found('برق') == [('circular', report.id)]
+
+        db.session.delete(report)
+        db.session.delete(issue)
+        db.session.commit()
+        assert found('برق') == [] and found('پارگی') == []
+        assert db.session.execute(text('SELECT count(*) FROM search_index')).scalar() == 0
+
+
+def test_search_api(app, client, user):
+    with app.app_context():
+        factory.ingest_reports('circular', NOTES, user)
+    response = client.get('/api/search', query_string={'q': 'پارگی', 'type': 'report'})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['total'] == 2 and {hit['section'] for hit in body['hits']} == {'circular'}
+    assert {hit['operator'] for hit in body['hits']} == {'علی', 'رضا'}
+    assert all('[پارگی]' in hit['snippet'] for hit in body['hits'])
+
+    # نام اپراتور وزن بیشتری دارد؛ فیلتر تاریخ و صفحه‌بندی
+    by_operator = client.get('/api/search', query_string={'q': 'رضا'}).get_json()
+    assert by_operator['hits'][0]['operator'] == 'رضا'
+    february = client.get('/api/search', query_string={'q': 'پارگی', 'start_date': '2026-02-01'}).get_json()
+    assert {hit['date'] for hit in february['hits']} == {'2026-02-03'}
+    page = client.get('/api/search', query_string={'q': 'پارگی', 'limit': 1, 'offset': 1}).get_json()
+    assert page['total'] == 4 and len(page['hits']) == 1
+    issues = client.get('/api/search', query_string={'q': 'توقف', 'type': 'issue'}).get_json()
+    assert [hit['type'] for hit in issues['hits']] == ['issue']
+
+    for params in ({}, {'q': 'نخ', 'section': 'x'}, {'q': 'نخ', 'type': 'x'}, {'q': 'نخ', 'start_date': '1404'},
+                   {'q': 'نخ', 'limit': 'a'}):
+        assert client.get('/api/search', query_string=params).status_code == 400
+
+
+def test_triggers_survive_migrations(legacy_app):
+    with legacy_app.app_context():
+        db.session.execute(text(
+            'INSERT INTO circular_report (date, shift, machine_number, operator_name, footage, notes) VALUES '
+            "('2026-01-10', 'A', 1, 'علی', 1000, 'پارگی نخ')"
+        ))
+        db.session.commit()
+        flask_migrate.upgrade(os.path.join(legacy_app.root_path, 'migrations'))
+        db.session.remove()
+        # سطر قبل از مهاجرت نمایه شده است
+        old = db.session.execute(text('SELECT id FROM circular_report')).scalar()
+        assert found('پارگی') == [('circular', old)]
+
+        user = factory.User(username='tester', role='admin')
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+        factory.ingest_reports('circular', [dict(NOTES[1], notes='توقف برق')], user.id)
+        new = factory.CircularReport.query.filter_by(shift='B').one()
+        assert found('برق', kinds=['circular']) == [('circular', new.id)]
+
+        new.notes = 'تعویض سوزن'
+        db.session.commit()
+        assert found('برق', kinds=['circular']) == [] and found('سوزن') == [('circular', new.id)]
+        db.session.delete(new)
+        db.session.commit()
+        assert found('سوزن') == []
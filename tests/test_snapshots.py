@@ -0,0 +1,68 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+import app as factory
+from app import db
+
+pytest.importorskip('pyarrow')
+
+TODAY = date.today()
+LAST_MONTH = TODAY.replace(day=1) - timedelta(days=5)
+EARLIER = (TODAY.replace(day=1) - timedelta(days=40)).replace(day=10)
+URL = (f'/api/operator-machine-matrix?start_date={EARLIER - timedelta(days=3)}&end_date={TODAY}'
+       '&include=efficiency,downtime')
+
+
+def row(day, machine, operator, footage, downtime=None):
+    return {'date': day.isoformat(), 'shift': 'A', 'machine_number': machine, 'operator_name': operator,
+            'footage': footage, 'downtime_hours': downtime}
+
+
+ROWS = [
+    row(EARLIER, 1, 'علی', 1000, 1.5), row(EARLIER, 2, 'رضا', 500), row(EARLIER, 2, 'رضا', 700),
+    row(LAST_MONTH, 1, 'علي', 900, 0.5), row(LAST_MONTH, 3, 'مریم', 1200),
+    row(TODAY.replace(day=1), 1, 'رضا', 800, 2),
+]
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    """ماه‌هایی که از Parquet خوانده شدند"""
+    calls = []
+    read = factory.snapshots.read
+
+    def spy(section, months, *args, **kwargs):
+        calls.append((section, list(months)))
+        return read(section, months, *args, **kwargs)
+
+    monkeypatch.setattr(factory.snapshots, 'read', spy)
+    return calls
+
+
+def test_matrix_reads_fresh_snapshots(app, user, client, reads):
+    with app.app_context():
+        factory.ingest_reports('circular', ROWS, user)
+        # sync سطرهای دقیقه آخر (SYNC_MARGIN) را تغییرکرده حساب می‌کند
+        db.session.execute(update(factory.CircularReport).values(updated_at=datetime.utcnow() - timedelta(hours=1)))
+        db.session.commit()
+    expected = client.get(URL).get_json()
+    assert reads == []
+    assert expected['matrix'][0]['operator'] == 'رضا' and expected['matrix'][0]['c2'] == 2
+
+    result = app.test_cli_runner().invoke(args=['snapshot-reports', '--section', 'circular'])
+    assert result.exit_code == 0, result.output
+    assert client.get(URL).get_json() == expected
+    months = sorted({EARLIER.strftime('%Y-%m'), LAST_MONTH.strftime('%Y-%m')})
+    assert reads == [('circular', months)]
+
+    # ماه ویرایش‌شده بعد از همگام‌سازی دوباره از SQLite خوانده می‌شود
+    with app.app_context():
+        report = factory.CircularReport.query.filter_by(date=LAST_MONTH, machine_number=3).one()
+        report.footage = 600
+        db.session.commit()
+    reads.clear()
+    changed = client.get(URL).get_json()
+    assert reads == [('circular', [EARLIER.strftime('%Y-%m')])]
+    assert [r['m3'] for r in changed['matrix'] if r['operator'] == 'مریم'] == [600]
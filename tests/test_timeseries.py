@@ -0,0 +1,35 @@
+import json
+
+import numpy as np
+
+import timeseries
+
+DATES = np.arange(np.datetime64('2025-01-01'), np.datetime64('2026-01-01'))
+
+
+def test_bucket_keeps_totals():
+    values = np.arange(len(DATES), dtype=np.float64)
+    starts, ends, columns, labels = timeseries.downsample(
+        DATES, {'total': values}, 50, labels=[str(d) for d in DATES])
+    assert len(starts) <= 50
+    assert columns['total'].sum() == values.sum()
+    assert starts[0] == DATES[0] and ends[-1] == DATES[-1]
+    assert labels[0] == f'{DATES[0]}–{ends[0]}'
+
+
+def test_lttb_keeps_endpoints_and_peak():
+    values = np.zeros(len(DATES))
+    values[200] = 100
+    dates, ends, columns, _ = timeseries.downsample(DATES, {'total': values}, 20, method='lttb')
+    assert ends is None and len(dates) == 20
+    assert dates[0] == DATES[0] and dates[-1] == DATES[-1]
+    assert DATES[200] in dates and 100 in columns['total']
+
+
+def test_lttb_short_series_unchanged():
+    assert list(timeseries.lttb(np.arange(5), np.arange(5), 10)) == [0, 1, 2, 3, 4]
+
+
+def test_columns_payload_dumps():
+    payload = timeseries.columns_payload(DATES[:2], {'total': np.array([1.5, 2.0])})
+    assert json.loads(timeseries.dumps(payload)) == {'date': ['2025-01-01', '2025-01-02'], 'total': [1.5, 2.0]}
@@ -0,0 +1,136 @@
+"""کاهش نقاط سری زمانی داشبورد در سرور و خروجی JSON ستونی
+
+برای بازه‌های بلند (period=1y یا بازه دلخواه چندساله) سری روزانه به حداکثر max_points
+نقطه کاهش می‌یابد، با یکی از دو روش:
+
+    bucket — بازه زمانی به دوره‌های هم‌طول (چند روزه) تقسیم و مقادیر هر دوره جمع می‌شود؛
+             مجموع کل و راندمان هر دوره حفظ می‌شود (پیش‌فرض)
+    lttb   — Largest-Triangle-Three-Buckets: از هر دسته نقطه‌ای انتخاب می‌شود که با نقطه
+             انتخابی قبلی و میانگین دسته بعد بزرگ‌ترین مثلث را بسازد؛ شکل نمودار (قله‌ها
+             و افت‌ها) حفظ می‌شود ولی مقادیر جمع نمی‌شوند
+
+خروجی ستونی به جای لیست dict ها آرایه‌های موازی دارد (هر کلید یک بار). اگر orjson نصب
+باشد با آن (آرایه‌های NumPy مستقیم) سریال می‌شود؛ وگرنه با json استاندارد و بدون فاصله.
+"""
+import json
+from datetime import date
+
+import numpy as np
+
+METHODS = ('bucket', 'lttb')
+LAYOUTS = ('records', 'columns')
+
+_EPOCH = np.datetime64('1970-01-01', 'D')
+
+
+def _day_numbers(dates):
+    return (np.asarray(dates, dtype='datetime64[D]') - _EPOCH).astype(np.int64)
+
+
+def bucket_aggregate(dates, columns, max_points):
+    """جمع ستون‌ها در دوره‌های هم‌طول (بر حسب روز) از اولین تاریخ
+
+    dates آرایه مرتب datetime64[D] است و columns یک dict نام → آرایه هم‌طول.
+    (شروع دوره، پایان دوره، اندیس اولین و آخرین نقطه هر دوره، ستون‌های جمع‌شده)
+    را برمی‌گرداند؛ دوره‌های بدون داده حذف می‌شوند، پس تعداد نقاط حداکثر max_points است.
+    """
+    numbers = _day_numbers(dates)
+    first, last = numbers[0], numbers[-1]
+    width = -(-(last - first + 1) // max_points)
+    keys = (numbers - first) // width
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(numbers)] - 1
+    bucket_first = first + keys[starts] * width
+    bucket_last = np.minimum(bucket_first + width - 1, last)
+    sums = {name: np.add.reduceat(np.asarray(values), starts) for name, values in columns.items()}
+    return (_EPOCH + bucket_first.astype('timedelta64[D]'), _EPOCH + bucket_last.astype('timedelta64[D]'),
+            starts, ends, sums)
+
+
+def lttb(x, y, max_points):
+    """اندیس نقاط انتخابی LTTB (مرتب؛ اولین و آخرین نقطه همیشه می‌مانند)"""
+    count = len(x)
+    if max_points >= count or max_points < 3:
+        return np.arange(count)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # max_points - 2 دسته بین نقطه اول و آخر؛ max_points < count یعنی هیچ دسته‌ای خالی نیست
+    edges = 1 + np.arange(max_points - 1, dtype=np.int64) * (count - 2) // (max_points - 2)
+    edges = np.r_[edges, count]
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, count - 1
+    a = 0
+    for i in range(max_points - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_x = x[stop:edges[i + 2]].mean()
+        next_y = y[stop:edges[i + 2]].mean()
+        area = np.abs((x[a] - next_x) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (next_y - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def downsample(dates, columns, max_points, method='bucket', labels=None):
+    """کاهش سری (dates، columns، labels) به حداکثر max_points نقطه
+
+    (تاریخ‌ها، تاریخ پایان هر نقطه یا None، ستون‌ها، برچسب‌ها) برمی‌گردد. در lttb سطرهای
+    انتخابی بدون تغییر می‌مانند و ستون y آن اولین ستون columns است.
+    """
+    if method == 'lttb':
+        first_column = next(iter(columns.values()))
+        index = lttb(_day_numbers(dates), first_column, max_points)
+        return (dates[index], None, {name: np.asarray(values)[index] for name, values in columns.items()},
+                [labels[i] for i in index] if labels is not None else None)
+
+    starts_on, ends_on, starts, ends, sums = bucket_aggregate(dates, columns, max_points)
+    if labels is not None:
+        labels = [labels[s] if s == e else f'{labels[s]}–{labels[e]}' for s, e in zip(starts, ends)]
+    return starts_on, ends_on, sums, labels
+
+
+def columns_payload(dates, columns, end_dates=None, labels=None):
+    """سری به صورت آرایه‌های موازی (تاریخ‌ها به صورت YYYY-MM-DD)"""
+    payload = {'date': np.asarray(dates, dtype='datetime64[D]').astype(str).tolist()}
+    if end_dates is not None:
+        payload['end_date'] = np.asarray(end_dates, dtype='datetime64[D]').astype(str).tolist()
+    if labels is not None:
+        payload['label'] = labels
+    payload.update(columns)
+    return payload
+
+
+def records_payload(dates, columns, end_dates=None, labels=None):
+    """سری به صورت لیست dict (قالب قدیمی daily_data؛ تاریخ‌ها شیء date)"""
+    extra = {}
+    if end_dates is not None:
+        extra['end_date'] = np.asarray(end_dates, dtype='datetime64[D]').astype(object)
+    if labels is not None:
+        extra['label'] = labels
+    names = list(columns)
+    values = [np.asarray(columns[name]).tolist() for name in names]
+    rows = []
+    for i, day in enumerate(np.asarray(dates, dtype='datetime64[D]').astype(object)):
+        row = {'date': day}
+        row.update((key, value[i]) for key, value in extra.items())
+        row.update(zip(names, (column[i] for column in values)))
+        rows.append(row)
+    return rows
+
+
+def _default(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(payload):
+    """بایت‌های JSON فشرده؛ با orjson اگر نصب باشد"""
+    try:
+        import orjson
+    except ImportError:
+        return json.dumps(payload, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return orjson.dumps(payload, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)